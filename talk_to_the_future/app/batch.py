@@ -0,0 +1,242 @@
+'''
+Headless subcommands of `main.py`, to script TalkToTheFuture: results are written to stdout
+as JSON Lines, one per line of input or per message, and logs go to stderr.
+
+Usage (from talk_to_the_future/):
+    python main.py register --user alice (--data-dir DIR | --remote HOST:PORT) [--kdf-profile PROFILE]
+    python main.py login    --user alice (--data-dir DIR | --remote HOST:PORT)
+    python main.py send     --user alice (--data-dir DIR | --remote HOST:PORT) [--input FILE] [--compression zlib]
+    python main.py list     --user bob   (--data-dir DIR | --remote HOST:PORT)
+    python main.py read     --user bob   (--data-dir DIR | --remote HOST:PORT) (ID [ID ...] | --all)
+    python main.py export   --user bob   (--data-dir DIR | --remote HOST:PORT) [--output FILE]
+
+The password is read from the environment variable named by `--password-env` (TTTF_PASSWORD
+by default), or asked when stdin is a terminal. Keys are derived once per invocation, when
+registering or logging in, whatever the number of messages sent or read.
+
+`send` reads one message per line of `--input` (stdin by default), a list of receivers is sent
+as a broadcast:
+    {"to": "bob", "content": "See you in ten years", "unlock": "2035-06-01"}
+    {"to": ["bob", "carol"], "content": "Happy new year", "unlock": "2030-01-01"}
+and writes the result of each line as soon as it is sent:
+    {"line": 1, "ok": true}
+    {"line": 2, "ok": false, "error": "[alice]: Some receivers have no public key on (Server)"}
+
+The exit code is 0 if every operation succeeded, 1 otherwise.
+
+Only the standard library is imported until the arguments are parsed: the crypto stack
+is loaded by the command, `questionary` and `colorama` never.
+'''
+import argparse
+import json
+import os
+import sys
+from datetime import date
+from utils.logger import Tracer, JsonSink, LEVELS, format_message
+
+PASSWORD_ENV = "TTTF_PASSWORD"
+
+class ErrorSink:
+    '''
+    Forwards the log records to `sink` and keeps the first error since the last `take`,
+    reported with the operation that failed: the cause rather than the client's summary.
+    '''
+    def __init__(self, sink):
+        self.sink = sink
+        self.error: str | None = None
+
+    def emit(self, record: tuple) -> None:
+        _, level, msg, args, _ = record
+        if level == LEVELS['ERROR'] and self.error is None:
+            self.error = format_message(msg, args)
+        self.sink.emit(record)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+    def take(self, default: str) -> str:
+        error, self.error = self.error, None
+        return error or default
+
+def write(result: dict, out=None) -> None:
+    print(json.dumps(result, ensure_ascii=False), file=out or sys.stdout, flush=True)
+
+def read_password(args) -> str:
+    password = os.environ.get(args.password_env)
+    if password is None:
+        if not sys.stdin.isatty():
+            raise SystemExit(f"No password: set {args.password_env}")
+        import getpass
+        password = getpass.getpass(f"Password of {args.user}: ")
+    return password
+
+def connect(args, tr):
+    '''
+    Returns:
+        Server | RemoteServer: The local server on the `--data-dir` storage or the `--remote` server.
+    '''
+    if args.remote:
+        from network.client import RemoteServer
+        host, _, port = args.remote.rpartition(":")
+        return RemoteServer(host or "127.0.0.1", int(port))
+    from models import Server
+    from models.storage import DiskStorage
+    return Server(name='Server', tr=tr, storage=DiskStorage(args.data_dir))
+
+def message_infos(message_id: int, aad, today: date) -> dict:
+    return {"id": message_id, "sender": aad.sender, "receiver": aad.receiver,
+            "unlock": aad.unlock_day.isoformat(), "locked": aad.unlock_day > today}
+
+# Commands: each one gets a logged in client (only registered for `register`) and returns True on success
+
+def report(client, args, errors: ErrorSink) -> bool:
+    write({"user": client.name, "ok": True})
+    return True
+
+def parse_message(line: str) -> tuple[list[str] | str, str, date]:
+    item = json.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    receivers, content, unlock = item.get("to"), item.get("content"), item.get("unlock")
+    if not (isinstance(receivers, str) or isinstance(receivers, list) and receivers
+            and all(isinstance(receiver, str) for receiver in receivers)):
+        raise ValueError('"to" must be a username or a non-empty list of usernames')
+    if not isinstance(content, str):
+        raise ValueError('"content" must be a string')
+    if not isinstance(unlock, str):
+        raise ValueError('"unlock" must be a date (YYYY-MM-DD)')
+    return receivers, content, date.fromisoformat(unlock)
+
+def send(client, args, errors: ErrorSink) -> bool:
+    client.compression = args.compression
+    source = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    succeeded = True
+    try:
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                receivers, content, unlock_day = parse_message(line)
+            except ValueError as exception:
+                ok, error = False, f"Invalid message: {exception}"
+            else:
+                if isinstance(receivers, str):
+                    ok = client.send_message(content, receivers, unlock_day)
+                else:
+                    ok = client.send_broadcast(content, receivers, unlock_day)
+                error = errors.take("Message was not sent")
+            write({"line": number, "ok": ok} if ok else {"line": number, "ok": ok, "error": error})
+            succeeded = succeeded and ok
+    finally:
+        if args.input:
+            source.close()
+    return succeeded
+
+def list_messages(client, args, errors: ErrorSink) -> bool:
+    messages = client.sync_messages()
+    if messages is None:
+        write({"ok": False, "error": errors.take("Unable to list the messages")})
+        return False
+    today = date.today()
+    for message_id in sorted(messages):
+        write(message_infos(message_id, messages[message_id], today))
+    return True
+
+def read(client, args, errors: ErrorSink) -> bool:
+    if args.all:
+        results = client.read_all_unlocked()
+    else:
+        results = {}
+        for message_id in args.ids:
+            try:
+                content, error = client.read_message(message_id), "Unable to read message"
+            except Exception as exception: # invalid signature or ciphertext
+                content, error = None, f"Invalid message (id:{message_id}): {exception}"
+            error = errors.take(error)
+            results[message_id] = (content, None if content is not None else error)
+    for message_id, (content, error) in sorted(results.items()):
+        write({"id": message_id, "ok": True, "content": content} if error is None
+              else {"id": message_id, "ok": False, "error": str(error)})
+    return all(error is None for _, error in results.values())
+
+def export(client, args, errors: ErrorSink) -> bool:
+    messages = client.sync_messages()
+    if messages is None:
+        write({"ok": False, "error": errors.take("Unable to list the messages")})
+        return False
+    contents = client.read_all_unlocked()
+    today = date.today()
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for message_id in sorted(messages):
+            infos = message_infos(message_id, messages[message_id], today)
+            content, error = contents.get(message_id, (None, None))
+            infos["content"] = content
+            if error is not None:
+                infos["error"] = str(error)
+            write(infos, out)
+    finally:
+        if out:
+            out.close()
+    return all(error is None for _, error in contents.values())
+
+COMMANDS = {
+    "register": (report, "create an account (derives new keys)"),
+    "login": (report, "check the credentials"),
+    "send": (send, "send the messages read as JSON Lines"),
+    "list": (list_messages, "list the received messages"),
+    "read": (read, "read messages by id, or every unlocked one"),
+    "export": (export, "write every received message, with the content of the unlocked ones"),
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help) in COMMANDS.items():
+        command = commands.add_parser(name, help=help, description=help)
+        command.add_argument("--user", required=True)
+        command.add_argument("--password-env", default=PASSWORD_ENV, metavar="VAR", help=f"default {PASSWORD_ENV}")
+        server = command.add_mutually_exclusive_group(required=True)
+        server.add_argument("--data-dir", help="storage of a local server (see network.server), not used by a running one")
+        server.add_argument("--remote", metavar="HOST:PORT", help="address of a network.server or network.shard")
+        command.add_argument("--trace-level", default="ERROR")
+        if name == "register":
+            command.add_argument("--kdf-profile", default=None, help="Argon2 cost profile, see crypto.parameters.KDF_PROFILES")
+        if name == "send":
+            command.add_argument("--input", help="JSON Lines file, stdin if omitted")
+            command.add_argument("--compression", default=None, help="codec of the long messages: zlib, or zstd if zstandard is installed")
+        if name == "read":
+            ids = command.add_mutually_exclusive_group(required=True)
+            ids.add_argument("ids", type=int, nargs="*", default=[], metavar="ID")
+            ids.add_argument("--all", action="store_true", help="every unlocked message")
+        if name == "export":
+            command.add_argument("--output", help="JSON Lines file, stdout if omitted")
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "compression", None) is not None:
+        from crypto.compression import available_codecs
+        if args.compression not in available_codecs():
+            parser.error(f"unknown --compression {args.compression!r}, available: {', '.join(available_codecs())}")
+    password = read_password(args)
+
+    from models import Client
+    errors = ErrorSink(JsonSink())
+    tr = Tracer(trace_level=args.trace_level, sink=errors)
+    server = connect(args, tr)
+    client = Client(args.user, password, tr, kdf_profile=getattr(args, "kdf_profile", None))
+    try:
+        # `register` derives new keys and needs no session, every other command logs in
+        connected = client.register_on(server) if args.command == "register" else client.login_on(server)
+        if not connected:
+            write({"user": args.user, "ok": False, "error": errors.take(f"Unable to {args.command}")})
+            return 1
+        command, _ = COMMANDS[args.command]
+        succeeded = command(client, args, errors)
+        if client.token:
+            client.logout()
+        return 0 if succeeded else 1
+    finally:
+        server.close()
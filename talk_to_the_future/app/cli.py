@@ -1,4 +1,6 @@
-from utils.logger import Tracer, print_header
+from utils.logger import Tracer, ConsoleSink, print_header
+import utils.metrics as metrics
+import utils.profiling as profiling
 from models import Client, Server
 import questionary
 import sys
@@ -6,7 +8,7 @@ from datetime import date, datetime
 
 class TalkToTheFutureCLI:
     def __init__(self, trace_level='DEBUG'):
-        self.tracer = Tracer(trace_level=trace_level, default_color='LIGHTYELLOW_EX')
+        self.tracer = Tracer(trace_level=trace_level, default_color='LIGHTYELLOW_EX', sink=ConsoleSink())
         self.server = Server(name='Server', tr=self.tracer)
 
     def run(self) -> None:
@@ -16,7 +18,7 @@ class TalkToTheFutureCLI:
     def main_menu(self) -> None:
         while True:
             print_header(text='Main menu', color='LIGHTMAGENTA_EX')
-            choice = questionary.select("Choose an option?", ["Register", "Login", "Exit"]).ask()
+            choice = questionary.select("Choose an option?", ["Register", "Login", "Diagnostics", "Exit"]).ask()
             match choice: 
                 case "Register":
                     client = self.ask_credentials()
@@ -25,6 +27,8 @@ class TalkToTheFutureCLI:
                     client = self.ask_credentials()
                     if client.login_on(self.server):
                         self.user_menu(client)
+                case "Diagnostics":
+                    self.diagnostics_menu()
                 case "Exit":
                     self.exit_app()
     
@@ -49,7 +53,7 @@ class TalkToTheFutureCLI:
                 self.read_menu(client)
                 self.user_menu(client)
             case "Change my password":
-                if questionary.confirm("This action will delete all your messages, are you sure?").ask():
+                if questionary.confirm("Your messages will be sealed again with your new keys, are you sure?").ask():
                     client.change_password(self.ask_new_password())
             case "Logout":
                 client.logout()
@@ -58,11 +62,11 @@ class TalkToTheFutureCLI:
     
     def read_menu(self, client: Client) -> None:
         print_header(text=f'{client.name} - Read Menu', color='LIGHTCYAN_EX')
-        messages = client.get_messages_aad()
+        messages = client.sync_messages()
         if not messages :
             self.tracer.colorprint("\nYou didn't receive any message!\n")
             return
-        choices = [questionary.Choice(title=f"id {i}: {msg}", value=i) for i, msg in enumerate(messages)]
+        choices = [questionary.Choice(title=f"id {i}: {msg}", value=i) for i, msg in messages.items()]
         selected_id = questionary.select("Choose the message you want to read",choices).ask()
         
         content = client.read_message(selected_id)
@@ -73,6 +77,56 @@ class TalkToTheFutureCLI:
         self.tracer.sepline(60)
         self.tracer.colorprint(content, color='YELLOW')
 
+    def diagnostics_menu(self) -> None:
+        print_header(text='Diagnostics', color='LIGHTBLUE_EX')
+        choices = [
+            "Disable metrics" if metrics.enabled() else "Enable metrics",
+            "Show metrics",
+            "Export metrics (Prometheus)",
+            "Stop CPU profiler" if profiling.profiling() else "Start CPU profiler",
+            "Stop memory tracing" if profiling.tracing_memory() else "Start memory tracing",
+            "Back"
+        ]
+        choice = questionary.select("Choose an option?", choices).ask()
+        match choice:
+            case "Enable metrics":
+                metrics.enable()
+            case "Disable metrics":
+                metrics.disable()
+            case "Show metrics":
+                self.show_metrics()
+            case "Export metrics (Prometheus)":
+                path:str = questionary.text('File:', default='metrics.prom').ask()
+                with open(path, 'w') as f:
+                    f.write(metrics.prometheus())
+                self.tracer.colorprint(f"Metrics written to {path}")
+            case "Start CPU profiler":
+                profiling.start_profiling()
+            case "Stop CPU profiler":
+                print(profiling.stop_profiling())
+            case "Start memory tracing":
+                profiling.start_memory_tracing()
+            case "Stop memory tracing":
+                print(profiling.stop_memory_tracing())
+            case _:
+                return
+        self.diagnostics_menu()
+
+    def show_metrics(self) -> None:
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            self.tracer.colorprint("\nNo operation recorded, enable the metrics first.\n")
+            return
+        self.tracer.colorprint(f"{'operation':<36}{'calls':>8}{'errors':>8}{'mean ms':>12}{'p99 ms':>12}")
+        self.tracer.sepline(76)
+        for name, stats in snapshot.items():
+            self.tracer.colorprint(f"{name:<36}{stats['calls']:>8}{stats['errors']:>8}"
+                                   f"{stats['mean'] * 1000:>12.3f}{stats['p99'] * 1000:>12.3f}")
+        counters = metrics.counters()
+        if counters:
+            self.tracer.sepline(76)
+            for name, value in counters.items():
+                self.tracer.colorprint(f"{name:<36}{value:>8}")
 
     def ask_credentials(self) -> Client:
         username:str = questionary.text('Username:').ask()
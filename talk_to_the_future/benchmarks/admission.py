@@ -0,0 +1,100 @@
+'''
+Cost and effect of the admission control (`models.admission`) on `Server.send_message`.
+
+First the mean latency of `send_message` without limits and with the default ones, from
+senders which stay under their rate: the price paid by every message.
+
+Then `--flooders` threads send as fast as they can for `--seconds`, ignoring the "retry
+later" answers, next to a polite sender which sends `--polite-rate` messages per second.
+Reports, without and with a `--rate` / `--burst` limit, the messages stored for each kind
+of sender and the p99 latency of the polite one.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.admission [--messages 20000] [--flooders 4] [--seconds 3] [--rate 20] [--burst 200]
+'''
+import argparse
+import threading
+import time
+from datetime import date
+from models import Server
+from models.admission import Admission, RetryLater
+from benchmarks.common import quiet_tracer, fake_public_keys, per_op_ns, print_table
+from benchmarks.suite import fake_message
+
+UNLOCK_DAY = date(2100, 1, 1)
+
+def make_server(admission: Admission, names: list[str]) -> tuple[Server, dict[str, bytes]]:
+    '''
+    Returns:
+        tuple[Server, dict[str, bytes]]: A server where `names` are registered, and their session tokens.
+    '''
+    server = Server(tr=quiet_tracer(), admission=admission)
+    tokens = {}
+    for name in names:
+        keys = fake_public_keys()
+        server.register(name, keys)
+        tokens[name] = server.login(name, keys["password_tag"])
+    return server, tokens
+
+def overhead(messages: int) -> list[list]:
+    rows = []
+    senders = [f"sender{i}" for i in range(max(1, messages // 100))] # 100 messages each, under the default burst
+    for label, admission in (("unlimited", Admission.unlimited()), ("default limits", Admission())):
+        server, tokens = make_server(admission, senders + ["bob"])
+        calls = [(sender, tokens[sender], fake_message(sender, "bob", UNLOCK_DAY))
+                 for _ in range(messages // len(senders)) for sender in senders]
+        rows.append([label, f"{per_op_ns(server.send_message, calls):,.0f}"])
+    return rows
+
+def flood(admission: Admission, args) -> list:
+    flooders = [f"flooder{i}" for i in range(args.flooders)]
+    server, tokens = make_server(admission, flooders + ["polite", "bob"])
+    stored = dict.fromkeys(flooders + ["polite"], 0)
+    retried = dict.fromkeys(stored, 0)
+    latencies: list[int] = []
+    deadline = time.perf_counter() + args.seconds
+
+    def send(sender: str) -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter_ns()
+            try:
+                stored[sender] += server.send_message(sender, tokens[sender], fake_message(sender, "bob", UNLOCK_DAY))
+            except RetryLater as retry:
+                retried[sender] += 1
+                if sender == "polite":
+                    time.sleep(retry.retry_after)
+                continue
+            if sender == "polite":
+                latencies.append(time.perf_counter_ns() - start)
+                time.sleep(1 / args.polite_rate)
+
+    threads = [threading.Thread(target=send, args=(sender,)) for sender in stored]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    flooded = sum(stored[name] for name in flooders)
+    return [f"{flooded:,}", f"{sum(retried[name] for name in flooders):,}", stored["polite"], retried["polite"],
+            f"{latencies[int(0.99 * (len(latencies) - 1))] / 1000:,.0f}" if latencies else "-"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--flooders", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--polite-rate", type=float, default=5, help="messages per second of the polite sender")
+    parser.add_argument("--rate", type=float, default=20, help="messages per second and per sender")
+    parser.add_argument("--burst", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"send_message, {args.messages:,} messages")
+    print_table(["admission", "ns/op"], overhead(args.messages))
+    print(f"\n{args.flooders} flooders and a polite sender for {args.seconds:g}s")
+    limited = Admission(rate=args.rate, burst=args.burst, mailbox_quota=None)
+    print_table(["admission", "flooders stored", "flooders retried", "polite stored", "polite retried", "polite p99 us"],
+                [[label, *flood(admission, args)] for label, admission in
+                 (("unlimited", Admission.unlimited()), (f"{args.rate:g}/s, burst {args.burst}", limited))])
+
+if __name__ == "__main__":
+    main()
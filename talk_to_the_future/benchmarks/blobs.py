@@ -0,0 +1,93 @@
+'''
+Memory of a storage holding `--messages` ciphertexts of `--size` bytes, with the ciphertexts
+kept in the records (`MemoryStorage`) or moved to a `BlobStore` with a `--cache` MB cache.
+Each storage is filled in a fresh child process, whose resident memory is reported as
+anonymous memory (heap) and file-backed pages (the segments mapped by the blob store, which
+the kernel reclaims under pressure).
+
+Then reads `--reads` payloads, `--hot` of them on 10% of the messages, and reports the
+cache hit rate and the mean latency of `MemoryStorage.payload`.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.blobs [--messages 20000] [--size 16000] [--cache 64] [--reads 20000] [--hot 0.9]
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date
+from models.aad import AAD
+from models.blob_store import BlobStore
+from models.message import MessageRecord
+from models.storage import MemoryStorage
+from benchmarks.common import fake_public_keys, print_table
+
+def memory() -> tuple[int, int]:
+    '''
+    Returns:
+        tuple[int, int]: Anonymous and file-backed resident bytes of this process (Linux).
+    '''
+    with open("/proc/self/statm") as f:
+        resident, shared = map(int, f.read().split()[1:3])
+    page = os.sysconf("SC_PAGE_SIZE")
+    return (resident - shared) * page, shared * page
+
+def fill(storage: MemoryStorage, messages: int, size: int) -> list[MessageRecord]:
+    storage.add_user("bob", fake_public_keys())
+    aad = AAD("alice", "bob", date(2000, 1, 1))
+    payload = {"aad": aad.encode(), "enc_sym_key": os.urandom(48), "signature": os.urandom(64)}
+    for _ in range(messages):
+        storage.add_message("bob", MessageRecord(aad, dict(payload, ciphertext=os.urandom(size)), 0))
+    return list(storage.get_user("bob").received_messages.values())
+
+def measure(mode: str, args, results) -> None:
+    path = tempfile.mkdtemp()
+    try:
+        blobs = BlobStore(path, args.cache * 1024 * 1024) if mode == "blobs" else None
+        storage = MemoryStorage(blobs)
+        base, _ = memory()
+        start = time.perf_counter()
+        records = fill(storage, args.messages, args.size)
+        fill_s = time.perf_counter() - start
+        heap, _ = memory()
+
+        rng = random.Random(0)
+        hot = records[:max(1, len(records) // 10)]
+        reads = [rng.choice(hot if rng.random() < args.hot else records) for _ in range(args.reads)]
+        start = time.perf_counter_ns()
+        for record in reads:
+            storage.payload(record)
+        read_us = (time.perf_counter_ns() - start) / len(reads) / 1000
+        stats = blobs.stats() if blobs else None
+        after_heap, mapped = memory()
+        results.put([mode, f"{(heap - base) / 2**20:,.1f}", f"{(after_heap - base) / 2**20:,.1f}", f"{mapped / 2**20:,.1f}",
+                     f"{fill_s:.2f}", f"{read_us:,.1f}",
+                     "-" if stats is None else f"{stats['hits'] / (stats['hits'] + stats['misses']):.1%}"])
+        storage.close()
+    finally:
+        shutil.rmtree(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=16_000, help="bytes of each ciphertext")
+    parser.add_argument("--cache", type=int, default=64, help="MB of the blob cache")
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--hot", type=float, default=0.9, help="share of the reads on the 10%% hottest messages")
+    args = parser.parse_args()
+
+    print(f"{args.messages:,} ciphertexts of {args.size:,} bytes = {args.messages * args.size / 2**20:,.0f} MB")
+    rows = []
+    for mode in ("memory", "blobs"):
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=measure, args=(mode, args, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+    print_table(["ciphertexts in", "heap MB", "after reads", "mapped MB", "fill s", "read us", "hit rate"], rows)
+
+if __name__ == "__main__":
+    main()
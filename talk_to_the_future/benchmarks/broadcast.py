@@ -0,0 +1,61 @@
+'''
+Sending one message to N receivers: N `encrypt_and_sign` + `send_message` against
+one `encrypt_and_sign_broadcast` + `send_broadcast`.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.broadcast [--receivers 1 10 100 500] [--size 10000]
+'''
+import argparse
+import os
+import time
+from datetime import date
+from nacl.public import PrivateKey
+from nacl.signing import SigningKey
+from models import Server
+from models.aad import AAD
+from crypto import encrypt_and_sign, encrypt_and_sign_broadcast
+from benchmarks.common import quiet_tracer, fake_public_keys, print_table
+
+def run(receiver_counts: list[int], size: int) -> list[list]:
+    content = os.urandom(size)
+    signing_key = SigningKey.generate()
+    unlock_day = date(2100, 1, 1)
+    rows = []
+    for count in receiver_counts:
+        server = Server(name='Bench', tr=quiet_tracer())
+        sender_keys = fake_public_keys()
+        sender_keys["verify_key"] = signing_key.verify_key.encode()
+        server.register("sender", sender_keys)
+        token = server.login("sender", sender_keys["password_tag"])
+        names = [f"user{i}" for i in range(count)]
+        pub_keys = {}
+        for name in names:
+            keys = fake_public_keys()
+            keys["public_key"] = PrivateKey.generate().public_key.encode()
+            server.register(name, keys)
+            pub_keys[name] = keys["public_key"]
+
+        start = time.perf_counter()
+        for name in names:
+            aad = AAD("sender", name, unlock_day).encode()
+            server.send_message("sender", token, encrypt_and_sign(content, aad, pub_keys[name], signing_key.encode()))
+        one_by_one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        aad = AAD.for_broadcast("sender", names, unlock_day).encode()
+        server.send_broadcast("sender", token, encrypt_and_sign_broadcast(content, aad, pub_keys, signing_key.encode()))
+        broadcast = time.perf_counter() - start
+
+        rows.append([count, f"{count / one_by_one:,.0f}", f"{count / broadcast:,.0f}", f"{one_by_one / broadcast:.1f}x"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receivers", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--size", type=int, default=10_000, help="content size in bytes")
+    args = parser.parse_args()
+
+    print_table(["receivers", "one by one deliveries/s", "broadcast deliveries/s", "speedup"], run(args.receivers, args.size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+'''
+Opening a mailbox of N unlocked messages: `read_message` one by one against
+`read_all_unlocked` (batched payloads, parsed keys reused, thread pool).
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.bulk_read [--messages 1000 10000] [--size 1000] [--workers 4]
+'''
+import argparse
+import os
+import time
+from datetime import date
+from models import Client, Server
+from benchmarks.common import quiet_tracer, print_table
+
+def run(sizes: list[int], content_size: int, workers: int | None) -> list[list]:
+    content = os.urandom(content_size // 2).hex()
+    rows = []
+    for messages in sizes:
+        tr = quiet_tracer()
+        server = Server(name='Bench', tr=tr)
+        sender = Client('sender', 'sender', tr, kdf_profile='test')
+        receiver = Client('receiver', 'receiver', tr, kdf_profile='test')
+        for client in (sender, receiver):
+            client.register_on(server)
+            client.login_on(server)
+        for _ in range(messages):
+            sender.send_message(content, 'receiver', date(2000, 1, 1))
+
+        start = time.perf_counter()
+        for message_id in range(messages):
+            receiver.read_message(message_id)
+        one_by_one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = receiver.read_all_unlocked(max_workers=workers)
+        bulk = time.perf_counter() - start
+        assert len(results) == messages
+
+        rows.append([messages, f"{messages / one_by_one:,.0f}", f"{messages / bulk:,.0f}", f"{one_by_one / bulk:.1f}x"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--size", type=int, default=1_000, help="content size in bytes")
+    parser.add_argument("--workers", type=int, default=None, help="decryption threads")
+    args = parser.parse_args()
+
+    print_table(["messages", "read_message msg/s", "read_all_unlocked msg/s", "speedup"], run(args.messages, args.size, args.workers))
+
+if __name__ == "__main__":
+    main()
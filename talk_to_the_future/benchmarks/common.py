@@ -0,0 +1,57 @@
+import os
+import time
+from network import codec
+from utils.logger import Tracer
+
+def quiet_tracer() -> Tracer:
+    '''Tracer that only reports errors, so benchmarks measure the code and not the printing.'''
+    return Tracer(trace_level='ERROR')
+
+def fake_public_keys() -> dict[str, bytes]:
+    '''
+    Random public keys with the expected fields and sizes.
+    Skips Argon2 so millions of users can be registered in a few seconds.
+    '''
+    return {
+        "salt"          : os.urandom(16),
+        "password_tag"  : os.urandom(32),
+        "public_key"    : os.urandom(32),
+        "verify_key"    : os.urandom(32),
+    }
+
+class CountingServer:
+    '''
+    Forwards the calls to `server` and adds up the encoded size of the requests (`received`)
+    and of the responses (`sent`), as they would travel over the network.
+    '''
+    def __init__(self, server):
+        self.server = server
+        self.received = 0
+        self.sent = 0
+
+    def __getattr__(self, method: str):
+        fn = getattr(self.server, method)
+        def call(*args, **kwargs):
+            self.received += len(codec.encode([0, method, args, kwargs]))
+            result = fn(*args, **kwargs)
+            self.sent += len(codec.encode([0, True, result]))
+            return result
+        return call
+
+def per_op_ns(fn, args: list[tuple]) -> float:
+    '''
+    Call `fn(*a)` for every `a` in `args`.
+
+    Returns:
+        float: Mean latency of one call in nanoseconds.
+    '''
+    start = time.perf_counter_ns()
+    for a in args:
+        fn(*a)
+    return (time.perf_counter_ns() - start) / max(len(args), 1)
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(x).rjust(w) for x, w in zip(row, widths)))
@@ -0,0 +1,81 @@
+'''
+Storage savings and CPU cost of the compression of message contents (`crypto.compression`)
+on text corpora: prose (the French project report, README.md at the repository root),
+Python source (this repository), JSON log lines as written by `utils.logger.JsonSink`, and
+random hex as the least compressible text. The report (30 KB) is repeated to fill its corpus:
+prose messages longer than it compress better than real letters would.
+
+Each corpus is cut into messages of `--sizes` bytes, encrypted with `encrypt_and_sign` then
+read with `decrypt_and_verify`, without compression and with each available codec.
+Reports the stored size (ciphertext) relative to the content and the time of both calls.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.compression [--sizes 1000 4000 16000 256000] [--rounds 3]
+'''
+import argparse
+import glob
+import json
+import os
+import random
+from datetime import date
+from crypto import encrypt_and_sign, decrypt_and_verify
+from crypto.compression import available_codecs
+from models.aad import AAD
+from nacl.public import PrivateKey
+from nacl.signing import SigningKey
+from benchmarks.common import per_op_ns, print_table
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+CORPUS_SIZE = 1024 * 1024 # bytes of each corpus, repeated if needed
+
+def repeat(text: str) -> bytes:
+    data = text.encode()
+    return (data * (CORPUS_SIZE // len(data) + 1))[:CORPUS_SIZE]
+
+def corpora() -> dict[str, bytes]:
+    with open(os.path.join(ROOT, "..", "README.md"), encoding="utf-8") as f:
+        prose = f.read()
+    sources = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "**", "*.py"), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            sources.append(f.read())
+    rng = random.Random(0)
+    levels, users = ("DEBUG", "INFO", "WARNING", "ERROR"), [f"user{i}" for i in range(200)]
+    logs = "".join(json.dumps({"time": 1.7e9 + i * rng.random(), "level": rng.choice(levels),
+                               "message": f"[Server]: Returning message (id:{rng.randrange(10**6)}) of {rng.choice(users)}"}) + "\n"
+                   for i in range(CORPUS_SIZE // 80))
+    return {
+        "prose (report)": repeat(prose),
+        "python source": repeat("".join(sources)),
+        "json logs": repeat(logs),
+        "random hex": os.urandom(CORPUS_SIZE // 2).hex().encode(),
+    }
+
+def run(sizes: list[int], rounds: int) -> list[list]:
+    receiver, sender = PrivateKey.generate(), SigningKey.generate()
+    aad = AAD("alice", "bob", date(2030, 1, 1)).encode()
+    rows = []
+    for name, corpus in corpora().items():
+        for size in sizes:
+            messages = [corpus[i:i + size] for i in range(0, len(corpus) - size + 1, size)][:max(1, 2_000_000 // size)]
+            for codec in [None, *available_codecs()]:
+                args = [(message, aad, receiver.public_key.encode(), sender, codec) for message in messages]
+                encrypt_ns = min(per_op_ns(encrypt_and_sign, args) for _ in range(rounds))
+                payloads = [encrypt_and_sign(*a) for a in args]
+                stored = sum(len(payload["ciphertext"]) for payload in payloads) / sum(map(len, messages))
+                args = [(dict(payload, verify_key=sender.verify_key.encode()), receiver.encode()) for payload in payloads]
+                decrypt_ns = min(per_op_ns(decrypt_and_verify, args) for _ in range(rounds))
+                rows.append([name, f"{size:,}", codec or "none", f"{stored:.1%}",
+                             f"{encrypt_ns / 1000:,.1f}", f"{decrypt_ns / 1000:,.1f}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 4_000, 16_000, 256_000], help="bytes of each message")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print_table(["corpus", "message bytes", "codec", "stored", "encrypt us", "decrypt us"], run(args.sizes, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''
+Encode/decode throughput of the binary envelope against pickle and JSON + base64.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.envelope [--sizes 100 10000 1000000] [--seconds 0.5]
+'''
+import argparse
+import base64
+import json
+import os
+import pickle
+import time
+from datetime import date
+from models.aad import AAD
+from models.envelope import encode_payload, decode_payload
+from benchmarks.common import print_table
+
+def json_encode(payload: dict[str, bytes]) -> bytes:
+    return json.dumps({k: base64.b64encode(v).decode() for k, v in payload.items()}).encode()
+
+def json_decode(data: bytes) -> dict[str, bytes]:
+    return {k: base64.b64decode(v) for k, v in json.loads(data).items()}
+
+FORMATS = {
+    "envelope"      : (encode_payload, decode_payload),
+    "pickle"        : (lambda p: pickle.dumps(p, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    "json+base64"   : (json_encode, json_decode),
+}
+
+def ops_per_second(fn, arg, seconds: float) -> float:
+    count, start = 0, time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(16):
+            fn(arg)
+        count += 16
+    return count / (time.perf_counter() - start)
+
+def run(sizes: list[int], seconds: float) -> list[list]:
+    rows = []
+    for size in sizes:
+        payload = {
+            "enc_sym_key"   : os.urandom(48),
+            "ciphertext"    : os.urandom(size),
+            "aad"           : AAD("alice", "bob", date(2100, 1, 1)).encode(),
+            "signature"     : os.urandom(64),
+            "verify_key"    : os.urandom(32),
+        }
+        for name, (encode, decode) in FORMATS.items():
+            data = encode(payload)
+            rows.append([size, name, len(data), f"{ops_per_second(encode, payload, seconds):,.0f}",
+                         f"{ops_per_second(decode, data, seconds):,.0f}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000], help="ciphertext sizes in bytes")
+    parser.add_argument("--seconds", type=float, default=0.5, help="duration of each measure")
+    args = parser.parse_args()
+
+    print_table(["ciphertext", "format", "encoded bytes", "encode/s", "decode/s"], run(args.sizes, args.seconds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+'''
+Repeated sends to the same receiver and reads of messages from the same sender, with the
+client `Keyring` cold (cleared before each call: the public key is fetched from the server
+and every key parsed again, as before the keyring) and warm.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.keyring [--calls 2000] [--tcp]
+'''
+import argparse
+import time
+from datetime import date
+from models import Client, Server
+from models.keyring import Keyring
+from benchmarks.common import quiet_tracer, print_table
+
+def mean_us(fn, calls: int, before=None) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        if before:
+            before()
+        fn()
+    return (time.perf_counter() - start) * 1e6 / calls
+
+def run(calls: int, tcp: bool) -> list[list]:
+    process = None
+    if tcp:
+        from network import RemoteServer
+        from network.shard import spawn_shard
+        address, process = spawn_shard()
+        host, port = address.rsplit(":", 1)
+        server = RemoteServer(host, int(port), pool_size=1, tr=quiet_tracer())
+    else:
+        server = Server(name='Bench', tr=quiet_tracer())
+    try:
+        sender = Client("sender", "password", quiet_tracer(), kdf_profile="test")
+        receiver = Client("receiver", "password", quiet_tracer(), kdf_profile="test")
+        for client in (sender, receiver):
+            client.register_on(server)
+            client.login_on(server)
+        sender.send_message("hello", "receiver", date(2000, 1, 1))
+        payload = server.get_message_payload("receiver", receiver.token, 0)
+
+        def cold(client: Client):
+            # A new keyring before each call: keys parsed again and public key fetched, as without the cache
+            private_keys = client._Client__private_keys
+            def reset():
+                client.keyring = Keyring()
+                client.keyring.load(private_keys)
+            return reset
+
+        send = lambda: sender.send_message("hello", "receiver", date(2000, 1, 1))
+        read = lambda: receiver.decrypt_message(payload)
+        rows = []
+        for name, fn, client in (("send_message", send, sender), ("decrypt_message", read, receiver)):
+            keyring = client.keyring
+            cold_us = mean_us(fn, calls, cold(client))
+            client.keyring = keyring
+            warm_us = mean_us(fn, calls)
+            rows.append([name, f"{cold_us:.1f}", f"{warm_us:.1f}", f"{cold_us / warm_us:.2f}x"])
+        return rows
+    finally:
+        if process:
+            server.close()
+            process.terminate()
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2_000)
+    parser.add_argument("--tcp", action="store_true", help="server in another process, reached over TCP")
+    args = parser.parse_args()
+
+    print_table(["operation", "cold us", "warm us", "speedup"], run(args.calls, args.tcp))
+
+if __name__ == "__main__":
+    main()
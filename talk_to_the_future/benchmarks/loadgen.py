@@ -0,0 +1,248 @@
+'''
+Synthetic load to size deployments: thousands of `Client`s with the fast "test" KDF profile
+register on a `Server` then run a weighted mix of `send_message` (unlock days spread over
+the past and the future), `get_messages_aad`, `read_message`, `download_future_message` and
+`delete_message` until `--seconds` have elapsed.
+
+Reports the throughput and p50/p99/p999 latency of each operation, and the resident memory
+of the process holding the server sampled every `--sample-every` seconds.
+
+Drivers:
+    inprocess   clients and server share one process, no network.
+    process     a server process (`network.server`) loaded over TCP by `--workers` client
+                processes, to saturate every core. `--remote host:port` targets a running server.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.loadgen [--driver inprocess|process] [--users 2000] [--seconds 10]
+                                 [--workers 4] [--remote host:port] [--future-ratio 0.5]
+                                 [--mix send=40,list=20,read=20,download=10,delete=10]
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+from datetime import date, timedelta
+from models import Client, Server
+from benchmarks.common import quiet_tracer, print_table
+
+MIX = "send=40,list=20,read=20,download=10,delete=10"
+OPERATIONS = ("send", "list", "read", "download", "delete")
+UNLOCK_SPREAD = 365 # days around today for the unlock day of sent messages
+
+def parse_mix(text: str) -> dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        mix[name] = int(weight)
+    return mix
+
+def rss_bytes(pid: int | str = "self") -> int:
+    '''Resident memory of process `pid`, from /proc on Linux, else peak memory of this process.'''
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(ordered: list[int], q: float) -> int:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0
+
+class SimulatedUser:
+    '''A `Client` and the ids of its messages it learned from its last `get_messages_aad`.'''
+    def __init__(self, client: Client):
+        self.client: Client = client
+        self.unlocked: list[int] = []
+        self.locked: list[int] = []
+
+def make_users(server, names: list[str]) -> list[SimulatedUser]:
+    users = []
+    for name in names:
+        client = Client(name, f"{name}-password", quiet_tracer(), kdf_profile="test")
+        if not client.register_on(server) or not client.login_on(server):
+            raise RuntimeError(f"{name} could not register on {server}")
+        users.append(SimulatedUser(client))
+    return users
+
+def step(user: SimulatedUser, operation: str, receivers: list[str], rng: random.Random,
+         today: date, future_ratio: float) -> tuple[str, bool]:
+    '''
+    Run `operation` for `user`. Reads, downloads and deletes need a known message:
+    without one the user lists its messages instead.
+
+    Returns:
+        tuple[str, bool]: Operation actually run and whether it succeeded.
+    '''
+    client = user.client
+    if not (user.unlocked or user.locked) and operation != "send" or operation == "read" and not user.unlocked:
+        operation = "list"
+    if operation == "download" and not user.locked:
+        operation = "read"
+
+    match operation:
+        case "send":
+            offset = rng.randint(1, UNLOCK_SPREAD)
+            unlock_day = today + timedelta(days=offset if rng.random() < future_ratio else -offset)
+            return operation, client.send_message(f"message {rng.random()}", rng.choice(receivers), unlock_day)
+        case "list":
+            messages = client.get_messages_aad()
+            if messages is None:
+                return operation, False
+            user.unlocked = [message_id for message_id, aad in messages.items() if aad.unlock_day <= today]
+            user.locked = [message_id for message_id, aad in messages.items() if aad.unlock_day > today]
+            return operation, True
+        case "read":
+            return operation, client.read_message(rng.choice(user.unlocked)) is not None
+        case "download":
+            return operation, client.download_future_message(rng.choice(user.locked)) is not None
+        case "delete":
+            known = user.unlocked if not user.locked or user.unlocked and rng.random() < 0.5 else user.locked
+            message_id = known.pop(rng.randrange(len(known)))
+            return operation, client.delete_message(message_id)
+
+def drive(users: list[SimulatedUser], receivers: list[str], mix: dict[str, int], seconds: float,
+          future_ratio: float, seed: int, progress: list[int] | None = None) -> tuple[dict[str, list[int]], dict[str, int]]:
+    '''
+    Run the mix with random users until `seconds` have elapsed.
+
+    Returns:
+        tuple[dict[str, list[int]], dict[str, int]]: Latencies in ns and failures of each operation.
+    '''
+    rng = random.Random(seed)
+    today = date.today()
+    names, weights = list(mix), list(mix.values())
+    latencies: dict[str, list[int]] = {operation: [] for operation in OPERATIONS}
+    failures: dict[str, int] = dict.fromkeys(OPERATIONS, 0)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for operation in rng.choices(names, weights, k=100):
+            start = time.perf_counter_ns()
+            operation, ok = step(rng.choice(users), operation, receivers, rng, today, future_ratio)
+            latencies[operation].append(time.perf_counter_ns() - start)
+            failures[operation] += not ok
+        if progress is not None:
+            progress[0] += 100
+    return latencies, failures
+
+class MemorySampler(threading.Thread):
+    '''Samples the resident memory of process `pid` (and `progress`, operations done) every `interval` seconds.'''
+    def __init__(self, pid: int | str, interval: float, progress: list[int] | None = None):
+        super().__init__(daemon=True)
+        self.pid, self.interval, self.progress = pid, interval, progress
+        self.samples: list[tuple[float, int | None, int]] = []
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        while True:
+            self.samples.append((time.perf_counter() - start, self.progress[0] if self.progress else None, rss_bytes(self.pid)))
+            if self.stopped.wait(self.interval):
+                break
+
+    def stop(self) -> list[tuple[float, int | None, int]]:
+        self.stopped.set()
+        self.join()
+        return self.samples
+
+def run_inprocess(args) -> tuple[dict[str, list[int]], dict[str, int], list, float]:
+    server = Server(name='Load', tr=quiet_tracer())
+    names = [f"user{i}" for i in range(args.users)]
+    users = make_users(server, names)
+    progress = [0]
+    sampler = MemorySampler("self", args.sample_every, progress)
+    sampler.start()
+    start = time.perf_counter()
+    latencies, failures = drive(users, names, args.mix, args.seconds, args.future_ratio, args.seed, progress)
+    elapsed = time.perf_counter() - start
+    return latencies, failures, sampler.stop(), elapsed
+
+def worker_main(address: str, worker: int, names: list[str], receivers: list[str], args, barrier, results) -> None:
+    from network import RemoteServer
+    host, port = address.rsplit(":", 1)
+    server = RemoteServer(host, int(port), pool_size=1, tr=quiet_tracer())
+    users = make_users(server, names)
+    barrier.wait()
+    results.put(drive(users, receivers, args.mix, args.seconds, args.future_ratio, args.seed + worker))
+    server.close()
+
+def run_multiprocess(args) -> tuple[dict[str, list[int]], dict[str, int], list, float]:
+    from network.shard import spawn_shard
+    process = None
+    if args.remote:
+        address, pid = args.remote, None
+    else:
+        address, process = spawn_shard()
+        pid = process.pid
+    try:
+        names = [f"user{i}" for i in range(args.users)]
+        barrier = multiprocessing.Barrier(args.workers + 1)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=worker_main, args=(address, i, names[i::args.workers], names, args, barrier, results))
+                   for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        sampler = MemorySampler(pid, args.sample_every) if pid else None
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        latencies: dict[str, list[int]] = {operation: [] for operation in OPERATIONS}
+        failures: dict[str, int] = dict.fromkeys(OPERATIONS, 0)
+        for _ in workers:
+            worker_latencies, worker_failures = results.get()
+            for operation in OPERATIONS:
+                latencies[operation] += worker_latencies[operation]
+                failures[operation] += worker_failures[operation]
+        elapsed = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+        return latencies, failures, sampler.stop() if sampler else [], elapsed
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+def report(latencies: dict[str, list[int]], failures: dict[str, int], samples: list, elapsed: float) -> None:
+    rows = []
+    everything = []
+    for operation in OPERATIONS:
+        ordered = sorted(latencies[operation])
+        everything += ordered
+        if ordered:
+            rows.append([operation, f"{len(ordered):,}", failures[operation], f"{len(ordered) / elapsed:,.0f}",
+                         *(f"{percentile(ordered, q) / 1e6:.3f}" for q in (0.5, 0.99, 0.999))])
+    everything.sort()
+    rows.append(["total", f"{len(everything):,}", sum(failures.values()), f"{len(everything) / elapsed:,.0f}",
+                 *(f"{percentile(everything, q) / 1e6:.3f}" for q in (0.5, 0.99, 0.999))])
+    print_table(["operation", "calls", "failed", "ops/s", "p50 ms", "p99 ms", "p999 ms"], rows)
+
+    if samples:
+        print()
+        base = samples[0][2]
+        print_table(["seconds", "operations", "RSS MB", "growth MB"],
+                    [[f"{t:.1f}", "-" if done is None else f"{done:,}", f"{rss / 2**20:.1f}", f"{(rss - base) / 2**20:+.1f}"]
+                     for t, done, rss in samples])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--driver", choices=["inprocess", "process"], default="inprocess")
+    parser.add_argument("--users", type=int, default=2_000, help="simulated clients")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of the load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(MIX), help="weight of each operation")
+    parser.add_argument("--future-ratio", type=float, default=0.5, help="share of messages sent with a future unlock day")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="client processes of the process driver")
+    parser.add_argument("--remote", default=None, help="host:port of a running server for the process driver")
+    parser.add_argument("--sample-every", type=float, default=1.0, help="seconds between two memory samples")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"driver: {args.driver}, users: {args.users:,}, cores: {os.cpu_count()}")
+    run = run_inprocess if args.driver == "inprocess" else run_multiprocess
+    report(*run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+'''
+Bytes per stored message: previous `dict[str, bytes]` layout against `MessageRecord`.
+
+Both layouts hold the same freshly allocated ciphertext, keys and signature, so the
+difference is the container overhead plus the per-message copy of the verify key
+(which is what a dict recovered from storage or received over the wire holds).
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.message_memory [--messages 100000] [--ciphertext-size 64]
+'''
+import argparse
+import os
+import tracemalloc
+from datetime import date
+from models.aad import AAD
+from models.message import MessageRecord
+from models.key_table import KeyTable
+from benchmarks.common import print_table
+
+def payload(aad: bytes, ciphertext_size: int) -> dict[str, bytes]:
+    return {
+        "enc_sym_key"   : os.urandom(48),
+        "ciphertext"    : os.urandom(ciphertext_size),
+        "aad"           : aad,
+        "signature"     : os.urandom(64),
+    }
+
+def measure(build, messages: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    stored = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(stored) == messages
+    return (after - before) / messages
+
+def run(messages: int, ciphertext_size: int) -> list[list]:
+    aad = AAD("alice", "bob", date(2100, 1, 1))
+    encoded_aad = aad.encode()
+    verify_key = os.urandom(32)
+
+    def build_dicts() -> list[dict[str, bytes]]:
+        mailbox = []
+        for _ in range(messages):
+            message = payload(encoded_aad, ciphertext_size)
+            message["verify_key"] = bytes(bytearray(verify_key)) # one copy per message
+            mailbox.append(message)
+        return mailbox
+
+    def build_records() -> dict[int, MessageRecord]:
+        keys = KeyTable()
+        key_id = keys.add(verify_key)
+        mailbox = {}
+        for message_id in range(messages):
+            record = MessageRecord(aad, payload(encoded_aad, ciphertext_size), key_id)
+            record.message_id = message_id
+            mailbox[message_id] = record
+        return mailbox
+
+    before = measure(build_dicts, messages)
+    after = measure(build_records, messages)
+    return [["dict[str, bytes]", f"{before:.0f}"],
+            ["MessageRecord", f"{after:.0f}"],
+            ["saved", f"{before - after:.0f} ({(before - after) / before:.0%})"]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--ciphertext-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print_table(["layout", "bytes/message"], run(args.messages, args.ciphertext_size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+'''
+Admin queries over the metadata of `--messages` stored messages (`--users` receivers, one
+sender each, unlock days spread over ten years): a Python loop over the stored records,
+decoding each `AAD` as the payloads are stored, or reading the fields decoded at ingest,
+against the columnar `MetadataIndex` of the storage.
+
+Also compares `decode_date` called on each date to `decode_dates` on all of them.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.metadata [--messages 1000000] [--users 1000] [--rounds 3]
+'''
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from models.aad import AAD
+from models.message import MessageRecord
+from models.storage import MemoryStorage
+from utils.date_codec import encode_date, decode_date, decode_dates
+from benchmarks.common import fake_public_keys, print_table
+
+START = date(2030, 1, 1)
+DAYS = 3653
+
+def fill(messages: int, users: int) -> MemoryStorage:
+    storage = MemoryStorage()
+    keys = fake_public_keys()
+    names = [f"user{i}" for i in range(users)]
+    for name in names:
+        storage.add_user(name, keys)
+    payload = {"enc_sym_key": os.urandom(48), "ciphertext": os.urandom(100), "signature": os.urandom(64)}
+    for i in range(messages):
+        aad = AAD(names[(i + 1) % users], names[i % users], START + timedelta(days=i * 7919 % DAYS))
+        storage.add_message(aad.receiver, MessageRecord(aad, dict(payload, aad=aad.encode()), 0))
+    return storage
+
+def records(storage: MemoryStorage):
+    for user in storage.users:
+        yield from user.received_messages.values()
+
+def best_ms(fn, rounds: int) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def run(messages: int, users: int, rounds: int) -> list[list]:
+    storage = fill(messages, users)
+    index = storage.metadata
+    since, until = START + timedelta(days=365), START + timedelta(days=730)
+    sender = "user1"
+
+    def window_aad():
+        return sum(since <= AAD.decode(m.aad).unlock_day <= until for m in records(storage))
+    def window_records():
+        return sum(since <= m.unlock_day <= until for m in records(storage))
+    def sender_aad():
+        return sum(AAD.decode(m.aad).sender == sender for m in records(storage))
+    def sender_records():
+        return sum(m.sender == sender for m in records(storage))
+    def by_day_records():
+        counts = {}
+        for m in records(storage):
+            if since <= m.unlock_day <= until:
+                counts[m.unlock_day] = counts.get(m.unlock_day, 0) + 1
+        return counts
+
+    queries = (
+        ("unlocking in one year", window_aad, window_records, lambda: index.count(since=since, until=until)),
+        ("sent by one user", sender_aad, sender_records, lambda: index.count(sender=sender)),
+        ("count per day, one year", None, by_day_records,
+         lambda: {day: n for day, n in index.count_by_day(since, until).items() if n}),
+    )
+    rows = []
+    for name, aad_loop, record_loop, query in queries:
+        aad_ms = best_ms(aad_loop, rounds)[0] if aad_loop else None
+        record_ms, expected = best_ms(record_loop, rounds)
+        index_ms, result = best_ms(query, rounds)
+        assert result == expected, name
+        rows.append([name, f"{aad_ms:.1f}" if aad_ms else "-", f"{record_ms:.1f}", f"{index_ms:.2f}",
+                     f"{record_ms / index_ms:.0f}x"])
+
+    encoded = [encode_date(START + timedelta(days=i % DAYS)) for i in range(messages)]
+    joined = b"".join(encoded)
+    loop_ms = best_ms(lambda: [decode_date(b) for b in encoded], rounds)[0]
+    batch_ms = best_ms(lambda: decode_dates(joined), rounds)[0]
+    rows.append(["decode dates", "-", f"{loop_ms:.1f}", f"{batch_ms:.2f}", f"{loop_ms / batch_ms:.0f}x"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print_table(["query", "AAD loop ms", "record loop ms", "index ms", "speedup"],
+                run(args.messages, args.users, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+'''
+Cost of the metrics instrumentation: the original function (`__wrapped__`) against the
+instrumented one with metrics disabled and enabled, on a fast server method and on a
+signature.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.metrics [--calls 100000] [--rounds 10]
+'''
+import argparse
+import os
+from datetime import date
+import crypto.public as public
+import utils.metrics as metrics
+from models import Server
+from models.aad import AAD
+from benchmarks.common import quiet_tracer, fake_public_keys, per_op_ns, print_table
+
+def best_ns(fn, args: list[tuple], rounds: int) -> tuple[float, float, float]:
+    '''
+    Returns:
+        tuple[float, float, float]: Best ns per call of the original function and of the
+            instrumented one with metrics disabled then enabled, measured in turn each round.
+    '''
+    best = [float("inf")] * 3
+    for _ in range(rounds):
+        metrics.disable()
+        best[0] = min(best[0], per_op_ns(fn.__wrapped__, args))
+        best[1] = min(best[1], per_op_ns(fn, args))
+        metrics.enable()
+        best[2] = min(best[2], per_op_ns(fn, args))
+    metrics.disable()
+    return tuple(best)
+
+def run(calls: int, rounds: int) -> list[list]:
+    server = Server(name='Bench', tr=quiet_tracer())
+    tokens = {}
+    for username in ("sender", "receiver"):
+        keys = fake_public_keys()
+        server.register(username, keys)
+        tokens[username] = server.login(username, keys["password_tag"])
+    message = {"enc_sym_key": os.urandom(48), "ciphertext": os.urandom(100),
+               "aad": AAD("sender", "receiver", date(2000, 1, 1)).encode(), "signature": os.urandom(64)}
+    server.send_message("sender", tokens["sender"], message)
+
+    sign_key = public.load_signing_key(os.urandom(32))
+    operations = {
+        "Server.get_message_payload": (Server.get_message_payload,
+                                       [(server, "receiver", tokens["receiver"], 0)] * calls),
+        "public.sign_bundle"        : (public.sign_bundle, [(os.urandom(200), sign_key)] * (calls // 10)),
+    }
+    rows = []
+    for name, (fn, args) in operations.items():
+        raw, disabled, enabled = best_ns(fn, args, rounds)
+        rows.append([name, f"{raw:.0f}", f"{disabled:.0f}", f"{(disabled - raw) / raw:+.1%}",
+                     f"{enabled:.0f}", f"{(enabled - raw) / raw:+.1%}"])
+    metrics.reset()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=10, help="measures of each variant, the best one is kept")
+    args = parser.parse_args()
+
+    print_table(["operation", "raw ns", "disabled ns", "overhead", "enabled ns", "overhead"], run(args.calls, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+'''
+Latency and throughput of the network transport: a `network.server` runs in its own
+process and N simulated clients (asyncio tasks sharing one pool of pipelined
+connections) each send `--requests` authenticated `get_messages_aad` calls.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.network [--clients 1 100 10000] [--requests 20] [--pool-size 4]
+'''
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from network import AsyncRemoteServer
+from benchmarks.common import fake_public_keys, print_table
+
+USERS = 100
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", "network.server", "--port", str(port), "--trace-level", "ERROR"])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+async def simulated_client(remote: AsyncRemoteServer, username: str, token: str, requests: int, latencies: list[float]) -> None:
+    for _ in range(requests):
+        start = time.perf_counter()
+        await remote.call("get_messages_aad", username, token)
+        latencies.append(time.perf_counter() - start)
+
+async def run_level(port: int, clients: int, requests: int, pool_size: int) -> list:
+    remote = AsyncRemoteServer(port=port, pool_size=pool_size)
+    sessions = []
+    for i in range(USERS):
+        keys = fake_public_keys()
+        await remote.call("register", f"user{i}", keys)
+        sessions.append((f"user{i}", await remote.call("login", f"user{i}", keys["password_tag"])))
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(simulated_client(remote, *sessions[i % USERS], requests, latencies) for i in range(clients)))
+    duration = time.perf_counter() - start
+
+    for username, token in sessions:
+        await remote.call("remove", username, token)
+    await remote.close()
+
+    latencies.sort()
+    ms = 1000
+    return [clients, len(latencies), f"{len(latencies) / duration:,.0f}",
+            f"{percentile(latencies, 0.5) * ms:.2f}", f"{percentile(latencies, 0.99) * ms:.2f}"]
+
+def run(levels: list[int], requests: int, pool_size: int) -> list[list]:
+    port = free_port()
+    process = start_server(port)
+    try:
+        return [asyncio.run(run_level(port, clients, requests, pool_size)) for clients in levels]
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 100, 10_000], help="concurrent simulated clients")
+    parser.add_argument("--requests", type=int, default=20, help="requests sent by each client")
+    parser.add_argument("--pool-size", type=int, default=4, help="connections shared by the clients")
+    args = parser.parse_args()
+
+    print_table(["clients", "requests", "requests/s", "p50 ms", "p99 ms"], run(args.clients, args.requests, args.pool_size))
+
+if __name__ == "__main__":
+    main()
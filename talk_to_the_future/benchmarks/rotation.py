@@ -0,0 +1,68 @@
+'''
+Password change of a receiver holding `--sizes` messages (a tenth of them still locked) of
+`--size` bytes: `Client.change_password` rotates the keys, only the key slots are sealed
+again and cross the network. Compared with what re-sending the mailbox would transfer,
+the encoded payload of every message, as senders had to do when a password change wiped it.
+
+Reports the rotation time (without the key derivation, test KDF profile) and the bytes
+exchanged with the server (codec encoding of the requests and responses).
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.rotation [--sizes 100 1000 10000] [--size 1000]
+'''
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from crypto import generate_keys, encrypt_and_sign
+from models import Client, Server
+from models.aad import AAD
+from models.envelope import Payload
+from network import codec
+from benchmarks.common import quiet_tracer, print_table, CountingServer
+
+LOCKED_SHARE = 10 # one message out of LOCKED_SHARE is locked
+
+def run(sizes: list[int], size: int) -> list[list]:
+    start = time.perf_counter()
+    generate_keys("password", profile="test")
+    kdf = time.perf_counter() - start
+
+    rows = []
+    for messages in sizes:
+        server = Server(name='Bench', tr=quiet_tracer())
+        counting = CountingServer(server)
+        sender = Client("sender", "password", quiet_tracer(), kdf_profile="test")
+        receiver = Client("receiver", "password", quiet_tracer(), kdf_profile="test")
+        for client in (sender, receiver):
+            client.register_on(counting)
+            client.login_on(counting)
+        past, future = date(2000, 1, 1), date.today() + timedelta(days=365)
+        content = os.urandom(size // 2).hex().encode()
+        resent = 0
+        for i in range(messages):
+            aad = AAD("sender", "receiver", future if i % LOCKED_SHARE == 0 else past).encode()
+            payload = encrypt_and_sign(content, aad, receiver.public_keys["public_key"], sender.keyring.signing_key)
+            server.send_message("sender", sender.token, payload)
+            resent += len(codec.encode(Payload(payload)))
+
+        counting.received = counting.sent = 0
+        start = time.perf_counter()
+        assert receiver.change_password("new password")
+        elapsed = time.perf_counter() - start - kdf
+        assert receiver.read_message(messages - 1) is not None
+        rows.append([messages, f"{elapsed * 1000:.1f}", f"{elapsed * 1e6 / messages:.0f}",
+                     f"{counting.received + counting.sent:,}", f"{resent:,}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000], help="messages in the mailbox")
+    parser.add_argument("--size", type=int, default=1_000, help="bytes of each message")
+    args = parser.parse_args()
+
+    print_table(["messages", "rotation ms", "us/message", "bytes exchanged", "bytes to re-send"],
+                run(args.sizes, args.size))
+
+if __name__ == "__main__":
+    main()
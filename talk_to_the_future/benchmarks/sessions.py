@@ -0,0 +1,63 @@
+'''
+Session store with millions of live sessions: cost of opening a session, of checking
+one (lookup, constant-time compare and sliding expiry) and of sweeping expired ones.
+
+Sessions are opened over one TTL with a simulated clock; the sweep then runs at the
+point where `--expired` of them are past their deadline.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.sessions [--sessions 100000 1000000 3000000] [--lookups 200000] [--expired 0.1]
+'''
+import argparse
+import random
+import time
+from models.session_store import SessionStore
+from benchmarks.common import per_op_ns, print_table
+
+TTL = 1800.0
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def run(sizes: list[int], lookups: int, expired_ratio: float) -> list[list]:
+    rows = []
+    for size in sizes:
+        clock = FakeClock()
+        store = SessionStore(ttl=TTL, clock=clock)
+        users = [f"user{i}" for i in range(size)]
+        tokens = []
+        start = time.perf_counter_ns()
+        for i, username in enumerate(users):
+            clock.now = TTL * i / size
+            tokens.append(store.create(username))
+        create_ns = (time.perf_counter_ns() - start) / size
+
+        clock.now = TTL # nothing expired yet
+        picks = [random.randrange(size) for _ in range(lookups)]
+        check_ns = per_op_ns(store.check, [(users[i], tokens[i]) for i in picks])
+        miss_ns = per_op_ns(store.check, [(users[i], tokens[(i + 1) % size]) for i in picks])
+
+        # Checked sessions moved their deadline, the sweep pushes them back instead of dropping them
+        start = time.perf_counter_ns()
+        expired = store.sweep(TTL + TTL * expired_ratio)
+        sweep_ms = (time.perf_counter_ns() - start) / 1e6
+        rows.append([f"{size:,}", f"{create_ns:,.0f}", f"{check_ns:,.0f}", f"{miss_ns:,.0f}",
+                     f"{expired:,}", f"{sweep_ms:,.1f}", f"{sweep_ms * 1e6 / max(expired, 1):,.0f}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100_000, 1_000_000, 3_000_000], help="live sessions")
+    parser.add_argument("--lookups", type=int, default=200_000, help="session checks to measure")
+    parser.add_argument("--expired", type=float, default=0.1, help="fraction of sessions expired at sweep time")
+    args = parser.parse_args()
+
+    print_table(["sessions", "create ns", "check ns", "bad token ns", "expired", "sweep ms", "sweep ns/expired"],
+                run(args.sessions, args.lookups, args.expired))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+'''
+Throughput of a sharded deployment with 1, 2, 4 and 8 shard worker processes.
+
+Load comes from as many loader processes as shards (`--loaders` to fix it), each routing
+its requests itself with a `ShardRouter` and running `--clients` simulated users that
+alternate `send_message` to a random user (mostly cross-shard) and `get_user_salt`.
+Scaling is bounded by the number of cores: compare with `os.cpu_count()` printed first.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.sharding [--shards 1 2 4 8] [--clients 50] [--seconds 3]
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from datetime import date
+from models.aad import AAD
+from network.shard import ShardRouter, spawn_shard, shard_secret
+from benchmarks.common import fake_public_keys, print_table
+
+USERS_PER_LOADER = 200
+
+def fake_message(sender: str, receiver: str) -> dict[str, bytes]:
+    return {
+        "enc_sym_key"   : os.urandom(48),
+        "ciphertext"    : os.urandom(200),
+        "aad"           : AAD(sender, receiver, date(2000, 1, 1)).encode(),
+        "signature"     : os.urandom(64),
+    }
+
+async def load(shards: dict[str, str], secret: str, loader: int, clients: int, barrier, seconds: float) -> int:
+    router = ShardRouter(shards, secret=secret)
+    users = [f"l{loader}u{i}" for i in range(USERS_PER_LOADER)]
+    tokens = {}
+    for username in users:
+        keys = fake_public_keys()
+        await router.call("register", username, keys)
+        tokens[username] = await router.call("login", username, keys["password_tag"])
+
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def client(i: int):
+        nonlocal done
+        sender = users[i % len(users)]
+        messages = [fake_message(sender, receiver) for receiver in random.sample(users, 16)]
+        while time.perf_counter() < deadline:
+            await router.call("send_message", sender, tokens[sender], random.choice(messages))
+            await router.call("get_user_salt", random.choice(users))
+            done += 2
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    await router.close()
+    return done
+
+def loader_main(shards: dict[str, str], secret: str, loader: int, clients: int, barrier, seconds: float, results) -> None:
+    results.put(asyncio.run(load(shards, secret, loader, clients, barrier, seconds)))
+
+def run_level(shard_count: int, loaders: int, clients: int, seconds: float) -> float:
+    # Loaders send as fast as they can, the admission control would answer them "retry later"
+    workers = [spawn_shard(argv=["--no-admission"]) for _ in range(shard_count)]
+    shards = {f"shard-{i}": address for i, (address, _) in enumerate(workers)}
+    try:
+        barrier = multiprocessing.Barrier(loaders)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=loader_main, args=(shards, shard_secret(), i, clients, barrier, seconds, results))
+                     for i in range(loaders)]
+        for process in processes:
+            process.start()
+        total = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return total / seconds
+    finally:
+        for _, process in workers:
+            process.terminate()
+            process.wait()
+
+def run(levels: list[int], loaders: int | None, clients: int, seconds: float) -> list[list]:
+    rows = []
+    base = None
+    for shard_count in levels:
+        throughput = run_level(shard_count, loaders or shard_count, clients, seconds)
+        base = base or throughput
+        rows.append([shard_count, loaders or shard_count, f"{throughput:,.0f}", f"{throughput / base:.2f}x"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--loaders", type=int, default=None, help="load generating processes, defaults to the number of shards")
+    parser.add_argument("--clients", type=int, default=50, help="simulated users per loader")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each measure")
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print_table(["shards", "loaders", "requests/s", "speedup"], run(args.shards, args.loaders, args.clients, args.seconds))
+
+if __name__ == "__main__":
+    main()
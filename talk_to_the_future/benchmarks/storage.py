@@ -0,0 +1,70 @@
+'''
+Write throughput and startup (recovery) time of the `Server` storage backends.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.storage [--messages 1000000 2000000] [--users 1000] [--snapshot-every 100000]
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from models.aad import AAD
+from models.message import MessageRecord
+from models.storage import MemoryStorage, DiskStorage
+from benchmarks.common import fake_public_keys, print_table
+
+def fill(storage: MemoryStorage, users: int, messages: int) -> float:
+    '''
+    Register `users` users then store `messages` messages spread over their mailboxes.
+
+    Returns:
+        float: Stored messages per second.
+    '''
+    names = [f"user{i}" for i in range(users)]
+    for name in names:
+        storage.add_user(name, fake_public_keys())
+    aad = AAD("user0", "user1", date(2100, 1, 1))
+    encoded_aad = aad.encode()
+    start = time.perf_counter()
+    for i in range(messages):
+        storage.add_message(names[i % users], MessageRecord(aad, {
+            "enc_sym_key"   : os.urandom(48),
+            "ciphertext"    : os.urandom(64),
+            "aad"           : encoded_aad,
+            "signature"     : os.urandom(64),
+        }, key_id=0))
+    return messages / (time.perf_counter() - start)
+
+def run(sizes: list[int], users: int, snapshot_every: int) -> list[list]:
+    rows = []
+    for messages in sizes:
+        rows.append([messages, "memory", f"{fill(MemoryStorage(), users, messages):,.0f}", "-"])
+
+        path = tempfile.mkdtemp(prefix="ttf-bench-")
+        try:
+            storage = DiskStorage(path, snapshot_every=snapshot_every)
+            throughput = fill(storage, users, messages)
+            storage.close()
+
+            start = time.perf_counter()
+            DiskStorage(path, snapshot_every=snapshot_every).close()
+            startup = time.perf_counter() - start
+            rows.append([messages, "disk", f"{throughput:,.0f}", f"{startup:.2f}"])
+        finally:
+            shutil.rmtree(path)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1_000_000, 2_000_000])
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--snapshot-every", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = run(args.messages, args.users, args.snapshot_every)
+    print_table(["messages", "backend", "writes/s", "startup s"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+'''
+Throughput and peak Python memory of streaming encryption against the in-memory
+`encrypt_and_sign` / `decrypt_and_verify` (skipped above `--max-in-memory`).
+
+The ciphertext stream goes through a temporary file, the plaintext is generated on the
+fly and the decrypted output discarded, so only the code under test holds memory.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.stream [--sizes 1M 100M 2G] [--max-in-memory 100M]
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from nacl.public import PrivateKey
+from nacl.signing import SigningKey
+from crypto import encrypt_and_sign, decrypt_and_verify, encrypt_and_sign_stream, decrypt_and_verify_stream
+from models.aad import AAD
+from benchmarks.common import print_table
+
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+BLOCK = os.urandom(1024 * 1024)
+
+def parse_size(text: str) -> int:
+    unit = text[-1].upper()
+    return int(float(text[:-1]) * UNITS[unit]) if unit in UNITS else int(text)
+
+def content(size: int):
+    for offset in range(0, size, len(BLOCK)):
+        yield BLOCK[:min(len(BLOCK), size - offset)]
+
+def traced(fn) -> tuple[float, int]:
+    '''
+    Returns:
+        tuple[float, int]: Duration in seconds and peak traced memory in bytes of `fn()`.
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+def run(sizes: list[int], max_in_memory: int) -> list[list]:
+    receiver, sender = PrivateKey.generate(), SigningKey.generate()
+    aad = AAD("sender", "receiver", date(2030, 1, 1)).encode()
+    mib = 1024 * 1024
+    rows = []
+    for size in sizes:
+        with tempfile.TemporaryFile() as stream:
+            payload = {}
+            enc_time, enc_peak = traced(lambda: payload.update(encrypt_and_sign_stream(
+                content(size), stream, aad, receiver.public_key.encode(), sender.encode())))
+            payload["verify_key"] = sender.verify_key.encode()
+            stream.seek(0)
+            dec_time, dec_peak = traced(lambda: decrypt_and_verify_stream(payload, stream, lambda chunk: None, receiver.encode()))
+        rows.append([f"{size / mib:,.0f}", "stream", f"{size / mib / enc_time:,.0f}", f"{enc_peak / mib:,.1f}",
+                     f"{size / mib / dec_time:,.0f}", f"{dec_peak / mib:,.1f}"])
+
+        if size <= max_in_memory:
+            message = b"".join(content(size))
+            payload = {}
+            enc_time, enc_peak = traced(lambda: payload.update(encrypt_and_sign(
+                message, aad, receiver.public_key.encode(), sender.encode())))
+            payload["verify_key"] = sender.verify_key.encode()
+            dec_time, dec_peak = traced(lambda: decrypt_and_verify(payload, receiver.encode()))
+            rows.append([f"{size / mib:,.0f}", "in-memory", f"{size / mib / enc_time:,.0f}", f"{enc_peak / mib:,.1f}",
+                         f"{size / mib / dec_time:,.0f}", f"{dec_peak / mib:,.1f}"])
+            del message, payload
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1M", "100M", "2G"])
+    parser.add_argument("--max-in-memory", default="100M", help="largest size also run with the in-memory functions")
+    args = parser.parse_args()
+
+    rows = run([parse_size(s) for s in args.sizes], parse_size(args.max_in_memory))
+    print_table(["MiB", "mode", "encrypt MiB/s", "encrypt peak MiB", "decrypt MiB/s", "decrypt peak MiB"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+'''
+Benchmark suite to run before releases: key generation for each KDF profile, encryption and
+decryption across message sizes, the AAD and date codecs, and every `Server` operation on a
+server holding N users and N messages, for each scale N.
+
+Runs offline, in one process. Each result is the mean latency of one call in nanoseconds
+(best of `--rounds` for the operations that don't modify the server). Results are written
+as JSON and compared with a baseline: a result slower than the baseline by more than
+`--threshold` is flagged as a regression and the command exits with status 1.
+
+Baselines depend on the machine, record one with `--update-baseline` on the machine
+the suite is then run on.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.suite [--groups crypto codec server] [--scales 1000 100000 1000000]
+                               [--output results.json] [--baseline benchmarks/baseline.json]
+                               [--update-baseline] [--threshold 0.25] [--rounds 3]
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date, datetime, timedelta
+import crypto.parameters as params
+from crypto import generate_keys, encrypt_and_sign, decrypt_and_verify
+from crypto.key_generation import generate_salt
+from models import Server
+from models.aad import AAD
+from nacl.public import PrivateKey
+from nacl.signing import SigningKey
+from utils.date_codec import encode_date, decode_date
+from benchmarks.common import quiet_tracer, fake_public_keys, per_op_ns, print_table
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+KDF_RUNS = {"test": 20, "interactive": 3, "moderate": 1, "sensitive": 1} # Argon2 runs per profile
+MESSAGE_SIZES = {"64B": 64, "4KB": 4 * 1024, "1MB": 1024 * 1024}
+SAMPLE = 1_000      # calls per server operation, each on a different user
+BROADCAST_SIZE = 10 # receivers of `send_broadcast` and `get_public_keys`
+
+def best_ns(fn, args: list[tuple], rounds: int) -> float:
+    return min(per_op_ns(fn, args) for _ in range(rounds))
+
+def bench_crypto(rounds: int) -> dict[str, float]:
+    results = {}
+    for profile, runs in KDF_RUNS.items():
+        results[f"crypto.generate_keys[{profile}]"] = per_op_ns(
+            generate_keys, [("password", generate_salt(), None, profile)] * runs)
+
+    receiver, sender = PrivateKey.generate(), SigningKey.generate()
+    aad = AAD("alice", "bob", date(2000, 1, 1)).encode()
+    for label, size in MESSAGE_SIZES.items():
+        calls = max(10, 1_000_000 // size)
+        content = os.urandom(size)
+        args = [(content, aad, receiver.public_key.encode(), sender.encode())] * calls
+        results[f"crypto.encrypt_and_sign[{label}]"] = best_ns(encrypt_and_sign, args, rounds)
+        payload = encrypt_and_sign(*args[0])
+        args = [(payload, receiver.encode(), sender.verify_key.encode())] * calls
+        results[f"crypto.decrypt_and_verify[{label}]"] = best_ns(decrypt_and_verify, args, rounds)
+    return results
+
+def bench_codecs(rounds: int) -> dict[str, float]:
+    calls = 100_000
+    days = [(date(2000, 1, 1) + timedelta(days=i % 20_000),) for i in range(calls)]
+    aads = [(AAD(f"sender{i % 100}", f"receiver{i % 1000}", day),) for i, (day,) in enumerate(days)]
+    encoded_aads = [(aad.encode(),) for (aad,) in aads]
+    return {
+        "codec.AAD.encode"      : best_ns(AAD.encode, aads, rounds),
+        "codec.AAD.decode"      : best_ns(AAD.decode, encoded_aads, rounds),
+        "codec.encode_date"     : best_ns(encode_date, days, rounds),
+        "codec.decode_date"     : best_ns(decode_date, [(encode_date(day),) for (day,) in days], rounds),
+    }
+
+def fake_message(sender: str, receiver: str, unlock_day: date) -> dict[str, bytes]:
+    return {
+        "enc_sym_key"   : os.urandom(48),
+        "ciphertext"    : os.urandom(100),
+        "aad"           : AAD(sender, receiver, unlock_day).encode(),
+        "signature"     : os.urandom(64),
+    }
+
+def bench_server(scale: int, rounds: int) -> dict[str, float]:
+    '''
+    Every public `Server` operation on a server holding `scale` users, each with one received
+    message (unlocked for even users, locked for odd ones). Lifecycle methods
+    (`start_scheduler`, `close`) are not measured.
+    '''
+    server = Server(name='Bench', tr=quiet_tracer())
+    keys = fake_public_keys()
+    names = [f"user{i}" for i in range(scale)]
+    for name in names:
+        server.register(name, keys)
+    past, future = date(2000, 1, 1), date(2100, 1, 1)
+    token = server.login(names[0], keys["password_tag"])
+    for i, name in enumerate(names):
+        server.send_message(names[0], token, fake_message(names[0], name, future if i % 2 else past))
+
+    count = min(SAMPLE, scale // 2)
+    sample = names[0:2 * count:2] # unlocked mailboxes
+    receivers = [names[(2 * i + 1) % scale] for i in range(count)]
+    tag = keys["password_tag"]
+    results = {}
+
+    def measure(operation: str, fn, args: list[tuple], mutates: bool = False) -> None:
+        results[f"server.{operation}[{scale}]"] = best_ns(fn, args, 1 if mutates else rounds)
+
+    new_names = [f"new{i}" for i in range(count)]
+    measure("register", server.register, [(name, keys) for name in new_names], mutates=True)
+    measure("login", server.login, [(name, tag) for name in sample], mutates=True)
+    tokens = [server.login(name, tag) for name in sample]
+    sessions = list(zip(sample, tokens))
+
+    measure("get_user_salt", server.get_user_salt, [(name,) for name in sample])
+    measure("get_user_kdf_params", server.get_user_kdf_params, [(name,) for name in sample])
+    measure("get_public_key", server.get_public_key, [(name,) for name in sample])
+    groups = [receivers[i:i + BROADCAST_SIZE] for i in range(0, count - BROADCAST_SIZE + 1, BROADCAST_SIZE)]
+    measure("get_public_keys", server.get_public_keys, [(group,) for group in groups])
+    measure("list_users", server.list_users, [()] * 3)
+    measure("show_registered_users", server.show_registered_users, [()] * 3)
+    measure("count_messages", server.count_messages, [(names[0], None, past, future)] * 3)
+    measure("find_messages", server.find_messages, [(None, name) for name in sample])
+    measure("count_unlocks_by_day", server.count_unlocks_by_day, [(future - timedelta(days=365), future)] * 3) # a year, day by day
+
+    messages = [fake_message(name, receiver, future) for name, receiver in zip(sample, receivers)]
+    measure("send_message", server.send_message,
+            [(name, token, message) for (name, token), message in zip(sessions, messages)], mutates=True)
+    broadcasts = []
+    for (name, token), group in zip(sessions, groups):
+        broadcast = fake_message(name, "", future)
+        broadcast["aad"] = AAD.for_broadcast(name, group, future).encode()
+        broadcast["enc_sym_keys"] = {receiver: os.urandom(48) for receiver in group}
+        broadcasts.append((name, token, broadcast))
+    measure("send_broadcast", server.send_broadcast, broadcasts, mutates=True)
+    measure("authenticate_sender", server.authenticate_sender,
+            [(name, token, message) for (name, token), message in zip(sessions, messages)])
+    measure("deliver_message", server.deliver_message, [(message, keys["verify_key"]) for message in messages], mutates=True)
+
+    measure("sync", server.sync, [(name, token) for name, token in sessions])
+    cursors = [server.sync(name, token)["cursor"] for name, token in sessions]
+    measure("sync_incremental", server.sync, [(name, token, cursor) for (name, token), cursor in zip(sessions, cursors)])
+    measure("get_messages_aad", server.get_messages_aad, sessions)
+    measure("get_message_payload", server.get_message_payload, [(name, token, 0) for name, token in sessions])
+    measure("get_message_payloads", server.get_message_payloads, [(name, token, [0]) for name, token in sessions])
+    measure("get_message_key", server.get_message_key, [(name, token, 0) for name, token in sessions])
+    measure("tick", server.tick, [()] * count)
+
+    callback = lambda message_id, aad: None
+    measure("subscribe_unlocks", server.subscribe_unlocks, [(name, token, callback) for name, token in sessions], mutates=True)
+    measure("unsubscribe_unlocks", server.unsubscribe_unlocks, [(name, token, callback) for name, token in sessions], mutates=True)
+    measure("delete_message", server.delete_message, [(name, token, 0) for name, token in sessions], mutates=True)
+    measure("update_keys", server.update_keys, [(name, token, keys) for name, token in sessions], mutates=True)
+
+    exports = [server.export_user(name) for name in sample]
+    measure("export_user", server.export_user, [(name,) for name in sample])
+    measure("drop_user", server.drop_user, [(name,) for name in sample], mutates=True)
+    measure("import_user", server.import_user, exports, mutates=True)
+
+    new_sessions = [(name, server.login(name, tag)) for name in new_names]
+    measure("logout", server.logout, new_sessions, mutates=True)
+    new_sessions = [(name, server.login(name, tag)) for name in new_names]
+    measure("remove", server.remove, new_sessions, mutates=True)
+    server.close()
+    return results
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> tuple[list[list], int]:
+    '''
+    Returns:
+        tuple[list[list], int]: One row per result (name, baseline ns, ns, change, flag)
+            and the number of regressions.
+    '''
+    rows, regressions = [], 0
+    for name, ns in results.items():
+        before = baseline.get(name)
+        if before is None:
+            rows.append([name, "-", f"{ns:,.0f}", "-", "new"])
+            continue
+        change = ns / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "improved"
+        rows.append([name, f"{before:,.0f}", f"{ns:,.0f}", f"{change:+.1%}", flag])
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=["crypto", "codec", "server"], default=["crypto", "codec", "server"])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="users and messages held by the server")
+    parser.add_argument("--rounds", type=int, default=3, help="measures of each operation, the best one is kept")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    if "crypto" in args.groups:
+        results.update(bench_crypto(args.rounds))
+    if "codec" in args.groups:
+        results.update(bench_codecs(args.rounds))
+    if "server" in args.groups:
+        for scale in args.scales:
+            start = time.perf_counter()
+            results.update(bench_server(scale, args.rounds))
+            print(f"server at {scale:,} users: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "date"      : datetime.now().isoformat(timespec="seconds"),
+            "python"    : platform.python_version(),
+            "machine"   : platform.platform(),
+            "cpus"      : os.cpu_count(),
+            "kdf"       : {profile: params.KDF_PROFILES[profile] for profile in KDF_RUNS},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    rows, regressions = compare(results, baseline, args.threshold)
+    print_table(["benchmark", "baseline ns", "ns", "change", ""], rows)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+'''
+Cost of refreshing a mailbox of N messages: full `get_messages_aad` against incremental
+`sync` when nothing changed and when `--changes` messages arrived since the last sync.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.sync [--messages 1000 10000 100000] [--changes 10] [--repeat 20]
+'''
+import argparse
+import os
+import time
+from datetime import date
+from models import Server
+from models.aad import AAD
+from network import codec
+from benchmarks.common import quiet_tracer, fake_public_keys, print_table
+
+def fake_message(unlock_day: date) -> dict[str, bytes]:
+    return {
+        "enc_sym_key"   : os.urandom(48),
+        "ciphertext"    : os.urandom(100),
+        "aad"           : AAD("sender", "receiver", unlock_day).encode(),
+        "signature"     : os.urandom(64),
+    }
+
+def mean_ms(fn, repeat: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+def run(sizes: list[int], changes: int, repeat: int) -> list[list]:
+    rows = []
+    for size in sizes:
+        server = Server(name='Bench', tr=quiet_tracer())
+        tokens = {}
+        for username in ("sender", "receiver"):
+            keys = fake_public_keys()
+            server.register(username, keys)
+            tokens[username] = server.login(username, keys["password_tag"])
+        message = fake_message(date(2000, 1, 1))
+        for _ in range(size):
+            server.send_message("sender", tokens["sender"], message)
+
+        full_ms, full = mean_ms(lambda: server.get_messages_aad("receiver", tokens["receiver"]), repeat)
+        cursor = None
+        while True:
+            result = server.sync("receiver", tokens["receiver"], cursor, limit=size)
+            cursor = result["cursor"]
+            if not result["more"]:
+                break
+        idle_ms, idle = mean_ms(lambda: server.sync("receiver", tokens["receiver"], cursor), repeat)
+
+        # `changes` new messages before each sync
+        elapsed, updated = 0.0, None
+        for _ in range(repeat):
+            for _ in range(changes):
+                server.send_message("sender", tokens["sender"], message)
+            start = time.perf_counter()
+            updated = server.sync("receiver", tokens["receiver"], cursor)
+            elapsed += time.perf_counter() - start
+            cursor = updated["cursor"]
+        changed_ms = elapsed * 1000 / repeat
+
+        rows.append([f"{size:,}", f"{full_ms:.3f}", f"{len(codec.encode(full)):,}", f"{idle_ms:.3f}",
+                     f"{len(codec.encode(idle)):,}", f"{changed_ms:.3f}", f"{len(codec.encode(updated)):,}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="mailbox sizes")
+    parser.add_argument("--changes", type=int, default=10, help="messages received between two syncs")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print_table(["messages", "full ms", "full bytes", "sync idle ms", "idle bytes",
+                 f"sync +{args.changes} ms", f"+{args.changes} bytes"], run(args.messages, args.changes, args.repeat))
+
+if __name__ == "__main__":
+    main()
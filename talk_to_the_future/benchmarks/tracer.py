@@ -0,0 +1,82 @@
+'''
+Cost of logging on the hot paths: a filtered call (level below the tracer's) with eager
+f-string formatting against lazy arguments, and the `Server` read path at WARNING level
+against a server whose tracer does nothing at all.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.tracer [--calls 1000000] [--messages 10000] [--rounds 10]
+'''
+import argparse
+import io
+import os
+from datetime import date
+from models import Server
+from models.aad import AAD
+from utils.logger import Tracer, JsonSink, BackgroundSink
+from benchmarks.common import fake_public_keys, per_op_ns, print_table
+
+class NullTracer(Tracer):
+    '''Tracer whose every method is a no-op: the floor of logging overhead.'''
+    def set_level(self, trace_level: str) -> None:
+        super().set_level('ERROR')
+        self.error = lambda *args, **fields: None
+
+def micro(calls: int) -> list[list]:
+    tr = Tracer(trace_level='WARNING')
+    name, args = "Server", [(i,) for i in range(calls)]
+    eager = per_op_ns(lambda i: tr.debug(f'[{name}]: Returning message (id:{i}) with key'), args)
+    lazy = per_op_ns(lambda i: tr.debug('[%s]: Returning message (id:%s) with key', name, i), args)
+    empty = per_op_ns(lambda i: None, args)
+    sink = BackgroundSink(JsonSink(io.StringIO()))
+    enabled_tr = Tracer(trace_level='DEBUG', sink=sink)
+    enabled = per_op_ns(lambda i: enabled_tr.debug('[%s]: Returning message (id:%s) with key', name, i), args[:calls // 10])
+    sink.close()
+    return [["filtered, f-string", f"{eager:.0f}"], ["filtered, lazy args", f"{lazy:.0f}"],
+            ["empty call (floor)", f"{empty:.0f}"], ["enabled, background JSON", f"{enabled:.0f}"]]
+
+def read_path(tracers: dict[str, Tracer], messages: int, rounds: int) -> dict[str, float]:
+    '''
+    Returns:
+        dict[str, float]: Best mean ns of `get_message_payload` on a mailbox of `messages`
+            unlocked messages, with each tracer in turn plugged into the same server.
+    '''
+    server = Server(name='Bench', tr=next(iter(tracers.values())))
+    tokens = {}
+    for username in ("sender", "receiver"):
+        keys = fake_public_keys()
+        server.register(username, keys)
+        tokens[username] = server.login(username, keys["password_tag"])
+    message = {"enc_sym_key": os.urandom(48), "ciphertext": os.urandom(100),
+               "aad": AAD("sender", "receiver", date(2000, 1, 1)).encode(), "signature": os.urandom(64)}
+    for _ in range(messages):
+        server.send_message("sender", tokens["sender"], message)
+    calls = [("receiver", tokens["receiver"], i) for i in range(messages)]
+    best = {name: float("inf") for name in tracers}
+    names = list(tracers)
+    for r in range(rounds):
+        for name in names[r % len(names):] + names[:r % len(names)]: # rotate to spread warm-up effects
+            tr = tracers[name]
+            server.tr = tr
+            best[name] = min(best[name], per_op_ns(server.get_message_payload, calls))
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1_000_000, help="log calls of the micro benchmark")
+    parser.add_argument("--messages", type=int, default=10_000, help="messages read by the server benchmark")
+    parser.add_argument("--rounds", type=int, default=10, help="measures of each tracer, the best one is kept")
+    args = parser.parse_args()
+
+    print_table(["debug call", "ns/call"], micro(args.calls))
+    print()
+    sink = BackgroundSink(JsonSink(io.StringIO()))
+    tracers = {"no-op tracer": NullTracer(), "WARNING": Tracer(trace_level='WARNING'),
+               "DEBUG (background JSON)": Tracer(trace_level='DEBUG', sink=sink)}
+    results = read_path(tracers, args.messages, args.rounds)
+    sink.close()
+    null = results["no-op tracer"]
+    print_table(["get_message_payload", "ns/call", "overhead"],
+                [[name, f"{ns:.0f}", f"{(ns - null) / null:+.1%}" if name != "no-op tracer" else "-"] for name, ns in results.items()])
+
+if __name__ == "__main__":
+    main()
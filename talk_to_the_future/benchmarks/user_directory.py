@@ -0,0 +1,52 @@
+'''
+Per-operation latency of the user lookups of `Server` as the number of users grows.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.user_directory [--sizes 1000 10000 100000 1000000] [--ops 10000]
+'''
+import argparse
+import random
+from datetime import date
+from models import Server
+from models.aad import AAD
+from benchmarks.common import quiet_tracer, fake_public_keys, per_op_ns, print_table
+
+def run(sizes: list[int], ops: int) -> list[list]:
+    rows = []
+    for size in sizes:
+        server = Server(name='Bench', tr=quiet_tracer())
+        keys = fake_public_keys() # keys are shared, only names matter for the lookups
+        names = [f"user{i}" for i in range(size)]
+        for name in names:
+            server.register(name, keys)
+
+        sample = random.choices(names, k=ops)
+        sender = names[0]
+        messages = [{
+            "enc_sym_key"   : b"k",
+            "ciphertext"    : b"c",
+            "aad"           : AAD(sender, receiver, date(2000, 1, 1)).encode(),
+            "signature"     : b"s",
+        } for receiver in sample]
+
+        public_key = per_op_ns(server.get_public_key, [(n,) for n in sample])
+        login = per_op_ns(server.login, [(n, keys["password_tag"]) for n in sample])
+        token = server.login(sender, keys["password_tag"]) # sample logins may have replaced the session
+        send = per_op_ns(server.send_message, [(sender, token, m) for m in messages])
+        new_names = [f"new{i}" for i in range(ops)]
+        register = per_op_ns(server.register, [(n, keys) for n in new_names])
+
+        rows.append([size, f"{public_key:.0f}", f"{login:.0f}", f"{send:.0f}", f"{register:.0f}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.ops)
+    print_table(["users", "get_public_key ns", "login ns", "send_message ns", "register ns"], rows)
+
+if __name__ == "__main__":
+    main()
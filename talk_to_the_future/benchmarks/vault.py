@@ -0,0 +1,66 @@
+'''
+Unlock-day spike: `--messages` messages of `--size` bytes unlocking the same day for one
+receiver, read at unlock with `get_message_payloads` (full payloads fetched) against
+`read_vault` after a `prefetch_future_messages` done before the unlock day (keys only).
+
+Reports the bytes the server sends on unlock day (codec encoding of its responses) and
+the time to read every message.
+
+Usage (from talk_to_the_future/):
+    python -m benchmarks.vault [--messages 1000] [--size 10000]
+'''
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from models import Client, Server
+from benchmarks.common import quiet_tracer, print_table, CountingServer
+
+def run(messages: int, size: int) -> list[list]:
+    unlock_day = date.today() + timedelta(days=1)
+    rows = []
+    for mode in ("get_message_payloads", "read_vault"):
+        clock = [date.today()]
+        server = Server(name='Bench', tr=quiet_tracer())
+        server._Server__scheduler.clock = lambda: clock[0]
+        counting = CountingServer(server)
+        sender = Client("sender", "password", quiet_tracer(), kdf_profile="test")
+        receiver = Client("receiver", "password", quiet_tracer(), kdf_profile="test")
+        for client in (sender, receiver):
+            client.register_on(counting)
+            client.login_on(counting)
+        content = os.urandom(size // 2).hex()
+        for _ in range(messages):
+            sender.send_message(content, "receiver", unlock_day)
+
+        with tempfile.TemporaryDirectory() as directory:
+            if mode == "read_vault":
+                receiver.open_vault(os.path.join(directory, "vault"))
+                receiver.prefetch_future_messages()
+            clock[0] = unlock_day
+            server.tick(unlock_day)
+            counting.sent = 0
+            start = time.perf_counter()
+            if mode == "read_vault":
+                read = receiver.read_vault(unlock_day)
+            else:
+                message_ids = list(receiver.get_messages_aad())
+                payloads = counting.get_message_payloads("receiver", receiver.token, message_ids)
+                read = {message_id: receiver.decrypt_message(payload) for message_id, payload in payloads.items()}
+            elapsed = time.perf_counter() - start
+            if receiver.vault is not None:
+                receiver.vault.close()
+        rows.append([mode, len(read), f"{counting.sent:,}", f"{elapsed * 1000:.1f}"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000)
+    parser.add_argument("--size", type=int, default=10_000, help="bytes of each message")
+    args = parser.parse_args()
+
+    print_table(["unlock day read", "messages", "bytes sent", "ms"], run(args.messages, args.size))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
 from .interface import (
     generate_keys,
+    generate_keys_future,
+    generate_keys_async,
     generate_token,
     encrypt_and_sign,
-    decrypt_and_verify
-)
\ No newline at end of file
+    encrypt_and_sign_broadcast,
+    decrypt_and_verify,
+    decrypt_and_verify_many,
+    rewrap_sym_keys,
+    escrow_private_keys,
+    open_escrowed_keys
+)
+from .stream import (
+    encrypt_and_sign_stream,
+    decrypt_and_verify_stream
+)
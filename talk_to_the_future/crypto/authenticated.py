@@ -1,14 +1,17 @@
 import crypto.parameters as params
+import utils.metrics as metrics
 from nacl.utils import random
 from nacl import secret
 
 def generate_sym_key() -> bytes:
     return random(params.SYM_KEY_SIZE)
 
+@metrics.timed("crypto.encrypt_message")
 def encrypt_message(message: bytes, aad: bytes, sym_key: bytes) -> bytes:
     box = secret.Aead(sym_key)
     return box.encrypt(message, aad)
 
+@metrics.timed("crypto.decrypt_message")
 def decrypt_message(encrypted: bytes, aad: bytes, sym_key: bytes) -> bytes:
     box = secret.Aead(sym_key)
     return box.decrypt(encrypted, aad)
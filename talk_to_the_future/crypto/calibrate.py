@@ -0,0 +1,71 @@
+'''
+Measure Argon2id on this machine and recommend the strongest KDF cost that fits a
+latency and memory budget.
+
+Usage (from talk_to_the_future/):
+    python -m crypto.calibrate [--target-ms 1000] [--max-memory-mib 1024]
+'''
+import argparse
+import time
+import crypto.parameters as params
+import crypto.key_generation as kg
+
+def measure(opslimit: int, memlimit: int, rounds: int = 1) -> float:
+    '''
+    Returns:
+        float: Best duration of one master key derivation, in milliseconds.
+    '''
+    salt = kg.generate_salt()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        kg.generate_master_key(b"calibration", salt, opslimit, memlimit)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def calibrate(target_ms: float, max_memory: int, rounds: int = 1) -> tuple[dict[str, float], str | None, tuple[int, int]]:
+    '''
+    Time every profile of `params.KDF_PROFILES` within `max_memory`, then search the
+    highest opslimit that fits `target_ms` using all of `max_memory`.
+
+    Returns:
+        dict[str, float]: Duration in ms of each profile that fits the memory budget.
+        str: Strongest profile within `target_ms`, None if even the cheapest one is too slow.
+        tuple[int, int]: Custom (opslimit, memlimit) using the whole budget.
+    '''
+    timings = {}
+    recommended = None
+    for name, (opslimit, memlimit) in sorted(params.KDF_PROFILES.items(), key=lambda p: p[1]):
+        if memlimit > max_memory:
+            continue
+        timings[name] = measure(opslimit, memlimit, rounds)
+        if timings[name] <= target_ms and name != 'test':
+            recommended = name
+
+    # Argon2 time grows linearly with opslimit at a fixed memlimit
+    memlimit = max(params.argon2id.MEMLIMIT_MIN, max_memory - max_memory % 1024)
+    one_pass = measure(params.argon2id.OPSLIMIT_MIN, memlimit, rounds)
+    opslimit = max(params.argon2id.OPSLIMIT_MIN, int(target_ms // one_pass))
+    return timings, recommended, (opslimit, memlimit)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=1000, help="maximum latency of one key derivation")
+    parser.add_argument("--max-memory-mib", type=int, default=1024, help="maximum memory of one key derivation")
+    parser.add_argument("--rounds", type=int, default=1, help="measures per setting, the best one is kept")
+    args = parser.parse_args()
+
+    timings, recommended, (opslimit, memlimit) = calibrate(args.target_ms, args.max_memory_mib * 1024 * 1024, args.rounds)
+    for name, ms in timings.items():
+        opslimit_p, memlimit_p = params.KDF_PROFILES[name]
+        print(f"{name:<12} opslimit={opslimit_p:<3} memlimit={memlimit_p // 1024 // 1024:>5} MiB  {ms:>9.1f} ms")
+    print()
+    if recommended:
+        print(f"Recommended profile: {recommended}  (KDF_PROFILE = '{recommended}' in crypto/parameters.py)")
+    else:
+        print(f"No profile fits {args.target_ms:.0f} ms with {args.max_memory_mib} MiB.")
+    print(f"Custom parameters for the whole budget: opslimit={opslimit} memlimit={memlimit}")
+    print(f"Parallel derivations need KDF_POOL_SIZE x {memlimit // 1024 // 1024} MiB (KDF_POOL_SIZE = {params.KDF_POOL_SIZE}).")
+
+if __name__ == "__main__":
+    main()
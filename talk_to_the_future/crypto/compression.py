@@ -0,0 +1,61 @@
+import crypto.parameters as params
+import utils.metrics as metrics
+import zlib
+
+try:
+    import zstandard
+except ImportError: # optional dependency, zlib is always available
+    zstandard = None
+
+# Compression of message contents before their encryption (see `interface.encrypt_and_sign`).
+# The codec used is written in the "codec" field of the payload, covered by the signature.
+
+def available_codecs() -> list[str]:
+    return ["zlib", "zstd"] if zstandard else ["zlib"]
+
+@metrics.timed("crypto.compress")
+def compress(message: bytes, codec: str) -> tuple[bytes, bytes | None]:
+    '''
+    Compress `message` with `codec` if it is at least `COMPRESSION_THRESHOLD` bytes long.
+
+    Returns:
+        tuple[bytes, bytes | None]: The data to encrypt and the codec to record in the payload,
+            `message` and None if it was left as is (too short or not made smaller).
+    '''
+    if len(message) < params.COMPRESSION_THRESHOLD:
+        return message, None
+    if codec == "zlib":
+        compressed = zlib.compress(message, params.ZLIB_LEVEL)
+    elif codec == "zstd" and zstandard:
+        compressed = zstandard.ZstdCompressor(level=params.ZSTD_LEVEL).compress(message)
+    else:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if len(compressed) >= len(message):
+        return message, None
+    return compressed, codec.encode()
+
+@metrics.timed("crypto.decompress")
+def decompress(data: bytes, codec: bytes) -> bytes:
+    '''
+    Reverse `compress`. Contents expanding beyond `MAX_DECOMPRESSED_SIZE` are refused.
+    '''
+    limit = params.MAX_DECOMPRESSED_SIZE
+    if codec == b"zlib":
+        decompressor = zlib.decompressobj()
+        try:
+            message = decompressor.decompress(data, limit)
+        except zlib.error as error:
+            raise ValueError(f"Invalid compressed content: {error}")
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Compressed content is truncated or too large!")
+        return message
+    if codec == b"zstd":
+        if zstandard is None:
+            raise ValueError("zstd compressed content, install zstandard to read it")
+        try:
+            if zstandard.frame_content_size(data) > limit:
+                raise ValueError("Compressed content is too large!")
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=limit)
+        except zstandard.ZstdError as error:
+            raise ValueError(f"Invalid compressed content: {error}")
+    raise ValueError(f"Unknown compression codec: {bytes(codec)!r}")
@@ -2,14 +2,42 @@ import crypto.parameters as params
 import crypto.key_generation as kg
 import crypto.public as public
 import crypto.authenticated as authenticated
+import crypto.compression as compression
+import crypto.kdf_pool as kdf_pool
+import crypto.stream as stream
+import utils.metrics as metrics
+import asyncio
+import io
 import secrets
-
-def generate_keys(password: str, salt: bytes | None = None) -> tuple[dict[str, bytes], dict[str, bytes]]:
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from nacl.exceptions import CryptoError
+from nacl.public import SealedBox
+from nacl.signing import SigningKey, VerifyKey
+
+# Domain of each signed bundle, so a signature made for one layout is never valid for another
+SIGNED_MESSAGE = b"TTF-message\x00"
+SIGNED_BROADCAST = b"TTF-broadcast\x00"
+BUNDLE_FIELD_LENGTH = struct.Struct(">I") # prefixes each field of a signed bundle, see `models.aad`
+BROADCAST_AAD_PREFIX = bytes((1, 1))      # version and kind bytes of the AAD of a broadcast, see `models.aad`
+
+@metrics.timed("crypto.generate_keys")
+def generate_keys(password: str, salt: bytes | None = None, kdf_params: bytes | None = None, 
+                  profile: str | None = None) -> tuple[dict[str, bytes], dict[str, bytes]]:
 
     if not salt :
         salt = kg.generate_salt()
 
-    master_key = kg.generate_master_key(password.encode(), salt)
+    # Existing keys are regenerated with the parameters they were created with,
+    # new ones with the requested profile
+    if kdf_params:
+        opslimit, memlimit = kg.decode_kdf_params(kdf_params)
+    elif profile:
+        opslimit, memlimit = params.KDF_PROFILES[profile]
+    else:
+        opslimit, memlimit = params.OPSLIMIT, params.MEMLIMIT
+
+    master_key = kg.generate_master_key(password.encode(), salt, opslimit, memlimit)
 
     password_tag = kg.derive_password_tag(master_key)
 
@@ -27,18 +55,35 @@ def generate_keys(password: str, salt: bytes | None = None) -> tuple[dict[str, b
         "password_tag"  : password_tag,
         "public_key"    : public_key,
         "verify_key"    : verify_key,
+        "kdf_params"    : kg.encode_kdf_params(opslimit, memlimit),
     }
     return private_keys, public_keys
 
-def encrypt_and_sign(message: bytes, aad: bytes, receiver_pub_key: bytes, sender_sign_key: bytes) -> dict[str, bytes]:
+@metrics.timed("crypto.generate_keys_future")
+def generate_keys_future(password: str, salt: bytes | None = None, kdf_params: bytes | None = None, 
+                         profile: str | None = None) -> Future:
+    # Argon2 runs in the KDF process pool, the caller keeps running
+    return kdf_pool.submit(generate_keys, password, salt, kdf_params, profile)
+
+@metrics.timed("crypto.generate_keys_async")
+async def generate_keys_async(password: str, salt: bytes | None = None, kdf_params: bytes | None = None, 
+                              profile: str | None = None) -> tuple[dict[str, bytes], dict[str, bytes]]:
+    return await asyncio.wrap_future(generate_keys_future(password, salt, kdf_params, profile))
+
+@metrics.timed("crypto.encrypt_and_sign")
+def encrypt_and_sign(message: bytes, aad: bytes, receiver_pub_key: bytes | SealedBox,
+                     sender_sign_key: bytes | SigningKey, compression_codec: str | None = None) -> dict[str, bytes]:
 
     sym_key = authenticated.generate_sym_key()
 
+    # Opt-in, long contents only: the codec used is signed with the rest of the payload
+    message, codec = compression.compress(message, compression_codec) if compression_codec else (message, None)
+
     ciphertext = authenticated.encrypt_message(message, aad, sym_key)
 
     enc_sym_key = public.encrypt_sym_key(sym_key, receiver_pub_key)
 
-    signature = public.sign_bundle(bundle=(enc_sym_key + ciphertext + aad), sign_key=sender_sign_key)
+    signature = public.sign_bundle(bundle=_signed_bundle(False, enc_sym_key, ciphertext, aad, codec), sign_key=sender_sign_key)
 
     payload = {
         "enc_sym_key"   : enc_sym_key,
@@ -46,18 +91,140 @@ def encrypt_and_sign(message: bytes, aad: bytes, receiver_pub_key: bytes, sender
         "aad"           : aad,
         "signature"     : signature
     }
+    if codec:
+        payload["codec"] = codec
 
     return payload
 
-def decrypt_and_verify(payload: dict[str, bytes], receiver_private_key: bytes) -> bytes :
-    bundle = payload["enc_sym_key"] + payload["ciphertext"] + payload["aad"]
+@metrics.timed("crypto.encrypt_and_sign_broadcast")
+def encrypt_and_sign_broadcast(message: bytes, aad: bytes, receiver_pub_keys: dict[str, bytes],
+                               sender_sign_key: bytes | SigningKey, compression_codec: str | None = None) -> dict:
+
+    # Content is encrypted and signed once, only the symmetric key is sealed for each receiver
+    sym_key = authenticated.generate_sym_key()
 
-    public.verify_bundle(payload["signature"], bundle, payload["verify_key"])
+    message, codec = compression.compress(message, compression_codec) if compression_codec else (message, None)
 
-    sym_key = public.decrypt_sym_key(payload["enc_sym_key"], receiver_private_key)
+    ciphertext = authenticated.encrypt_message(message, aad, sym_key)
 
-    plaintext = authenticated.decrypt_message(payload["ciphertext"], payload["aad"], sym_key)
-    return plaintext
+    enc_sym_keys = {name: public.encrypt_sym_key(sym_key, pub_key) for name, pub_key in receiver_pub_keys.items()}
 
+    # The aad holds the receivers list, a swapped key slot can't decrypt the signed ciphertext
+    signature = public.sign_bundle(bundle=_signed_bundle(True, None, ciphertext, aad, codec), sign_key=sender_sign_key)
+
+    payload = {
+        "enc_sym_keys"  : enc_sym_keys,
+        "ciphertext"    : ciphertext,
+        "aad"           : aad,
+        "signature"     : signature
+    }
+    if codec:
+        payload["codec"] = codec
+
+    return payload
+
+@metrics.timed("crypto.decrypt_and_verify")
+def decrypt_and_verify(payload: dict[str, bytes], receiver_private_key: bytes | SealedBox | list[bytes | SealedBox],
+                       verify_key: VerifyKey | None = None) -> bytes :
+    if "header" in payload:
+        # Sent by `encrypt_and_sign_stream`: its bundle is signed in its own domain
+        plaintext = bytearray()
+        stream.decrypt_and_verify_stream(payload, io.BytesIO(payload["ciphertext"]), plaintext.extend, receiver_private_key, verify_key)
+        return bytes(plaintext)
+
+    codec = payload.get("codec")
+    # The layout is the one of the signed AAD, not told by the unsigned fields of the payload
+    if _is_broadcast(payload["aad"]):
+        bundle = _signed_bundle(True, None, payload["ciphertext"], payload["aad"], codec)
+    else:
+        bundle = _signed_bundle(False, payload["enc_sym_key"], payload["ciphertext"], payload["aad"], codec)
+
+    public.verify_bundle(payload["signature"], bundle, verify_key if verify_key else payload["verify_key"])
+
+    # The signed enc_sym_key is kept once the key is rewrapped, see `rewrap_sym_keys`
+    sym_key = public.decrypt_key_slot(payload, receiver_private_key)
+
+    plaintext = authenticated.decrypt_message(payload["ciphertext"], payload["aad"], sym_key)
+    return compression.decompress(plaintext, codec) if codec else plaintext
+
+@metrics.timed("crypto.decrypt_and_verify_many")
+def decrypt_and_verify_many(payloads: list[dict[str, bytes]], receiver_private_key: bytes | SealedBox | list[bytes | SealedBox],
+                            max_workers: int | None = None) -> list[tuple[bytes | None, Exception | None]]:
+
+    # Keys are parsed once for the whole batch, verify keys on first use by a message
+    private_box = _load_private_boxes(receiver_private_key)
+    verify_keys: dict[bytes, VerifyKey] = {}
+
+    # A failing message, its verify key included, gets its own error instead of aborting the batch
+    def decrypt(payload: dict[str, bytes]) -> tuple[bytes | None, Exception | None]:
+        try:
+            verify_key = verify_keys.get(payload["verify_key"])
+            if verify_key is None:
+                verify_key = verify_keys[payload["verify_key"]] = public.load_verify_key(payload["verify_key"])
+            return decrypt_and_verify(payload, private_box, verify_key), None
+        except (ValueError, TypeError, KeyError, CryptoError) as error:
+            return None, error
+
+    # libsodium releases the GIL, signatures and decryptions run in parallel
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(decrypt, payloads))
+
+@metrics.timed("crypto.rewrap_sym_keys")
+def rewrap_sym_keys(key_slots: dict[int, dict[str, bytes]], receiver_private_key: bytes | SealedBox | list[bytes | SealedBox],
+                    new_public_key: bytes | SealedBox, max_workers: int | None = None) -> dict[int, bytes]:
+    '''
+    Re-seal the symmetric key of each key slot (message_id: enc_sym_key and optional rewrapped_key)
+    to `new_public_key`, so the messages stay readable after a key rotation.
+
+    The sender's signature covers the original enc_sym_key: it is kept and the new slot
+    becomes the message rewrapped_key. Slots that can't be opened are left out.
+
+    Returns:
+        dict[int, bytes]: The rewrapped_key of each message.
+    '''
+    private_box = _load_private_boxes(receiver_private_key)
+    public_box = new_public_key if isinstance(new_public_key, SealedBox) else public.load_public_box(new_public_key)
+
+    def rewrap(key_slot: dict[str, bytes]) -> bytes | None:
+        try:
+            return public.encrypt_sym_key(public.decrypt_key_slot(key_slot, private_box), public_box)
+        except (KeyError, CryptoError):
+            return None
+
+    # libsodium releases the GIL, keys are unsealed and sealed in parallel
+    with ThreadPoolExecutor(max_workers) as pool:
+        rewrapped = zip(key_slots, pool.map(rewrap, key_slots.values()))
+        return {message_id: key for message_id, key in rewrapped if key is not None}
+
+@metrics.timed("crypto.escrow_private_keys")
+def escrow_private_keys(private_keys: list[bytes], public_key: bytes | SealedBox) -> list[bytes]:
+    # Former private keys sealed to the new public key: only its owner can open them
+    box = public_key if isinstance(public_key, SealedBox) else public.load_public_box(public_key)
+    return [box.encrypt(private_key) for private_key in private_keys]
+
+@metrics.timed("crypto.open_escrowed_keys")
+def open_escrowed_keys(escrowed_keys: list[bytes], private_key: bytes | SealedBox) -> list[bytes]:
+    box = private_key if isinstance(private_key, SealedBox) else public.load_private_box(private_key)
+    return [box.decrypt(escrowed_key) for escrowed_key in escrowed_keys]
+
+def _signed_bundle(broadcast: bool, enc_sym_key: bytes | None, ciphertext: bytes, aad: bytes, codec: bytes | None) -> bytes:
+    # domain | len(field) | field ... : no two sets of fields give the same bundle.
+    # A broadcast key slot is not signed: the receivers list of the aad binds the ciphertext to them
+    fields = (ciphertext, aad, codec or b"") if broadcast else (enc_sym_key, ciphertext, aad, codec or b"")
+    parts = [SIGNED_BROADCAST if broadcast else SIGNED_MESSAGE]
+    for field in fields:
+        parts += (BUNDLE_FIELD_LENGTH.pack(len(field)), field)
+    return b"".join(parts)
+
+def _is_broadcast(aad: bytes) -> bool:
+    # Told by the signed AAD, without decoding it: crypto doesn't depend on the models
+    return bytes(aad[:2]) == BROADCAST_AAD_PREFIX
+
+def _load_private_boxes(private_key: bytes | SealedBox | list[bytes | SealedBox]) -> SealedBox | list[SealedBox]:
+    if isinstance(private_key, list):
+        return [_load_private_boxes(key) for key in private_key]
+    return private_key if isinstance(private_key, SealedBox) else public.load_private_box(private_key)
+
+@metrics.timed("crypto.generate_token")
 def generate_token() -> str:
     return secrets.token_hex(params.TOKEN_SIZE)
\ No newline at end of file
@@ -0,0 +1,29 @@
+import crypto.parameters as params
+import atexit
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Bounded process pool running the Argon2 key derivations, so they neither block the
+# caller nor the GIL. At most `params.KDF_POOL_SIZE` derivations (and their memlimit)
+# run at the same time, the others wait in the pool queue.
+_executor: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=params.KDF_POOL_SIZE)
+        return _executor
+
+def submit(fn, *args) -> Future:
+    return get_executor().submit(fn, *args)
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+atexit.register(shutdown)
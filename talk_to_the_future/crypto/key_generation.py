@@ -1,18 +1,29 @@
 import crypto.parameters as params
+import utils.metrics as metrics
 from nacl.utils import random
 import hmac
+import struct
 from nacl.public import PrivateKey
 from nacl.signing import SigningKey
 
 def generate_salt() -> bytes: 
     return random(params.SALT_SIZE)
 
-def generate_master_key(password: bytes, salt: bytes) -> bytes:
+@metrics.timed("crypto.generate_master_key")
+def generate_master_key(password: bytes, salt: bytes, opslimit: int | None = None, memlimit: int | None = None) -> bytes:
     return params.master_kdf(size=params.MASTER_KEY_SIZE,
                             password=password,
                             salt=salt,
-                            opslimit=params.OPSLIMIT,
-                            memlimit=params.MEMLIMIT)
+                            opslimit=opslimit if opslimit else params.OPSLIMIT,
+                            memlimit=memlimit if memlimit else params.MEMLIMIT)
+
+def encode_kdf_params(opslimit: int, memlimit: int) -> bytes:
+    return struct.pack(">QQ", opslimit, memlimit)
+
+def decode_kdf_params(data: bytes) -> tuple[int, int]:
+    if len(data) != params.KDF_PARAMS_SIZE:
+        raise ValueError(f"Expected {params.KDF_PARAMS_SIZE} bytes for KDF parameters.")
+    return struct.unpack(">QQ", data)
 
 def derive_password_tag(master_key: bytes) -> bytes:
     return hmac.new(digestmod=params.hash_function,
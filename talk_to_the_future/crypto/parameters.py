@@ -7,8 +7,16 @@ from nacl import secret
 master_kdf = argon2id.kdf
 MASTER_KEY_SIZE = 32
 SALT_SIZE = argon2id.SALTBYTES
-OPSLIMIT = argon2id.OPSLIMIT_SENSITIVE
-MEMLIMIT = argon2id.MEMLIMIT_SENSITIVE
+KDF_PROFILES = {    # name: (opslimit, memlimit)
+    'test'          : (argon2id.OPSLIMIT_MIN, argon2id.MEMLIMIT_MIN), # unit tests and load generation only
+    'interactive'   : (argon2id.OPSLIMIT_INTERACTIVE, argon2id.MEMLIMIT_INTERACTIVE),
+    'moderate'      : (argon2id.OPSLIMIT_MODERATE, argon2id.MEMLIMIT_MODERATE),
+    'sensitive'     : (argon2id.OPSLIMIT_SENSITIVE, argon2id.MEMLIMIT_SENSITIVE),
+}
+KDF_PROFILE = 'sensitive' # default profile of new keys, and of keys registered without kdf_params
+OPSLIMIT, MEMLIMIT = KDF_PROFILES[KDF_PROFILE]
+KDF_PARAMS_SIZE = 16
+KDF_POOL_SIZE = 2   # max Argon2 runs in parallel, each one uses up to its memlimit
 # -------------------------------------
 
 # Keys derivation ---------------------
@@ -22,6 +30,28 @@ SIGNING_KEY_SIZE = 32
 SYM_KEY_SIZE = secret.Aead.KEY_SIZE
 # -------------------------------------
 
+# Compression -------------------------
+COMPRESSION_THRESHOLD = 1024 # bytes, shorter contents are never compressed
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024 # refuses compressed contents expanding beyond it
+# -------------------------------------
+
+# Streaming encryption ----------------
+STREAM_CHUNK_SIZE = 64 * 1024 # plaintext bytes per secretstream chunk
+stream_hash_function = blake2b # digest of the ciphertext stream, signed instead of the ciphertext
+# -------------------------------------
+
 # Session token -----------------------
 TOKEN_SIZE = 16
+SESSION_TTL = 30 * 60 # seconds, extended at each use of the session
+# -------------------------------------
+
+# Admission control of the server writes (see models.admission)
+SEND_RATE = 20.0                        # messages per second and per sender, on average
+SEND_BURST = 200                        # messages a sender can send at once after a pause
+MAILBOX_QUOTA = 100_000                 # messages stored per receiver
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024     # bytes of a message (ciphertext, key slots, signature...)
+MAX_INFLIGHT_BYTES = 256 * 1024 * 1024  # bytes of the requests a network.server receives or serves at the same time
+BUSY_RETRY_AFTER = 0.05                 # seconds to wait when the in-flight budget is exhausted
 # -------------------------------------
\ No newline at end of file
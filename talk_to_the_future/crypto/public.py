@@ -1,19 +1,57 @@
+from nacl.exceptions import CryptoError
 from nacl.public import SealedBox, PublicKey, PrivateKey
 from nacl.signing import SigningKey, VerifyKey
+import utils.metrics as metrics
 
-def encrypt_sym_key(sym_key: bytes, public_key: bytes) -> bytes:
-    pk = PublicKey(public_key)
-    return SealedBox(pk).encrypt(sym_key)
+# Functions taking a key accept its raw bytes or an object parsed once with the
+# load_* helpers, to avoid parsing the same key for every message.
 
-def decrypt_sym_key(enc_sym_key: bytes, private_key: bytes) -> bytes:
-    sk = PrivateKey(private_key)
-    return SealedBox(sk).decrypt(enc_sym_key)
+def load_public_box(public_key: bytes) -> SealedBox:
+    return SealedBox(PublicKey(public_key))
 
-def sign_bundle(bundle: bytes, sign_key: bytes) -> bytes:
-    return SigningKey(sign_key).sign(bundle).signature
+def load_private_box(private_key: bytes) -> SealedBox:
+    return SealedBox(PrivateKey(private_key))
 
-def verify_bundle(signature: bytes, bundle: bytes, verify_key: bytes) -> None:
+def load_signing_key(sign_key: bytes) -> SigningKey:
+    return SigningKey(sign_key)
+
+def load_verify_key(verify_key: bytes) -> VerifyKey:
+    return VerifyKey(verify_key)
+
+@metrics.timed("crypto.encrypt_sym_key")
+def encrypt_sym_key(sym_key: bytes, public_key: bytes | SealedBox) -> bytes:
+    box = public_key if isinstance(public_key, SealedBox) else load_public_box(public_key)
+    return box.encrypt(sym_key)
+
+@metrics.timed("crypto.decrypt_sym_key")
+def decrypt_sym_key(enc_sym_key: bytes, private_key: bytes | SealedBox) -> bytes:
+    box = private_key if isinstance(private_key, SealedBox) else load_private_box(private_key)
+    return box.decrypt(enc_sym_key)
+
+def decrypt_key_slot(payload: dict[str, bytes], private_key: bytes | SealedBox | list[bytes | SealedBox]) -> bytes:
+    '''
+    Symmetric key of `payload`: from its rewrapped_key once the receiver rotated its keys, else from its enc_sym_key.
+    A list of private keys (current one first, then escrowed former ones) is tried in order.
+    '''
+    enc_sym_key = payload.get("rewrapped_key") or payload["enc_sym_key"]
+    if not isinstance(private_key, list):
+        return decrypt_sym_key(enc_sym_key, private_key)
+    for key in private_key[:-1]:
+        try:
+            return decrypt_sym_key(enc_sym_key, key)
+        except CryptoError:
+            pass
+    return decrypt_sym_key(enc_sym_key, private_key[-1])
+
+@metrics.timed("crypto.sign_bundle")
+def sign_bundle(bundle: bytes, sign_key: bytes | SigningKey) -> bytes:
+    sk = sign_key if isinstance(sign_key, SigningKey) else load_signing_key(sign_key)
+    return sk.sign(bundle).signature
+
+@metrics.timed("crypto.verify_bundle")
+def verify_bundle(signature: bytes, bundle: bytes, verify_key: bytes | VerifyKey) -> None:
+    vk = verify_key if isinstance(verify_key, VerifyKey) else load_verify_key(verify_key)
     try: 
-        VerifyKey(verify_key).verify(smessage = bundle, signature = signature)
+        vk.verify(smessage = bundle, signature = signature)
     except ValueError: 
         raise ValueError("Invalid signature !")
\ No newline at end of file
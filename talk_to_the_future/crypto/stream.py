@@ -0,0 +1,149 @@
+import crypto.parameters as params
+import crypto.public as public
+import struct
+from typing import BinaryIO, Callable, Iterable
+from nacl import bindings as sodium
+from nacl.public import SealedBox
+from nacl.signing import SigningKey, VerifyKey
+
+# Streaming variant of interface.encrypt_and_sign / decrypt_and_verify for large contents.
+#
+# The content is cut in chunks of `params.STREAM_CHUNK_SIZE` bytes encrypted with libsodium
+# secretstream (XChaCha20-Poly1305), the last chunk carrying the FINAL tag so truncation is
+# detected. Each encrypted chunk is written to the sink prefixed by its 4-byte length.
+# The sender signs enc_sym_key + digest(header + framed chunks) + aad, so memory use does
+# not depend on the content size.
+#
+# Stored by the `Server` like any message: the framed chunks are its `ciphertext` and the
+# payload has a `header`, see `Client.send_stream` / `Client.read_stream`.
+
+FRAME_HEADER = struct.Struct(">I")
+SIGNED_STREAM = b"TTF-stream\x00" # domain of the signed bundle, see `interface.SIGNED_MESSAGE`
+Source = BinaryIO | Iterable[bytes]
+Sink = BinaryIO | Callable[[bytes], None]
+
+class _IterReader:
+    '''File-like `read(n)` over an iterable of byte chunks.'''
+    def __init__(self, chunks: Iterable[bytes]):
+        self.__chunks = iter(chunks)
+        self.__buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self.__buffer) < size:
+            chunk = next(self.__chunks, None)
+            if chunk is None:
+                break
+            self.__buffer += chunk
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+def _reader(source: Source):
+    return source if hasattr(source, "read") else _IterReader(source)
+
+def _writer(sink: Sink) -> Callable[[bytes], None]:
+    return sink.write if hasattr(sink, "write") else sink
+
+def _read_frame(reader) -> bytes | None:
+    header = reader.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) != FRAME_HEADER.size:
+        raise ValueError("Truncated stream!")
+    (length,) = FRAME_HEADER.unpack(header)
+    frame = reader.read(length)
+    if len(frame) != length:
+        raise ValueError("Truncated stream!")
+    return frame
+
+def _signed_bundle(enc_sym_key: bytes, digest: bytes, aad: bytes) -> bytes:
+    return SIGNED_STREAM + enc_sym_key + digest + aad
+
+def encrypt_and_sign_stream(source: Source, sink: Sink, aad: bytes, receiver_pub_key: bytes | SealedBox,
+                            sender_sign_key: bytes | SigningKey, chunk_size: int = params.STREAM_CHUNK_SIZE) -> dict[str, bytes]:
+
+    sym_key = sodium.crypto_secretstream_xchacha20poly1305_keygen()
+    state = sodium.crypto_secretstream_xchacha20poly1305_state()
+    header = sodium.crypto_secretstream_xchacha20poly1305_init_push(state, sym_key)
+
+    reader, write = _reader(source), _writer(sink)
+    digest = params.stream_hash_function(header)
+
+    # One chunk of look-ahead to know which chunk is the final one
+    chunk = reader.read(chunk_size)
+    while True:
+        next_chunk = reader.read(chunk_size)
+        tag = sodium.crypto_secretstream_xchacha20poly1305_TAG_MESSAGE if next_chunk else sodium.crypto_secretstream_xchacha20poly1305_TAG_FINAL
+        encrypted = sodium.crypto_secretstream_xchacha20poly1305_push(state, chunk, aad, tag)
+        frame_header = FRAME_HEADER.pack(len(encrypted))
+        digest.update(frame_header)
+        digest.update(encrypted)
+        write(frame_header)
+        write(encrypted)
+        if not next_chunk:
+            break
+        chunk = next_chunk
+
+    enc_sym_key = public.encrypt_sym_key(sym_key, receiver_pub_key)
+
+    signature = public.sign_bundle(bundle=_signed_bundle(enc_sym_key, digest.digest(), aad), sign_key=sender_sign_key)
+
+    payload = {
+        "enc_sym_key"   : enc_sym_key,
+        "header"        : header,
+        "aad"           : aad,
+        "signature"     : signature
+    }
+
+    return payload
+
+def _stream_digest(payload: dict[str, bytes], reader) -> bytes:
+    digest = params.stream_hash_function(payload["header"])
+    while (frame := _read_frame(reader)) is not None:
+        digest.update(FRAME_HEADER.pack(len(frame)))
+        digest.update(frame)
+    return digest.digest()
+
+def decrypt_and_verify_stream(payload: dict[str, bytes], source: Source, sink: Sink,
+                              receiver_private_key: bytes | SealedBox | list[bytes | SealedBox],
+                              verify_key: VerifyKey | None = None) -> None:
+    '''
+    Verify and decrypt a stream produced by `encrypt_and_sign_stream`, the key slot of
+    `payload` is opened like by `interface.decrypt_and_verify`.
+
+    A seekable `source` is read twice: the signature is checked before any plaintext is
+    written. Otherwise it is decrypted in one pass and the signature checked at the end:
+    on ValueError the caller must discard what was written to `sink`.
+    '''
+    reader, write = _reader(source), _writer(sink)
+    seekable = hasattr(source, "seekable") and source.seekable()
+    verify_key = verify_key if verify_key else payload["verify_key"]
+
+    if seekable:
+        start = source.tell()
+        public.verify_bundle(payload["signature"],
+                             _signed_bundle(payload["enc_sym_key"], _stream_digest(payload, reader), payload["aad"]),
+                             verify_key)
+        source.seek(start)
+
+    sym_key = public.decrypt_key_slot(payload, receiver_private_key)
+    state = sodium.crypto_secretstream_xchacha20poly1305_state()
+    sodium.crypto_secretstream_xchacha20poly1305_init_pull(state, bytes(payload["header"]), sym_key)
+
+    digest = params.stream_hash_function(payload["header"])
+    tag = None
+    while (frame := _read_frame(reader)) is not None:
+        if tag == sodium.crypto_secretstream_xchacha20poly1305_TAG_FINAL:
+            raise ValueError("Data after the final chunk!")
+        if not seekable:
+            digest.update(FRAME_HEADER.pack(len(frame)))
+            digest.update(frame)
+        chunk, tag = sodium.crypto_secretstream_xchacha20poly1305_pull(state, frame, payload["aad"])
+        write(chunk)
+    if tag != sodium.crypto_secretstream_xchacha20poly1305_TAG_FINAL:
+        raise ValueError("Truncated stream!")
+
+    if not seekable:
+        public.verify_bundle(payload["signature"],
+                             _signed_bundle(payload["enc_sym_key"], digest.digest(), payload["aad"]),
+                             verify_key)
@@ -1,5 +1,9 @@
-from app.cli import TalkToTheFutureCLI
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1: # headless subcommands, see app/batch.py
+        from app.batch import main
+        sys.exit(main())
+    from app.cli import TalkToTheFutureCLI
     cli = TalkToTheFutureCLI(trace_level='WARNING')
-    cli.run()
\ No newline at end of file
+    cli.run()
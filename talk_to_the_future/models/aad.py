@@ -1,20 +1,57 @@
+import struct
 from datetime import date
 from utils.date_codec import encode_date, decode_date, DATE_CODED_SIZE
 
+RECEIVERS_SEP = "," # separates the receivers of a broadcast message, can't appear in a username
+AAD_VERSION = 1     # first byte of length-prefixed AADs, older ones start with the sender name
+KIND_MESSAGE, KIND_BROADCAST = 0, 1 # second byte: the message layout signed by the sender, read by `crypto.interface`
+FIELD_LENGTH = struct.Struct(">H")
+
 class AAD:
-    def __init__(self, sender: str, receiver: str, unlock_day: date):
+    def __init__(self, sender: str, receiver: str, unlock_day: date, broadcast: bool = False):
         self.sender = sender
         self.receiver = receiver
         self.unlock_day = unlock_day
+        self.broadcast = broadcast # `receiver` lists the receivers of a broadcast
+
+    @classmethod
+    def for_broadcast(cls, sender: str, receivers: list[str], unlock_day: date) -> "AAD":
+        return cls(sender, RECEIVERS_SEP.join(receivers), unlock_day, broadcast=True)
+
+    def receivers(self) -> list[str]:
+        return self.receiver.split(RECEIVERS_SEP)
 
     def encode(self) -> bytes:
-        sep = "|" # Add separator to help decoding
-        sender, receiver = self.sender, self.receiver 
+        # version | kind | len(sender) | sender | len(receiver) | receiver | date
+        sender, receiver = self.sender.encode(), self.receiver.encode()
         encoded_date = encode_date(self.unlock_day)
-        return f"{sender}{sep}{receiver}".encode() + encoded_date
+        kind = KIND_BROADCAST if self.broadcast else KIND_MESSAGE
+        return (bytes((AAD_VERSION, kind)) + FIELD_LENGTH.pack(len(sender)) + sender 
+                + FIELD_LENGTH.pack(len(receiver)) + receiver + encoded_date)
     
     @classmethod
-    def decode(cls, data: bytes) -> "AAD":
+    def decode(cls, data: bytes | memoryview) -> "AAD":
+        if not len(data) or data[0] != AAD_VERSION:
+            return cls.decode_legacy(bytes(data))
+        if len(data) < 2 or data[1] not in (KIND_MESSAGE, KIND_BROADCAST):
+            raise ValueError("Unknown AAD kind!")
+        try:
+            offset = 2
+            (size,) = FIELD_LENGTH.unpack_from(data, offset)
+            sender = bytes(data[offset + 2:offset + 2 + size]).decode()
+            offset += 2 + size
+            (size,) = FIELD_LENGTH.unpack_from(data, offset)
+            receiver = bytes(data[offset + 2:offset + 2 + size]).decode()
+            offset += 2 + size
+        except struct.error:
+            raise ValueError("Truncated AAD!")
+        if len(data) != offset + DATE_CODED_SIZE:
+            raise ValueError("Invalid AAD length!")
+        return cls(sender, receiver, decode_date(bytes(data[offset:])), broadcast=data[1] == KIND_BROADCAST)
+
+    @classmethod
+    def decode_legacy(cls, data: bytes) -> "AAD":
+        # Former "sender|receiver" + date encoding
         sep = "|"
         text_part = data[:-DATE_CODED_SIZE] # First part is sender|receiver
         date_part = data[-DATE_CODED_SIZE:] # Last part is date (with fixed size)
@@ -0,0 +1,134 @@
+import threading
+import time
+from typing import Callable
+import crypto.parameters as params
+import utils.metrics as metrics
+
+BUCKETS_SWEEP = 1024 # buckets kept before the idle ones are swept
+
+class RetryLater(Exception):
+    '''
+    Raised by the `Server` write paths when a message can't be admitted yet: its sender is
+    over its rate or the server is busy. It may be sent again after `retry_after` seconds.
+    '''
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after: float = retry_after
+
+def payload_size(message: dict) -> int:
+    '''
+    Returns:
+        int: Bytes of the fields of a message payload, key slots of a broadcast included.
+    '''
+    size = 0
+    for value in message.values():
+        if isinstance(value, dict):
+            size += sum(len(slot) for slot in value.values())
+        elif isinstance(value, (bytes, memoryview)):
+            size += len(value)
+    return size
+
+class Admission:
+    '''
+    Admission control in front of the `Server` write paths. Each limit is disabled with None:
+        `rate`, `burst`: token bucket of each sender, refilled with `rate` messages per second
+            up to `burst` messages.
+        `mailbox_quota`: messages stored per receiver.
+        `max_payload`: bytes of a message (see `payload_size`).
+        `max_inflight`: bytes of the requests `network.server` is receiving or serving at the
+            same time, all connections together (see `acquire`).
+
+    Messages over the size or the quota are refused for good. Over the rate or the in-flight
+    budget, `RetryLater` tells the sender when to try again, instead of queueing its messages.
+    Refusals are counted in the metrics (`admission.*`), with the bytes in flight.
+    '''
+    def __init__(self, rate: float | None = params.SEND_RATE, burst: int | None = params.SEND_BURST,
+                 mailbox_quota: int | None = params.MAILBOX_QUOTA, max_payload: int | None = params.MAX_PAYLOAD_SIZE,
+                 max_inflight: int | None = params.MAX_INFLIGHT_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.rate: float | None = rate
+        self.burst: int | None = burst
+        self.mailbox_quota: int | None = mailbox_quota
+        self.max_payload: int | None = max_payload
+        self.max_inflight: int | None = max_inflight
+        self.clock = clock
+        self.inflight: int = 0  # bytes of the messages being stored
+        self.__buckets: dict[str, list[float]] = {} # (sender: [tokens, time of the last refill])
+        self.__sweep_at: int = BUCKETS_SWEEP        # number of buckets that triggers the next sweep
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def unlimited(cls) -> 'Admission':
+        return cls(rate=None, burst=None, mailbox_quota=None, max_payload=None, max_inflight=None)
+
+    # Private Methods ---------------------------------------------------------------------
+    def __sweep(self, now: float, capacity: float) -> None:
+        '''
+        Drop the buckets refilled to `capacity` since their last use, the same as the full
+        bucket of a new sender: the senders seen once don't stay in memory.
+        '''
+        self.__buckets = {sender: bucket for sender, bucket in self.__buckets.items()
+                          if bucket[0] + (now - bucket[1]) * self.rate < capacity}
+        self.__sweep_at = max(BUCKETS_SWEEP, 2 * len(self.__buckets))
+
+    # Public methods -----------------------------------------------------------------------
+    def check_size(self, size: int) -> bool:
+        if self.max_payload is not None and size > self.max_payload:
+            metrics.count("admission.refused.size")
+            return False
+        return True
+
+    def check_quota(self, stored: int) -> bool:
+        '''
+        Returns:
+            bool: True if a mailbox holding `stored` messages can take one more.
+        '''
+        if self.mailbox_quota is not None and stored >= self.mailbox_quota:
+            metrics.count("admission.refused.quota")
+            return False
+        return True
+
+    def take_token(self, sender: str) -> None:
+        '''
+        Take a token from the bucket of `sender`.
+
+        Raises:
+            RetryLater: The bucket is empty, with the time until the next token.
+        '''
+        if self.rate is None:
+            return
+        capacity = float(self.burst or 1)
+        now = self.clock()
+        with self.__lock:
+            if len(self.__buckets) >= self.__sweep_at:
+                self.__sweep(now, capacity)
+            bucket = self.__buckets.get(sender)
+            if bucket is None:
+                bucket = self.__buckets[sender] = [capacity, now]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                metrics.count("admission.retry.rate")
+                raise RetryLater(f"{sender} is over {self.rate:g} messages per second", (1 - bucket[0]) / self.rate)
+            bucket[0] -= 1
+
+    def acquire(self, size: int) -> None:
+        '''
+        Count `size` bytes in flight until `release`, from the moment a request is announced
+        until its response is written. A request is always admitted when nothing else is in
+        flight, so one larger than the budget is not refused for good.
+
+        Raises:
+            RetryLater: The in-flight budget is exhausted.
+        '''
+        with self.__lock:
+            if self.max_inflight is not None and self.inflight and self.inflight + size > self.max_inflight:
+                metrics.count("admission.retry.busy")
+                raise RetryLater(f"Server is busy ({self.inflight} bytes in flight)", params.BUSY_RETRY_AFTER)
+            self.inflight += size
+            metrics.gauge("admission.inflight_bytes", self.inflight)
+
+    def release(self, size: int) -> None:
+        with self.__lock:
+            self.inflight -= size
+            metrics.gauge("admission.inflight_bytes", self.inflight)
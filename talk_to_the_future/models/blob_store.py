@@ -0,0 +1,251 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+import utils.metrics as metrics
+
+BLOB_HEADER = struct.Struct(">I16sI") # (length, digest, crc32) of each blob
+DIGEST_SIZE = 16
+SEGMENT_SIZE = 64 * 1024 * 1024 # bytes of a segment file before the next one is started
+CACHE_SIZE = 64 * 1024 * 1024   # bytes of blobs kept in memory
+
+class BlobRef:
+    '''Reference to a blob of a `BlobStore`, held by a `MessageRecord` in place of its ciphertext.'''
+    __slots__ = ("digest",)
+
+    def __init__(self, digest: bytes):
+        self.digest: bytes = digest
+
+    def __reduce__(self):
+        return BlobRef, (self.digest,)
+
+class BlobStore:
+    '''
+    Ciphertexts of the stored messages, moved out of the process memory (see `MemoryStorage`).
+
+    Blobs are content-addressed (blake2b digest): a broadcast ciphertext is written once and
+    reference counted. They are appended to segment files, read back through memory maps,
+    and only the `cache_size` bytes of the most recently read blobs stay in memory (LRU).
+    Newly written blobs are not cached, most messages are not read before their unlock day.
+    A segment whose blobs are mostly released is compacted: its live blobs are copied to
+    the current segment and the file is removed.
+
+    Reference counts are not persisted: a storage reloading its records calls `retain` for
+    each of them, then `drop_unreferenced`.
+    '''
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE, segment_size: int = SEGMENT_SIZE):
+        self.path: str = path
+        self.cache_size: int = cache_size
+        self.segment_size: int = segment_size
+        self.hits: int = 0          # reads served from the cache
+        self.misses: int = 0        # reads served from a segment file
+        self.evictions: int = 0
+        self.__blobs: dict[bytes, list[int]] = {} # digest: [segment, offset, length, refs]
+        self.__sizes: dict[int, int] = {}         # segment: bytes written
+        self.__dead: dict[int, int] = {}          # segment: bytes of released blobs
+        self.__maps: dict[int, mmap.mmap] = {}
+        self.__cache: OrderedDict[bytes, bytes] = OrderedDict()
+        self.__cached: int = 0                    # bytes in the cache
+        self.__lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.__scan()
+        self.__segment: int = max(self.__sizes, default=0)
+        self.__sizes.setdefault(self.__segment, 0)
+        self.__dead.setdefault(self.__segment, 0)
+        self.__file = open(self.__segment_path(self.__segment), 'ab')
+
+    # Private Methods ---------------------------------------------------------------------
+    def __segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment-{segment}")
+
+    def __scan(self) -> None:
+        '''
+        Index the blobs of every segment, without references. A truncated last blob (crash
+        during a write) is dropped, a blob already found in an earlier segment is dead.
+        '''
+        segments = sorted(int(f[len("segment-"):]) for f in os.listdir(self.path)
+                          if f.startswith("segment-") and f[len("segment-"):].isdigit())
+        for segment in segments:
+            size = dead = 0
+            with open(self.__segment_path(segment), 'r+b') as f:
+                end = os.fstat(f.fileno()).st_size
+                while size + BLOB_HEADER.size <= end:
+                    length, digest, _ = BLOB_HEADER.unpack(f.read(BLOB_HEADER.size))
+                    if size + BLOB_HEADER.size + length > end:
+                        break
+                    if digest in self.__blobs:
+                        dead += BLOB_HEADER.size + length
+                    else:
+                        self.__blobs[digest] = [segment, size + BLOB_HEADER.size, length, 0]
+                    f.seek(length, os.SEEK_CUR)
+                    size += BLOB_HEADER.size + length
+                f.truncate(size)
+            self.__sizes[segment], self.__dead[segment] = size, dead
+
+    def __append(self, digest: bytes, data: bytes) -> tuple[int, int]:
+        '''
+        Returns:
+            tuple[int, int]: Segment and offset of `data`.
+        '''
+        if self.__sizes[self.__segment] >= self.segment_size:
+            self.sync()
+            self.__file.close()
+            self.__segment += 1
+            self.__sizes[self.__segment] = self.__dead[self.__segment] = 0
+            self.__file = open(self.__segment_path(self.__segment), 'ab')
+        self.__file.write(BLOB_HEADER.pack(len(data), digest, zlib.crc32(data)) + data)
+        self.__file.flush()
+        offset = self.__sizes[self.__segment] + BLOB_HEADER.size
+        self.__sizes[self.__segment] += BLOB_HEADER.size + len(data)
+        return self.__segment, offset
+
+    def __view(self, segment: int, offset: int, length: int) -> memoryview:
+        view = self.__maps.get(segment)
+        if view is None or len(view) < offset + length:
+            with open(self.__segment_path(segment), 'rb') as f:
+                view = self.__maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(view)[offset - BLOB_HEADER.size:offset + length]
+
+    @metrics.timed("blobs.read")
+    def __read(self, digest: bytes, segment: int, offset: int, length: int) -> bytes:
+        view = self.__view(segment, offset, length)
+        data = view[BLOB_HEADER.size:].tobytes()
+        if BLOB_HEADER.unpack(view[:BLOB_HEADER.size]) != (length, digest, zlib.crc32(data)):
+            raise ValueError(f"Corrupted blob in {self.__segment_path(segment)} at {offset}")
+        return data
+
+    def __release_bytes(self, segment: int, length: int) -> None:
+        self.__dead[segment] += BLOB_HEADER.size + length
+        if segment != self.__segment and self.__dead[segment] * 2 > self.__sizes[segment]:
+            self.__compact(segment)
+
+    def __compact(self, segment: int) -> None:
+        for digest, blob in self.__blobs.items():
+            if blob[0] == segment:
+                blob[0], blob[1] = self.__append(digest, self.__read(digest, *blob[:3]))
+        self.sync()
+        view = self.__maps.pop(segment, None)
+        if view is not None:
+            view.close()
+        os.remove(self.__segment_path(segment))
+        del self.__sizes[segment], self.__dead[segment]
+
+    # Public methods -----------------------------------------------------------------------
+    def put(self, data: bytes) -> BlobRef:
+        '''
+        Store `data`, or add a reference to it if it is already stored.
+        '''
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+        with self.__lock:
+            blob = self.__blobs.get(digest)
+            if blob is not None:
+                blob[3] += 1
+            else:
+                segment, offset = self.__append(digest, data)
+                self.__blobs[digest] = [segment, offset, len(data), 1]
+        return BlobRef(digest)
+
+    def retain(self, ref: BlobRef) -> bool:
+        '''
+        Add a reference to a stored blob.
+
+        Returns:
+            bool: False if the blob is not stored.
+        '''
+        with self.__lock:
+            blob = self.__blobs.get(ref.digest)
+            if blob is None:
+                return False
+            blob[3] += 1
+            return True
+
+    def release(self, ref: BlobRef) -> None:
+        '''Remove a reference to a blob, the blob is deleted with its last reference.'''
+        with self.__lock:
+            blob = self.__blobs[ref.digest]
+            blob[3] -= 1
+            if blob[3] > 0:
+                return
+            del self.__blobs[ref.digest]
+            data = self.__cache.pop(ref.digest, None)
+            if data is not None:
+                self.__cached -= len(data)
+                metrics.gauge("blobs.cache.bytes", self.__cached)
+            self.__release_bytes(blob[0], blob[2])
+
+    def drop_unreferenced(self) -> int:
+        '''
+        Delete the blobs without references, once the storage retained those of its records.
+
+        Returns:
+            int: Number of deleted blobs.
+        '''
+        with self.__lock:
+            unreferenced = [digest for digest, blob in self.__blobs.items() if blob[3] == 0]
+            for digest in unreferenced:
+                self.__blobs[digest][3] = 1
+                self.release(BlobRef(digest))
+            return len(unreferenced)
+
+    def get(self, ref: BlobRef, cache: bool = True) -> bytes:
+        '''
+        Returns:
+            bytes: The blob, from the cache or read from its segment (then cached if `cache`).
+        '''
+        with self.__lock:
+            data = self.__cache.get(ref.digest)
+            if data is not None:
+                self.hits += 1
+                metrics.count("blobs.cache.hits")
+                self.__cache.move_to_end(ref.digest)
+                return data
+            self.misses += 1
+            metrics.count("blobs.cache.misses")
+            data = self.__read(ref.digest, *self.__blobs[ref.digest][:3])
+            if cache and len(data) <= self.cache_size:
+                self.__cache[ref.digest] = data
+                self.__cached += len(data)
+                while self.__cached > self.cache_size:
+                    _, evicted = self.__cache.popitem(last=False)
+                    self.__cached -= len(evicted)
+                    self.evictions += 1
+                    metrics.count("blobs.cache.evictions")
+                metrics.gauge("blobs.cache.bytes", self.__cached)
+            return data
+
+    def sync(self) -> None:
+        '''Make the written blobs durable, e.g. before a snapshot refers to them.'''
+        with self.__lock:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def stats(self) -> dict[str, int]:
+        '''
+        The cache figures are also reported to `utils.metrics` (`blobs.cache.*` counters and gauge).
+
+        Returns:
+            dict[str, int]: Cache hits, misses and evictions, bytes cached and cache_size,
+                number of blobs, live and dead bytes, number of segments.
+        '''
+        with self.__lock:
+            stored = sum(self.__sizes.values())
+            dead = sum(self.__dead.values())
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "cached_bytes": self.__cached, "cache_size": self.cache_size, "blobs": len(self.__blobs),
+                    "live_bytes": stored - dead, "dead_bytes": dead, "segments": len(self.__sizes)}
+
+    def close(self) -> None:
+        with self.__lock:
+            for view in self.__maps.values():
+                view.close()
+            self.__maps.clear()
+            self.__cache.clear()
+            self.__cached = 0
+            metrics.gauge("blobs.cache.bytes", 0)
+            self.__file.close()
+
+    def __len__(self) -> int:
+        return len(self.__blobs)
@@ -0,0 +1,90 @@
+import bisect
+from array import array
+from datetime import date
+
+ADDED = 0
+DELETED = 1
+MAX_ENTRIES = 10_000 # older entries are dropped, clients further behind get a full resync
+ID_BITS = 32         # unlock index entries pack (unlock day ordinal, message_id) in one integer
+ID_MASK = (1 << ID_BITS) - 1
+
+class ChangeLog:
+    '''
+    History of the changes to one mailbox, read by `Server.sync`.
+
+    Each addition or deletion gets a sequence number, a client remembers the last one it
+    has seen and only asks for the following ones. Unlocks are not logged, they follow
+    from the dates: `unlocked` finds the messages whose unlock day falls in a date range
+    with a bisection in the mailbox sorted by unlock day.
+
+    Both sequences are packed in arrays of 64-bit integers, 16 bytes per message.
+    '''
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries: int = max_entries
+        self.base: int = 0                  # sequence number of entries[0]
+        self.entries = array('q')           # message_id << 1 | (ADDED | DELETED)
+        self.unlocks = array('q')           # sorted unlock day ordinal << ID_BITS | message_id
+
+    def __append(self, op: int, message_id: int) -> None:
+        self.entries.append(message_id << 1 | op)
+        if len(self.entries) > self.max_entries:
+            dropped = len(self.entries) - self.max_entries // 2
+            del self.entries[:dropped]
+            self.base += dropped
+
+    @property
+    def head(self) -> int:
+        '''Sequence number of the next change.'''
+        return self.base + len(self.entries)
+
+    def add(self, message_id: int, unlock_day: date) -> None:
+        self.__append(ADDED, message_id)
+        bisect.insort(self.unlocks, unlock_day.toordinal() << ID_BITS | message_id)
+
+    def delete(self, message_id: int, unlock_day: date) -> None:
+        self.__append(DELETED, message_id)
+        entry = unlock_day.toordinal() << ID_BITS | message_id
+        i = bisect.bisect_left(self.unlocks, entry)
+        if i < len(self.unlocks) and self.unlocks[i] == entry:
+            del self.unlocks[i]
+
+    def reset(self) -> None:
+        '''Forget every change (mailbox cleared), clients must resync from scratch.'''
+        self.base = self.head + 1 # invalidates every cursor
+        self.entries = array('q')
+        self.unlocks = array('q')
+
+    def since(self, seq: int, limit: int) -> list[tuple[int, int]] | None:
+        '''
+        Returns:
+            list[tuple[int, int]]: At most `limit` changes (ADDED | DELETED, message_id) from `seq` on,
+                None if they were dropped.
+        '''
+        if seq < self.base or seq > self.head:
+            return None
+        start = seq - self.base
+        return [(entry & 1, entry >> 1) for entry in self.entries[start:start + limit]]
+
+    def unlocked(self, after: date, until: date) -> list[int]:
+        '''
+        Returns:
+            list[int]: IDs of the messages whose unlock day is in ]after, until].
+        '''
+        start = bisect.bisect_left(self.unlocks, (after.toordinal() + 1) << ID_BITS)
+        end = bisect.bisect_left(self.unlocks, (until.toordinal() + 1) << ID_BITS)
+        return [entry & ID_MASK for entry in self.unlocks[start:end]]
+
+    def page(self, after: int, limit: int) -> tuple[list[int], int]:
+        '''
+        Page of the whole mailbox, in unlock day order, for full syncs.
+
+        Args:
+            `after` (int): Position returned with the previous page, -1 for the first page.
+            `limit` (int): Maximum number of messages.
+
+        Returns:
+            tuple[list[int], int]: IDs of the messages and position of the last one.
+        '''
+        start = bisect.bisect_right(self.unlocks, after)
+        entries = self.unlocks[start:start + limit]
+        return [entry & ID_MASK for entry in entries], (entries[-1] if entries else after)
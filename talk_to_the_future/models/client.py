@@ -1,23 +1,141 @@
 from models.server import Server
 from models.aad import AAD
+from models.keyring import Keyring
+from models.vault import Vault
+from models.envelope import Payload
+from models.admission import RetryLater
 from utils.logger import Tracer
 from datetime import date
-from crypto import generate_keys, encrypt_and_sign, decrypt_and_verify
+import time
+from nacl.exceptions import CryptoError
+from nacl.public import SealedBox
+from crypto import (generate_keys, generate_keys_async, encrypt_and_sign, encrypt_and_sign_broadcast,
+                    encrypt_and_sign_stream, decrypt_and_verify, decrypt_and_verify_many, decrypt_and_verify_stream,
+                    rewrap_sym_keys, escrow_private_keys, open_escrowed_keys)
+from crypto.stream import Source, Sink
+import io
+
+ROTATION_ATTEMPTS = 2 # a message received during a key rotation makes the server refuse it, see `change_password`
+SEND_ATTEMPTS = 5     # a message over the rate of the sender or the server capacity is sent again later, see `__submit`
 
 class Client: 
-    def __init__(self, name: str, password: str, tr:Tracer = Tracer(trace_level='DEBUG')):
+    def __init__(self, name: str, password: str, tr:Tracer = Tracer(trace_level='DEBUG'), kdf_profile: str | None = None,
+                 compression: str | None = None):
         self.name:str = name
         self.server: Server = None
         
         self.__password:str = password # private attribute, contains plaintext password
-        self.public_keys: dict[str, bytes] = None # contains salt, password_tag, public_key and verify_key
+        self.public_keys: dict[str, bytes] = None # contains salt, password_tag, public_key, verify_key and kdf_params
         self.__private_keys: dict[str, bytes] = None # private attribute, contains private_key and signing_key
         self.token: bytes = None
+        self.mailbox: dict[int, AAD] = {} # local copy of the received messages metadata, see `sync_messages`
+        self.cursor: str | None = None    # position of `self.mailbox` in the server change log
+        self.keyring: Keyring = Keyring() # parsed own keys and cached keys of the other users
+        self.vault: Vault | None = None   # future messages downloaded in advance, see `open_vault`
+        self.kdf_profile: str | None = kdf_profile  # Argon2 cost profile of new keys (see crypto.parameters.KDF_PROFILES)
+                                                    # default is crypto.parameters.KDF_PROFILE
+        self.compression: str | None = compression # codec of the long messages sent (see crypto.compression), None to disable
 
         self.tr:Tracer = tr     # Tracer to handle general verbosity of the User
                                 # 4 possible levels: ERROR, WARNING, INFO, DEBUG
 
-    
+    # Private Methods ---------------------------------------------------------------------
+    def __set_server(self, server: Server) -> None:
+        if server is not self.server:
+            self.mailbox, self.cursor = {}, None
+            self.keyring.clear_public_keys() # key versions are specific to a server
+        self.server = server
+
+    def __set_keys(self, private_keys: dict[str, bytes], public_keys: dict[str, bytes]) -> None:
+        self.__private_keys, self.public_keys = private_keys, public_keys
+        self.keyring.load(private_keys)
+
+    def __request_registration(self) -> bool:
+        self.tr.debug('[%s]: Request a registration on %s', self.name, self.server)
+        return self.server.register(self.name, self.public_keys)
+
+    def __get_kdf_inputs(self) -> tuple[bytes | None, bytes | None]:
+        self.tr.debug('[%s]: Getting salt and KDF parameters from %s', self.name, self.server)
+        return self.server.get_user_salt(self.name), self.server.get_user_kdf_params(self.name)
+
+    def __request_login(self) -> bool:
+        self.tr.debug('[%s]: Sending login request to %s', self.name, self.server)
+        self.token = self.server.login(self.name, self.public_keys["password_tag"])
+        if not self.token:
+            return False
+        self.tr.debug('[%s]: Session started with %s', self.name, self.server)
+        self.__load_escrowed_keys()
+        return True
+
+    def __load_escrowed_keys(self) -> None:
+        escrowed_keys = self.server.get_escrowed_keys(self.name, self.token)
+        if not escrowed_keys:
+            return
+        try:
+            self.keyring.load_escrowed_keys(open_escrowed_keys(escrowed_keys, self.keyring.private_box))
+        except CryptoError:
+            self.tr.error('[%s]: Unable to open the escrowed keys from %s', self.name, self.server)
+
+    def __submit(self, method: str, *args) -> bool | None:
+        '''
+        Call the write `method` of `self.server`, waiting as long as asked then trying again
+        while it answers `RetryLater` (sender over its rate, server busy).
+
+        Returns:
+            bool | None: The result of `method`, None if still not admitted after `SEND_ATTEMPTS` attempts.
+        '''
+        for attempt in range(1, SEND_ATTEMPTS + 1):
+            try:
+                return getattr(self.server, method)(*args)
+            except RetryLater as retry:
+                if attempt == SEND_ATTEMPTS:
+                    self.tr.error('[%s]: Message refused by %s after %s attempts: %s', self.name, self.server, attempt, retry)
+                    return None
+                self.tr.warn('[%s]: %s, sending again in %.3fs', self.name, retry, retry.retry_after)
+                time.sleep(retry.retry_after)
+
+    @staticmethod
+    def __decode(plaintext: bytes) -> tuple[str | None, Exception | None]:
+        try:
+            return plaintext.decode('utf-8'), None
+        except UnicodeDecodeError as error:
+            return None, error
+
+    def __fetch_public_key(self, receiver_name: str) -> tuple[SealedBox, int] | None:
+        self.tr.debug('[%s]: Getting %s public key on %s', self.name, receiver_name, self.server)
+        result = self.server.get_versioned_public_key(receiver_name)
+        if not result:
+            self.tr.error('[%s]: No public key associated to %s on (%s)', self.name, receiver_name, self.server)
+            return None
+        public_key, key_version = result
+        return self.keyring.add_public_key(receiver_name, public_key, key_version), key_version
+
+    def __request_keys_rotation(self, private_keys: dict[str, bytes], public_keys: dict[str, bytes]) -> bool:
+        '''
+        Switch to new keys keeping the mailbox: the keys of the unlocked messages are opened
+        with the current keys and sealed to the new public key, while the current and former
+        private keys are escrowed (sealed to the new public key) for the still locked messages.
+        '''
+        for _ in range(ROTATION_ATTEMPTS):
+            self.tr.debug('[%s]: Rotating keys on %s', self.name, self.server)
+            messages = self.server.get_messages_aad(self.name, self.token)
+            key_slots = self.server.get_message_keys(self.name, self.token, list(messages)) if messages is not None else None
+            if key_slots is None:
+                self.tr.error('[%s]: Unable to get the message keys from %s', self.name, self.server)
+                return False
+            rewrapped_keys = rewrap_sym_keys(key_slots, self.keyring.private_boxes, public_keys["public_key"])
+            escrowed_keys = []
+            if len(rewrapped_keys) < len(messages):
+                escrowed_keys = [self.__private_keys["private_key"], *self.keyring.escrowed_keys]
+            if self.server.rotate_keys(self.name, self.token, public_keys, rewrapped_keys,
+                                       escrow_private_keys(escrowed_keys, public_keys["public_key"])):
+                self.__set_keys(private_keys, public_keys)
+                self.keyring.load_escrowed_keys(escrowed_keys)
+                return True
+        self.tr.error('[%s]: Unable to rotate keys on %s', self.name, self.server)
+        return False
+
+    # Public methods -----------------------------------------------------------------------
     def register_on(self, server: Server) -> bool:
         '''
         Generate new `public_keys` then use it to register on a `server`.
@@ -28,15 +146,22 @@ class Client:
         Returns:
             bool: True if registration succeeded else false.
         '''
-        self.server = server
-
-        username = self.name
+        self.__set_server(server)
         
-        self.tr.debug(f'[{self.name}]: Generating keys...')
-        self.__private_keys, self.public_keys = generate_keys(self.__password)
-        
-        self.tr.debug(f'[{self.name}]: Request a registration on {server}')
-        return server.register(username, self.public_keys)
+        self.tr.debug('[%s]: Generating keys...', self.name)
+        self.__set_keys(*generate_keys(self.__password, profile=self.kdf_profile))
+        return self.__request_registration()
+
+    async def register_on_async(self, server: Server) -> bool:
+        '''
+        Same as `register_on`, but the key derivation runs in the KDF process pool
+        without blocking the event loop.
+        '''
+        self.__set_server(server)
+
+        self.tr.debug('[%s]: Generating keys in the KDF pool...', self.name)
+        self.__set_keys(*await generate_keys_async(self.__password, profile=self.kdf_profile))
+        return self.__request_registration()
 
     def login_on(self, server: Server) -> bool:
         '''
@@ -48,21 +173,28 @@ class Client:
         Returns:
             bool: True if login succeeded else false.
         '''
-        self.server = server
+        self.__set_server(server)
 
-        self.tr.debug(f'[{self.name}]: Getting salt from {self.server}')
-        salt = self.server.get_user_salt(self.name)                                  
+        salt, kdf_params = self.__get_kdf_inputs()
         if (not salt): return False
 
-        self.tr.debug(f'[{self.name}]: Regenerating keys ...')
-        self.__private_keys, self.public_keys = generate_keys(self.__password, salt)
+        self.tr.debug('[%s]: Regenerating keys ...', self.name)
+        self.__set_keys(*generate_keys(self.__password, salt, kdf_params))
+        return self.__request_login()
 
-        self.tr.debug(f'[{self.name}]: Sending login request to {self.server}')
-        self.token = self.server.login(self.name, self.public_keys["password_tag"])
-        if not self.token:
-            return False
-        self.tr.debug(f'[{self.name}]: Session started with {self.server}')
-        return True
+    async def login_on_async(self, server: Server) -> bool:
+        '''
+        Same as `login_on`, but the key derivation runs in the KDF process pool
+        without blocking the event loop.
+        '''
+        self.__set_server(server)
+
+        salt, kdf_params = self.__get_kdf_inputs()
+        if (not salt): return False
+
+        self.tr.debug('[%s]: Regenerating keys in the KDF pool...', self.name)
+        self.__set_keys(*await generate_keys_async(self.__password, salt, kdf_params))
+        return self.__request_login()
 
     def logout(self) -> bool:
         '''
@@ -71,27 +203,37 @@ class Client:
         Returns:
             bool: True if logout succeeded else false.
         '''
-        self.tr.debug(f'[{self.name}]: Sending logout request to {self.server}')
+        self.tr.debug('[%s]: Sending logout request to %s', self.name, self.server)
         return self.server.logout(self.name, self.token)
 
     def change_password(self, new_password: str) -> bool:
         '''
         Generate new `private_keys` and `public_keys` based on a `new_password`.
-        Call a key update on current `self.server`.
+        Rotate the keys on current `self.server`: received messages stay readable, only their
+        keys are sealed again (see `Server.rotate_keys`).
 
         Args:
             `new_password` (str): New password used to generate keys.
         
         Returns:
-            bool: True if update succeeded else false.
+            bool: True if update succeeded else false, then the current password and keys are kept.
         '''
+        self.tr.debug('[%s]: Generating keys...', self.name)
+        if not self.__request_keys_rotation(*generate_keys(new_password, profile=self.kdf_profile)):
+            return False
         self.__password = new_password
-        
-        self.tr.debug(f'[{self.name}]: Generating keys...')
-        self.__private_keys, self.public_keys = generate_keys(self.__password)
-        
-        self.tr.debug(f'[{self.name}]: Updating credentials on {self.server}')
-        return self.server.update_keys(self.name, self.token, self.public_keys)
+        return True
+
+    async def change_password_async(self, new_password: str) -> bool:
+        '''
+        Same as `change_password`, but the key derivation runs in the KDF process pool
+        without blocking the event loop.
+        '''
+        self.tr.debug('[%s]: Generating keys in the KDF pool...', self.name)
+        if not self.__request_keys_rotation(*await generate_keys_async(new_password, profile=self.kdf_profile)):
+            return False
+        self.__password = new_password
+        return True
 
     def send_message(self, content: str, receiver_name: str, unlock_day: date) -> bool:
         '''
@@ -105,32 +247,136 @@ class Client:
         Returns:
             bool: True if message was successfully saved in server else false.
         '''
-        self.tr.debug(f'[{self.name}]: Getting {receiver_name} public key on {self.server}')
-        receiver_pub_key = self.server.get_public_key(receiver_name)
-        if not receiver_pub_key:
-            self.tr.error(f'[{self.name}]: No public key associated to {receiver_name} on ({self.server})')
+        # The receiver public key comes from the keyring once fetched
+        cached = self.keyring.public_key(receiver_name)
+        receiver_key = cached or self.__fetch_public_key(receiver_name)
+        if not receiver_key:
             return False
+        receiver_pub_key, key_version = receiver_key
         
         # Authenticated data : sender | receiver | date
         aad = AAD(sender=self.name, receiver=receiver_name, unlock_day=unlock_day)
 
         # encrypt and sign the message
-        self.tr.debug(f'[{self.name}]: Encrypting and signing message')
-        message = encrypt_and_sign(content.encode(), aad.encode(), receiver_pub_key, self.__private_keys["signing_key"])
+        self.tr.debug('[%s]: Encrypting and signing message', self.name)
+        message = Payload(encrypt_and_sign(content.encode(), aad.encode(), receiver_pub_key, self.keyring.signing_key, self.compression))
 
-        self.tr.debug(f'[{self.name}]: Sending message on {self.server}')
-        return self.server.send_message(self.name, self.token, message)
+        self.tr.debug('[%s]: Sending message on %s', self.name, self.server)
+        sent = self.__submit("send_message", self.name, self.token, message, key_version)
+        if sent is not False or not cached:
+            return bool(sent)
+        # Sent again only if the receiver changed its keys since they were cached,
+        # the other refusals (quota, size, date...) would only be paid twice
+        self.tr.debug('[%s]: Checking %s public key version', self.name, receiver_name)
+        current = self.__fetch_public_key(receiver_name)
+        if not current or current[1] == key_version:
+            return False
+        self.tr.debug('[%s]: Public key of %s changed, sending again', self.name, receiver_name)
+        return self.send_message(content, receiver_name, unlock_day)
 
-    def get_messages_aad(self) -> list[AAD] | None:
+    def send_stream(self, source: Source, receiver_name: str, unlock_day: date) -> bool:
+        '''
+        `send_message` for a large or binary content, encrypted chunk by chunk (see `crypto.stream`)
+        as it is read from `source` (file-like object or iterable of bytes).
+        The public key of the receiver is always fetched: `source` can't be read twice.
+
+        Only the encryption streams: the ciphertext is buffered and sent in a single request,
+        so the memory used grows with the content, which must fit in the server `max_payload`.
+
+        Returns:
+            bool: True if message was successfully saved in server else false.
+        '''
+        receiver_key = self.__fetch_public_key(receiver_name)
+        if not receiver_key:
+            return False
+        receiver_pub_key, key_version = receiver_key
+        aad = AAD(sender=self.name, receiver=receiver_name, unlock_day=unlock_day)
+
+        self.tr.debug('[%s]: Encrypting and signing stream', self.name)
+        ciphertext = io.BytesIO()
+        message = Payload(encrypt_and_sign_stream(source, ciphertext, aad.encode(), receiver_pub_key, self.keyring.signing_key))
+        message["ciphertext"] = ciphertext.getvalue()
+
+        self.tr.debug('[%s]: Sending streamed message on %s', self.name, self.server)
+        return bool(self.__submit("send_message", self.name, self.token, message, key_version))
+
+    def send_broadcast(self, content: str, receiver_names: list[str], unlock_day: date) -> bool:
+        '''
+        Send the same message to several receivers through `self.server`.
+        Content is encrypted and signed once, only the symmetric key is sealed per receiver.
+
+        Args:
+            `content` (str): Content of the message.
+            `receiver_names` (list[str]): Names of the receivers of the message.
+            `unlock_day` (date): Date at which receivers can read the message.
+        
+        Returns:
+            bool: True if message was successfully saved in server for every receiver else false.
+        '''
+        receiver_names = sorted(set(receiver_names))
+        self.tr.debug('[%s]: Getting public keys of %s receivers on %s', self.name, len(receiver_names), self.server)
+        receiver_pub_keys = self.server.get_public_keys(receiver_names)
+        if not receiver_pub_keys:
+            self.tr.error('[%s]: Some receivers have no public key on (%s)', self.name, self.server)
+            return False
+
+        # Authenticated data : sender | receivers | date
+        aad = AAD.for_broadcast(sender=self.name, receivers=receiver_names, unlock_day=unlock_day)
+
+        self.tr.debug('[%s]: Encrypting and signing broadcast message', self.name)
+        message = encrypt_and_sign_broadcast(content.encode(), aad.encode(), receiver_pub_keys, self.keyring.signing_key,
+                                             self.compression)
+
+        self.tr.debug('[%s]: Sending broadcast message on %s', self.name, self.server)
+        return bool(self.__submit("send_broadcast", self.name, self.token, message))
+
+    def get_messages_aad(self) -> dict[int, AAD] | None:
         '''
         Ask `self.server` for metadata about received messages.
         
         Returns:
-            list[AAD]: An AAD object (From|To|Unlock_day) for each received message.
+            dict[int, AAD]: An AAD object (From|To|Unlock_day) for each received message, by message ID.
         '''
-        self.tr.debug(f'[{self.name}]: Requesting message metadata from {self.server}')
+        self.tr.debug('[%s]: Requesting message metadata from %s', self.name, self.server)
         return self.server.get_messages_aad(self.name, self.token)
     
+    def sync_messages(self, limit: int = 256) -> dict[int, AAD] | None:
+        '''
+        Bring `self.mailbox` up to date with the changes on `self.server` since the last call,
+        fetched by pages of `limit` messages. Only the first call transfers the whole mailbox.
+
+        Returns:
+            dict[int, AAD]: `self.mailbox`, an AAD object for each received message by message ID.
+        '''
+        more = True
+        while more:
+            self.tr.debug('[%s]: Requesting mailbox changes from %s', self.name, self.server)
+            changes = self.server.sync(self.name, self.token, self.cursor, limit)
+            if changes is None:
+                self.tr.error('[%s]: Unable to sync messages with %s', self.name, self.server)
+                return None
+            if changes["reset"]:
+                self.mailbox.clear()
+            self.mailbox.update(changes["added"])
+            for message_id in changes["deleted"]:
+                self.mailbox.pop(message_id, None)
+            self.cursor, more = changes["cursor"], changes["more"]
+        return self.mailbox
+
+    def subscribe_unlocks(self, callback) -> bool:
+        '''
+        Ask `self.server` to notify the client as soon as one of its messages gets unlocked.
+
+        Args:
+            `callback` (Callable[[int, AAD], None]): Called with the id and AAD of each unlocked message,
+                e.g. `lambda *event: queue.put(event)` to receive notifications through a queue.
+        
+        Returns:
+            bool: True if subscription succeeded else false.
+        '''
+        self.tr.debug('[%s]: Subscribing to unlock notifications on %s', self.name, self.server)
+        return self.server.subscribe_unlocks(self.name, self.token, callback)
+
     def read_message(self, message_id: int) -> str | None:
         '''
         Ask `self.server` for message with a given `message_id`.
@@ -142,16 +388,78 @@ class Client:
         Returns:
             str: Plaintext content of desired message.
         '''
-        self.tr.debug(f'[{self.name}]: Requesting full message (id:{message_id}) from {self.server}')
+        self.tr.debug('[%s]: Requesting full message (id:%s) from %s', self.name, message_id, self.server)
         encoded_msg = self.server.get_message_payload(self.name, self.token, message_id, no_key=False)
 
         if not encoded_msg: 
-            self.tr.error(f'[{self.name}]: Unable to read message (id:{message_id})')
+            self.tr.error('[%s]: Unable to read message (id:%s)', self.name, message_id)
             return None
 
-        self.tr.debug(f'[{self.name}]: Decrypting message content')
-        return decrypt_and_verify(payload=encoded_msg, receiver_private_key=self.__private_keys["private_key"]).decode('utf-8')
+        self.tr.debug('[%s]: Decrypting message content', self.name)
+        return self.decrypt_message(encoded_msg)
         
+    def read_stream(self, message_id: int, sink: Sink) -> bool:
+        '''
+        `read_message` for a content sent by `send_stream`: it is verified then decrypted chunk
+        by chunk to `sink` (file-like object or callable), and not decoded.
+
+        Only the decryption streams: the ciphertext comes in a single response and is held in
+        memory, the plaintext is never held whole.
+
+        Returns:
+            bool: True if the content was written to `sink`, else False (nothing written).
+        '''
+        self.tr.debug('[%s]: Requesting full message (id:%s) from %s', self.name, message_id, self.server)
+        payload = self.server.get_message_payload(self.name, self.token, message_id, no_key=False)
+        if not payload or "header" not in payload:
+            self.tr.error('[%s]: Unable to read streamed message (id:%s)', self.name, message_id)
+            return False
+        try:
+            # Seekable source: the signature is checked before anything is written
+            decrypt_and_verify_stream(payload, io.BytesIO(payload["ciphertext"]), sink, self.keyring.private_boxes,
+                                      self.keyring.verify_key(payload["verify_key"]))
+        except (ValueError, CryptoError) as error:
+            self.tr.error('[%s]: Invalid streamed message (id:%s): %s', self.name, message_id, error)
+            return False
+        return True
+
+    def read_all_unlocked(self, batch_size: int = 256, max_workers: int | None = None) -> dict[int, tuple[str | None, Exception | None]]:
+        '''
+        Read every unlocked message: payloads are fetched from `self.server` by batches of
+        `batch_size` and verified/decrypted in parallel by `max_workers` threads.
+
+        Args:
+            `batch_size` (int): Maximum number of payloads per server request.
+            `max_workers` (int): Number of decryption threads, defaults to the ThreadPoolExecutor default.
+
+        Returns:
+            dict[int, tuple[str | None, Exception | None]]: (plaintext, None) or (None, error) for each unlocked message,
+                messages the server did not return included.
+        '''
+        messages = self.get_messages_aad()
+        if messages is None:
+            return {}
+        today = date.today()
+        message_ids = [message_id for message_id, aad in messages.items() if aad.unlock_day <= today]
+
+        results = {}
+        for i in range(0, len(message_ids), batch_size):
+            batch = message_ids[i:i + batch_size]
+            self.tr.debug('[%s]: Requesting %s messages from %s', self.name, len(batch), self.server)
+            payloads = self.server.get_message_payloads(self.name, self.token, batch)
+            if payloads is None:
+                self.tr.error('[%s]: Unable to read messages from %s', self.name, self.server)
+                error = LookupError(f"Messages could not be fetched from {self.server}")
+                results.update((message_id, (None, error)) for message_id in message_ids[i:])
+                break
+            decrypted = decrypt_and_verify_many(list(payloads.values()), self.keyring.private_boxes, max_workers)
+            for message_id, (plaintext, error) in zip(payloads, decrypted):
+                results[message_id] = (None, error) if error is not None else self.__decode(plaintext)
+            for message_id in batch:
+                if message_id not in payloads:
+                    results[message_id] = (None, LookupError(f"Message (id:{message_id}) was not returned by {self.server}"))
+        return results
+
     def download_future_message(self, message_id: int) -> dict[str, bytes] | None:
         '''
         Ask `self.server` for message with a given `message_id` without the encryption key.
@@ -162,8 +470,80 @@ class Client:
         Returns:
             dict[str, bytes]: Dictionary containing ciphertext, aad, signature, sender_verify_key
         '''
-        self.tr.debug(f'[{self.name}]: Downloading future message (id:{message_id}) without key')
-        return self.server.get_message_payload(self.name, self.token, message_id, no_key=True)
+        self.tr.debug('[%s]: Downloading future message (id:%s) without key', self.name, message_id)
+        payload = self.server.get_message_payload(self.name, self.token, message_id, no_key=True)
+        if payload and self.vault is not None:
+            self.vault.add(message_id, payload)
+        return payload
+
+    def open_vault(self, path: str) -> Vault:
+        '''
+        Keep the future messages downloaded by `download_future_message` in a vault file,
+        so only their key is fetched once they unlock (see `read_vault`).
+
+        Args:
+            `path` (str): Vault file, created if needed. A vault belongs to one user on one server.
+
+        Returns:
+            Vault: The opened vault, also in `self.vault`.
+        '''
+        if self.vault is not None:
+            self.vault.close()
+        self.vault = Vault(path)
+        return self.vault
+
+    def prefetch_future_messages(self) -> int:
+        '''
+        Download into the vault every locked message of the mailbox it doesn't hold yet,
+        e.g. off-peak, ahead of their unlock day.
+
+        Returns:
+            int: Number of downloaded messages.
+        '''
+        if self.vault is None or self.sync_messages() is None:
+            return 0
+        today = date.today()
+        missing = [message_id for message_id, aad in self.mailbox.items()
+                   if aad.unlock_day > today and message_id not in self.vault]
+        return sum(self.download_future_message(message_id) is not None for message_id in missing)
+
+    def read_vault(self, today: date | None = None) -> dict[int, str | None]:
+        '''
+        Read the messages of the vault whose unlock day has come: their keys are fetched
+        from `self.server` in one request, then they are verified and decrypted locally.
+        Read messages leave the vault, those the server still holds locked stay in it and
+        those it no longer holds (deleted, or mailbox reset by a key rotation) are dropped.
+
+        Returns:
+            dict[int, str | None]: Plaintext of each read message, None if it could not be verified or decrypted.
+        '''
+        due = self.vault.due(today) if self.vault is not None else []
+        if not due:
+            return {}
+        self.tr.debug('[%s]: Requesting keys of %s messages from %s', self.name, len(due), self.server)
+        keys = self.server.get_message_keys(self.name, self.token, due)
+        if keys is None:
+            self.tr.error('[%s]: Unable to get the keys of the vault messages from %s', self.name, self.server)
+            return {}
+
+        missing = [message_id for message_id in due if message_id not in keys]
+        if missing and self.sync_messages() is not None:
+            for message_id in missing:
+                if message_id not in self.mailbox:
+                    self.tr.warn('[%s]: Message (id:%s) of the vault is gone from %s, dropping it', self.name, message_id, self.server)
+                    self.vault.remove(message_id)
+
+        results = {}
+        for message_id, key_slot in keys.items():
+            payload = self.vault.get(message_id)
+            payload.update(key_slot)
+            try:
+                results[message_id] = self.decrypt_message(payload)
+            except (ValueError, CryptoError) as error:
+                self.tr.error('[%s]: Message (id:%s) of the vault could not be read: %s', self.name, message_id, error)
+                results[message_id] = None
+            self.vault.remove(message_id)
+        return results
     
     def get_msg_enc_sym_key(self, message_id: int) -> bytes | None:
         '''
@@ -175,11 +555,11 @@ class Client:
         Returns:
             bytes: `enc_sym_key` to decrypt message `message_id`
         '''
-        self.tr.debug(f'[{self.name}]: Requesting key for message (id:{message_id})')
+        self.tr.debug('[%s]: Requesting key for message (id:%s)', self.name, message_id)
         enc_sym_key = self.server.get_message_key(self.name, self.token, message_id)
 
         if not enc_sym_key: 
-            self.tr.error(f'[{self.name}]: Unable to get symmetric key for this message (id:{message_id})')
+            self.tr.error('[%s]: Unable to get symmetric key for this message (id:%s)', self.name, message_id)
             return None
         return enc_sym_key
 
@@ -193,7 +573,8 @@ class Client:
         Returns:
             str: Plaintext content of `message`.
         '''
-        return decrypt_and_verify(payload=message, receiver_private_key=self.__private_keys["private_key"]).decode('utf-8')
+        return decrypt_and_verify(payload=message, receiver_private_key=self.keyring.private_boxes,
+                                  verify_key=self.keyring.verify_key(message["verify_key"])).decode('utf-8')
     
     def delete_message(self, message_id: int) -> bool:
         '''
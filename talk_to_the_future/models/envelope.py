@@ -0,0 +1,76 @@
+import struct
+
+# Versioned binary envelope of a message payload, for transport and persistence.
+#
+#   magic "TTF" | version (1 byte) | flags (2 bytes) | length of each field (4 bytes x len(FIELDS)) | fields
+#
+# Fields always come in the order of FIELDS; an absent field has its presence bit
+# cleared in `flags` and a length of 0. The header has a fixed size, so every field
+# offset is known from the header alone and fields are returned as memoryview slices
+# of the envelope, without copying the ciphertext.
+
+MAGIC = b"TTF"
+VERSION = 1
+FIELDS = ("enc_sym_key", "ciphertext", "aad", "signature", "verify_key", "header", "rewrapped_key", "codec")
+HEADER = struct.Struct(f">3sBH{len(FIELDS)}I")
+PREFIX = struct.Struct(">3sB") # magic | version
+
+_FIELD_BITS = tuple((field, 1 << i) for i, field in enumerate(FIELDS))
+_FIELD_SET = frozenset(FIELDS)
+
+class Payload(dict):
+    '''
+    Fields of a message (names of FIELDS) as returned by the `Server` or sent to it:
+    marks the dicts `network.codec` writes as envelopes, whatever their keys.
+    '''
+
+def encode_payload(payload: dict[str, bytes]) -> bytes:
+    if not payload.keys() <= _FIELD_SET:
+        raise ValueError(f"Not envelope fields: {', '.join(map(str, payload.keys() - _FIELD_SET))}")
+    flags = 0
+    lengths = [0] * len(FIELDS)
+    parts = [b""]
+    for i, (field, bit) in enumerate(_FIELD_BITS):
+        value = payload.get(field)
+        if value is not None:
+            flags |= bit
+            lengths[i] = len(value)
+            parts.append(value)
+    parts[0] = HEADER.pack(MAGIC, VERSION, flags, *lengths)
+    return b"".join(parts)
+
+def decode_payload(data: bytes | memoryview, copy: bool = False) -> dict[str, bytes | memoryview]:
+    '''
+    Parse an envelope built by `encode_payload`.
+
+    Args:
+        `data` (bytes | memoryview): The envelope.
+        `copy` (bool): Return bytes instead of memoryview slices of `data`.
+
+    Returns:
+        dict[str, bytes | memoryview]: The payload fields present in the envelope.
+    '''
+    view = memoryview(data)
+    if len(view) < PREFIX.size:
+        raise ValueError("Truncated envelope!")
+    magic, version = PREFIX.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a message envelope!")
+    if version != VERSION:
+        raise ValueError(f"Unsupported envelope version: {version}")
+    if len(view) < HEADER.size:
+        raise ValueError("Truncated envelope!")
+    _, _, flags, *lengths = HEADER.unpack_from(view)
+    if HEADER.size + sum(lengths) != len(view):
+        raise ValueError("Invalid envelope length!")
+
+    payload = {}
+    offset = HEADER.size
+    for (field, bit), length in zip(_FIELD_BITS, lengths):
+        if flags & bit:
+            end = offset + length
+            payload[field] = view[offset:end]
+            offset = end
+    if copy:
+        payload = {field: value.tobytes() for field, value in payload.items()}
+    return payload
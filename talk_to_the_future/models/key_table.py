@@ -0,0 +1,32 @@
+class KeyTable:
+    '''
+    Versioned table of the verify keys known by a server.
+
+    Each distinct key is stored once and gets an integer `key_id`. A key rotation adds a
+    new version instead of overwriting the previous one, so messages signed before the
+    rotation keep pointing to the key that verifies them.
+    '''
+    def __init__(self):
+        self.__ids: dict[bytes, int] = {}   # (verify_key: key_id)
+        self.__keys: list[bytes] = []       # key_id -> verify_key
+
+    def add(self, verify_key: bytes) -> int:
+        '''
+        Returns:
+            int: The `key_id` of `verify_key`, which is added if unknown.
+        '''
+        key_id = self.__ids.get(verify_key)
+        if key_id is None:
+            key_id = len(self.__keys)
+            self.__ids[verify_key] = key_id
+            self.__keys.append(verify_key)
+        return key_id
+
+    def get(self, key_id: int) -> bytes:
+        return self.__keys[key_id]
+
+    def __contains__(self, verify_key: bytes) -> bool:
+        return verify_key in self.__ids
+
+    def __len__(self) -> int:
+        return len(self.__keys)
@@ -0,0 +1,77 @@
+import crypto.public as public
+from collections import OrderedDict
+from nacl.public import SealedBox
+from nacl.signing import SigningKey, VerifyKey
+
+CACHE_SIZE = 1024 # entries of each LRU cache
+
+class Keyring:
+    '''
+    Parsed keys of a `Client`, so they are not rebuilt from bytes for every message.
+
+    Holds the client's own keys, parsed once each time they are generated, with the former
+    private keys escrowed on the server at key rotations (see `Client.change_password`), and two LRU
+    caches: public keys of receivers, with the server-side version they had when fetched,
+    and verify keys of senders. A cached public key turns stale when the receiver updates
+    its keys: the server then refuses messages sealed with the old version and the client
+    drops the entry (see `Client.send_message`). Verify keys are cached by value and never stale.
+    '''
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.capacity: int = capacity
+        self.private_box: SealedBox | None = None
+        self.signing_key: SigningKey | None = None
+        self.escrowed_keys: list[bytes] = []        # former private keys, newest first
+        self.private_boxes: list[SealedBox] = []    # private_box then the escrowed keys, tried in order
+        self.__public_keys: OrderedDict[str, tuple[SealedBox, int]] = OrderedDict() # receiver: (box, key_version)
+        self.__verify_keys: OrderedDict[bytes, VerifyKey] = OrderedDict()
+
+    def __remember(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        if len(cache) > self.capacity:
+            cache.popitem(last=False)
+
+    def load(self, private_keys: dict[str, bytes]) -> None:
+        '''Parse the client's own `private_keys` (private_key and signing_key).'''
+        self.private_box = public.load_private_box(private_keys["private_key"])
+        self.signing_key = public.load_signing_key(private_keys["signing_key"])
+        self.load_escrowed_keys([])
+
+    def load_escrowed_keys(self, escrowed_keys: list[bytes]) -> None:
+        '''Parse the former private keys `escrowed_keys`, already opened.'''
+        self.escrowed_keys = escrowed_keys
+        self.private_boxes = [self.private_box, *map(public.load_private_box, escrowed_keys)]
+
+    def public_key(self, receiver: str) -> tuple[SealedBox, int] | None:
+        '''
+        Returns:
+            tuple[SealedBox, int]: Cached public key of `receiver` and its version, None if not cached.
+        '''
+        entry = self.__public_keys.get(receiver)
+        if entry:
+            self.__public_keys.move_to_end(receiver)
+        return entry
+
+    def add_public_key(self, receiver: str, public_key: bytes, key_version: int) -> SealedBox:
+        box = public.load_public_box(public_key)
+        self.__remember(self.__public_keys, receiver, (box, key_version))
+        return box
+
+    def forget_public_key(self, receiver: str) -> None:
+        self.__public_keys.pop(receiver, None)
+
+    def verify_key(self, verify_key: bytes) -> VerifyKey:
+        '''
+        Returns:
+            VerifyKey: `verify_key` parsed, from the cache if it was already seen.
+        '''
+        key = self.__verify_keys.get(verify_key)
+        if key is None:
+            key = public.load_verify_key(verify_key)
+            self.__remember(self.__verify_keys, verify_key, key)
+        else:
+            self.__verify_keys.move_to_end(verify_key)
+        return key
+
+    def clear_public_keys(self) -> None:
+        '''Forget the cached public keys, e.g. when switching to another server.'''
+        self.__public_keys.clear()
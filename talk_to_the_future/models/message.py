@@ -0,0 +1,84 @@
+from datetime import date
+from operator import attrgetter
+from models.aad import AAD
+from models.envelope import Payload
+
+class MessageRecord:
+    '''
+    Compact server-side representation of a stored message.
+
+    The AAD fields are decoded once at ingest and the sender's verify key is referenced
+    through its `key_id` in the server `KeyTable` instead of being copied in every message.
+    `message_id` is assigned by the storage and never reused, even after deletions.
+    '''
+    __slots__ = ("message_id", "sender", "receiver", "unlock_day", "aad",
+                 "enc_sym_key", "ciphertext", "signature", "key_id", "locked", "rewrapped_key", "codec", "header")
+
+    def __init__(self, aad: AAD, payload: dict[str, bytes], key_id: int):
+        self.message_id: int = -1
+        self.sender: str = aad.sender
+        self.receiver: str = aad.receiver
+        self.unlock_day: date = aad.unlock_day
+        self.aad: bytes = payload["aad"]
+        self.enc_sym_key: bytes = payload["enc_sym_key"]
+        self.ciphertext: bytes = payload["ciphertext"]
+        self.signature: bytes = payload["signature"]
+        self.key_id: int = key_id   # sender's verify key in the server KeyTable
+        self.locked: bool = False   # maintained by the UnlockScheduler
+        self.rewrapped_key: bytes | None = None # key re-sealed at the receiver's last key rotation, the signed
+                                                # `enc_sym_key` is kept to verify the signature
+        self.codec: bytes | None = payload.get("codec") # compression of the content, see `crypto.compression`
+        self.header: bytes | None = payload.get("header") # secretstream header of a streamed content, see `crypto.stream`
+
+    # Slots as a flat tuple: much faster to pickle in the storage WAL and snapshots
+    def __reduce__(self):
+        return _restore, _get_state(self)
+
+    def get_aad(self) -> AAD:
+        return AAD(self.sender, self.receiver, self.unlock_day)
+
+    def key_slot(self) -> dict[str, bytes]:
+        '''
+        Returns:
+            dict[str, bytes]: The enc_sym_key and, once the receiver rotated its keys, the rewrapped_key.
+        '''
+        if self.rewrapped_key is None:
+            return {"enc_sym_key": self.enc_sym_key}
+        return {"enc_sym_key": self.enc_sym_key, "rewrapped_key": self.rewrapped_key}
+
+    def to_payload(self, verify_key: bytes, with_key: bool = True) -> Payload:
+        '''
+        Build the payload sent to the receiver.
+
+        Args:
+            `verify_key` (bytes): Sender's verify key referenced by `self.key_id`.
+            `with_key` (bool): Include the `enc_sym_key`.
+
+        Returns:
+            Payload: Dictionary containing ciphertext, aad, signature, verify_key,
+                optionally the key slot (see `key_slot`), codec (compressed content) and header (streamed content).
+        '''
+        payload = Payload({
+            "ciphertext"    : self.ciphertext,
+            "aad"           : self.aad,
+            "signature"     : self.signature,
+            "verify_key"    : verify_key,
+        })
+        if with_key:
+            payload["enc_sym_key"] = self.enc_sym_key
+            if self.rewrapped_key is not None:
+                payload["rewrapped_key"] = self.rewrapped_key
+        if self.codec is not None:
+            payload["codec"] = self.codec
+        if self.header is not None:
+            payload["header"] = self.header
+        return payload
+
+_get_state = attrgetter(*MessageRecord.__slots__)
+
+def _restore(*state) -> MessageRecord:
+    record = MessageRecord.__new__(MessageRecord)
+    (record.message_id, record.sender, record.receiver, record.unlock_day, record.aad, record.enc_sym_key,
+     record.ciphertext, record.signature, record.key_id, record.locked, record.rewrapped_key, record.codec,
+     record.header) = state
+    return record
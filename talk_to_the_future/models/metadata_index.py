@@ -0,0 +1,161 @@
+import numpy as np
+from datetime import date
+from models.message import MessageRecord
+
+INITIAL_CAPACITY = 1024
+ID_BITS = 32 # row keys pack (receiver name id, message_id) in one integer
+
+class MetadataIndex:
+    '''
+    Columnar index of the metadata of the stored messages, for analytics and admin queries
+    over millions of messages (see `Server.count_messages`).
+
+    One row per stored message in parallel NumPy columns: unlock day ordinal, sender and
+    receiver name ids and message_id. Rows are appended at ingest and flagged dead when the
+    message is deleted, so filters run on whole columns at once instead of building one
+    `AAD` per message. Dead rows are dropped once they make up half of the columns.
+    '''
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.__name_ids: dict[str, int] = {}    # (name: name id), senders and receivers
+        self.__names: list[str] = []            # name of each name id
+        self.__rows: dict[int, int] = {}        # (receiver id << ID_BITS | message_id: row)
+        self.size: int = 0                      # rows in use, dead ones included
+        self.unlock = np.zeros(capacity, np.int32)      # unlock day ordinals
+        self.sender = np.zeros(capacity, np.int32)      # sender name ids
+        self.receiver = np.zeros(capacity, np.int32)    # receiver name ids
+        self.message_id = np.zeros(capacity, np.int64)
+        self.alive = np.zeros(capacity, np.bool_)
+
+    # Private Methods ---------------------------------------------------------------------
+    def __name_id(self, name: str) -> int:
+        name_id = self.__name_ids.get(name)
+        if name_id is None:
+            name_id = self.__name_ids[name] = len(self.__names)
+            self.__names.append(name)
+        return name_id
+
+    def __resize(self, capacity: int, keep: np.ndarray | slice) -> None:
+        for column in ("unlock", "sender", "receiver", "message_id", "alive"):
+            values = getattr(self, column)[keep]
+            resized = np.zeros(capacity, values.dtype)
+            resized[:len(values)] = values
+            setattr(self, column, resized)
+
+    def __compact(self) -> None:
+        alive = np.flatnonzero(self.alive[:self.size])
+        self.__resize(max(INITIAL_CAPACITY, 2 * len(alive)), alive)
+        self.size = len(alive)
+        keys = self.receiver[:self.size].astype(np.int64) << ID_BITS | self.message_id[:self.size]
+        self.__rows = dict(zip(keys.tolist(), range(self.size)))
+
+    def __drop(self, rows: int | list[int]) -> None:
+        self.alive[rows] = False
+        if self.size > INITIAL_CAPACITY and len(self.__rows) * 2 < self.size:
+            self.__compact()
+
+    # Public methods -----------------------------------------------------------------------
+    @classmethod
+    def build(cls, users) -> 'MetadataIndex':
+        '''Index of every message of `users`, e.g. a storage loaded from a snapshot.'''
+        index = cls()
+        for user in users:
+            for message in user.received_messages.values():
+                index.add(message)
+        return index
+
+    def add(self, message: MessageRecord) -> None:
+        if self.size == len(self.alive):
+            self.__resize(2 * self.size, slice(0, self.size))
+        row = self.size
+        receiver = self.__name_id(message.receiver)
+        self.unlock[row] = message.unlock_day.toordinal()
+        self.sender[row] = self.__name_id(message.sender)
+        self.receiver[row] = receiver
+        self.message_id[row] = message.message_id
+        self.alive[row] = True
+        self.__rows[receiver << ID_BITS | message.message_id] = row
+        self.size += 1
+
+    def delete(self, receiver: str, message_id: int) -> None:
+        receiver_id = self.__name_ids.get(receiver)
+        if receiver_id is None:
+            return
+        row = self.__rows.pop(receiver_id << ID_BITS | message_id, None)
+        if row is not None:
+            self.__drop(row)
+
+    def delete_mailbox(self, receiver: str, message_ids) -> None:
+        '''
+        Drop every message of `receiver` (mailbox cleared or user removed), in time
+        proportional to its mailbox only.
+
+        Args:
+            `receiver` (str): Name of the receiver.
+            `message_ids` (Iterable[int]): IDs of the messages of its mailbox.
+        '''
+        receiver_id = self.__name_ids.get(receiver)
+        if receiver_id is None:
+            return
+        key, rows = receiver_id << ID_BITS, []
+        for message_id in message_ids:
+            row = self.__rows.pop(key | message_id, None)
+            if row is not None:
+                rows.append(row)
+        if rows:
+            self.__drop(rows)
+
+    def mask(self, sender: str | None = None, receiver: str | None = None,
+             since: date | None = None, until: date | None = None) -> np.ndarray:
+        '''
+        Args:
+            `sender` (str): Only the messages sent by `sender`.
+            `receiver` (str): Only the messages received by `receiver`.
+            `since` (date): Only the messages unlocking on `since` or later.
+            `until` (date): Only the messages unlocking on `until` or earlier.
+
+        Returns:
+            np.ndarray: Boolean mask of the rows of the live messages matching every given filter.
+        '''
+        mask = self.alive[:self.size].copy()
+        for name, column in ((sender, self.sender), (receiver, self.receiver)):
+            if name is not None:
+                name_id = self.__name_ids.get(name)
+                if name_id is None:
+                    return np.zeros(self.size, np.bool_)
+                mask &= column[:self.size] == name_id
+        if since is not None:
+            mask &= self.unlock[:self.size] >= since.toordinal()
+        if until is not None:
+            mask &= self.unlock[:self.size] <= until.toordinal()
+        return mask
+
+    def count(self, **filters) -> int:
+        '''Number of live messages matching `filters` (see `mask`).'''
+        return int(np.count_nonzero(self.mask(**filters)))
+
+    def find(self, limit: int | None = None, **filters) -> list[tuple[str, int]]:
+        '''
+        Returns:
+            list[tuple[str, int]]: (receiver, message_id) of the live messages matching
+                `filters` (see `mask`), in storage order, at most `limit`.
+        '''
+        rows = np.flatnonzero(self.mask(**filters))[:limit]
+        names = self.__names
+        return [(names[receiver], message_id) for receiver, message_id
+                in zip(self.receiver[rows].tolist(), self.message_id[rows].tolist())]
+
+    def count_by_day(self, since: date, until: date, **filters) -> dict[date, int]:
+        '''
+        Returns:
+            dict[date, int]: Number of live messages matching `filters` unlocking on each day of [since, until],
+                empty if `since` is after `until`.
+        '''
+        if since > until:
+            return {}
+        unlock = self.unlock[:self.size][self.mask(since=since, until=until, **filters)]
+        counts = np.bincount(unlock - since.toordinal(), minlength=until.toordinal() - since.toordinal() + 1)
+        start = since.toordinal()
+        return {date.fromordinal(start + day): count for day, count in enumerate(counts.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.__rows)
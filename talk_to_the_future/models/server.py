@@ -1,21 +1,38 @@
 from models.user_infos import UserInfos
-from models.aad import AAD
+from models.storage import MemoryStorage
+from models.aad import AAD, RECEIVERS_SEP
+from models.message import MessageRecord
+from models.unlock_scheduler import UnlockScheduler
+from models.session_store import Session, SessionStore
+from models.change_log import ADDED, DELETED
+from models.admission import Admission, RetryLater, payload_size
 from utils.logger import Tracer
+import utils.metrics as metrics
 from datetime import date
-from crypto import generate_token
+import crypto.parameters as params
+import hmac
 
+@metrics.instrument("server")
 class Server: 
-    def __init__(self, name:str='Server', tr:Tracer = Tracer(trace_level='DEBUG')):
+    def __init__(self, name:str='Server', tr:Tracer = Tracer(trace_level='DEBUG'), storage:MemoryStorage = None,
+                 session_ttl: float = params.SESSION_TTL, admission: Admission = None):
         self.name:str = name
-        self.__users:list[UserInfos]  = []
-        self.__sessions:dict[str, str] = {} # (username: token)
+        self.__storage:MemoryStorage = storage if storage is not None else MemoryStorage() # users and their messages
+        self.__scheduler:UnlockScheduler = UnlockScheduler(tr=tr) # time-ordered index of locked messages
+        self.__sessions:SessionStore = SessionStore(session_ttl, on_close=self.__close_session) # expiring sessions, several per user
+        self.admission:Admission = admission if admission is not None else Admission.unlimited() # limits of the writes
         self.tr:Tracer = tr     # Tracer to handle general verbosity of the Server
                                 # 4 possible levels : ERROR, WARNING, INFO, DEBUG
 
+        # Index locked messages recovered by the storage backend
+        for user in self.__storage.users:
+            for message in user.received_messages.values():
+                self.__scheduler.schedule(message)
+
     # Private Methods ---------------------------------------------------------------------
     def __get_user(self, username: str) -> UserInfos | None:
         '''
-        Find `username` in self.__users list.
+        Find `username` in self.__storage.
         
         Args:
             `username` (str) : Desired user username.
@@ -23,58 +40,129 @@ class Server:
         Returns: 
             UserInfos: Object containing informations on user (name, keys, received_messages)
         '''
-        for user in self.__users:
-            if user.name == username:
-                return user
-        self.tr.error(f"[{self}]: No user is registered as : {username}")
+        user = self.__storage.get_user(username)
+        if user:
+            return user
+        self.tr.error("[%s]: No user is registered as : %s", self, username)
         return None
     
     def __check_session(self, username : str, token: str) -> bool:
         '''
-        Check if a given username has an active session.
+        Check if a given username has an active session, and extend it.
         
         Args: 
             `username` (str) : Name of the user.
             `token` (str) : Token of the active session to be checked.
         
         Returns: 
-            bool : True if user is part of the connected users and the token is accurate, else False.
+            bool : True if `token` is a live session of the user, else False.
         '''
-        session = self.__sessions.get(username)
-        if not session:
-            self.tr.error(f'[{self}]: No active session found for {username}')
+        if not self.__sessions.check(username, token):
+            self.tr.error('[%s]: No active session found for %s with this token', self, username)
             return False
-        if session != token:
-            self.tr.error(f'[{self}]: Invalid token for {username}')
+        return True
+
+    def __check_key_version(self, receiver: UserInfos, key_version: int | None) -> bool:
+        '''
+        Check that a message was sealed with the current public key of `receiver`.
+        Messages sent without `key_version` are not checked.
+        '''
+        if key_version is not None and key_version != receiver.key_version:
+            self.tr.warn("[%s]: Public key of %s changed (version %s, not %s)", self, receiver.name, receiver.key_version, key_version)
+            return False
+        return True
+
+    def __cancel_unlocks(self, user: UserInfos) -> None:
+        '''
+        Remove every message of `user` from the unlock scheduler before they are deleted.
+        '''
+        for message in user.received_messages.values():
+            self.__scheduler.cancel(message)
+
+    def __check_size(self, message: dict) -> bool:
+        '''
+        Returns:
+            bool: True if the admission control accepts the size of `message` (see `payload_size`).
+        '''
+        size = payload_size(message)
+        if not self.admission.check_size(size):
+            self.tr.error("[%s]: Message is too large (%s bytes, at most %s)", self, size, self.admission.max_payload)
             return False
         return True
 
+    def __take_token(self, sender: str) -> None:
+        '''
+        Raises:
+            RetryLater: `sender` is over its rate (see `Admission.take_token`).
+        '''
+        try:
+            self.admission.take_token(sender)
+        except RetryLater as retry:
+            self.tr.warn("[%s]: %s, retry in %.3fs", self, retry, retry.retry_after)
+            raise
+
+    def __check_quotas(self, receivers: list[UserInfos]) -> bool:
+        for receiver in receivers:
+            if not self.admission.check_quota(len(receiver.received_messages)):
+                self.tr.error("[%s]: Mailbox of %s is full (%s messages)", self, receiver.name, len(receiver.received_messages))
+                return False
+        return True
+
+    def __close_session(self, session: Session) -> None:
+        '''
+        Called by the session store when a session is revoked or expires: its unlock
+        subscriptions end with it.
+        '''
+        self.__scheduler.unsubscribe(session.username, session=session.token)
+
+    def __drop_user(self, username: str) -> None:
+        self.__sessions.revoke_user(username)
+        self.__scheduler.unsubscribe(username)
+        self.__cancel_unlocks(self.__get_user(username))
+        self.__storage.remove_user(username)
+
+    def __store_broadcast(self, aad: AAD, receivers: list[UserInfos], message: dict, key_id: int) -> None:
+        '''
+        Store one record per receiver of a broadcast `message`, each with its own key slot.
+        '''
+        slots: dict[str, bytes] = message["enc_sym_keys"]
+        records = []
+        for receiver in receivers:
+            slot = {**message, "enc_sym_key": slots[receiver.name]}
+            records.append(MessageRecord(AAD(aad.sender, receiver.name, aad.unlock_day), slot, key_id))
+        self.__storage.add_messages(records)
+        for record in records:
+            self.__scheduler.schedule(record)
+
     # Public methods -----------------------------------------------------------------------
     def register(self, username: str, keys: dict[str, bytes]) -> bool:
 
+        # The receivers of a broadcast are listed in its AAD separated by RECEIVERS_SEP
+        if not username or RECEIVERS_SEP in username:
+            self.tr.error("[%s]: Invalid username %r, it can't be empty or hold %r", self, username, RECEIVERS_SEP)
+            return False
+
         # Check if user already exists
-        if not all(user.name != username  for user in self.__users):
-            self.tr.error(f"[{self}]: User {username} already exists!")
+        if username in self.__storage.users:
+            self.tr.error("[%s]: User %s already exists!", self, username)
             return False
 
         # Check if all expected public keys are provided 
         if not {"salt", "password_tag", "public_key", "verify_key"} <= keys.keys():
-            self.tr.error(f"[{self}]: User {username} needs to provide every key to register!")
+            self.tr.error("[%s]: User %s needs to provide every key to register!", self, username)
             return False
         
         # Add user
-        self.__users.append(UserInfos(username, keys))
-        self.tr.info(f"[{self}]: New user {username} was added!")
+        self.__storage.add_user(username, keys)
+        self.tr.info("[%s]: New user %s was added!", self, username)
         return True
         
     
     def remove(self, username: str, token: str) -> bool :
         if not self.__check_session(username, token):
             return False
-        user = self.__get_user(username)
-        self.logout(username, token)
-        self.__users.remove(user)
-        self.tr.info(f"[{self}]: User {username} was successfully removed!")
+        self.__drop_user(username)
+        self.tr.info("[%s]: User %s was successfully removed!", self, username)
         return True
 
     def get_user_salt(self, username: str) -> bytes | None :
@@ -82,49 +170,180 @@ class Server:
         if not user:
             return None
         return user.keys["salt"]
+
+    def get_user_kdf_params(self, username: str) -> bytes | None :
+        '''
+        Returns:
+            bytes: Argon2 parameters `username` keys were generated with,
+                None if unknown (keys registered before parameters were recorded).
+        '''
+        user = self.__get_user(username)
+        if not user:
+            return None
+        return user.keys.get("kdf_params")
     
     def login(self, username:str, pwd_verifier:bytes) -> str | None :
         user = self.__get_user(username)
         if not user :
             return None
-        if user.keys["password_tag"] != pwd_verifier :
-            self.tr.error(f'[{self}]: Wrong password!')
+        if not isinstance(pwd_verifier, bytes) or not hmac.compare_digest(user.keys["password_tag"], pwd_verifier) :
+            self.tr.error('[%s]: Wrong password!', self)
             return None
-        token: str = generate_token()
-        self.__sessions[username] = token
-        self.tr.info(f'[{self}]: User {username} is now connected!')
+        token: str = self.__sessions.create(username)
+        self.tr.info('[%s]: User %s is now connected!', self, username)
         return token
     
     def logout(self, username: str, token: str) -> bool:
-        if not self.__check_session(username, token):
+        if not self.__sessions.revoke(username, token):
+            self.tr.error('[%s]: No active session found for %s with this token', self, username)
             return False
-        del self.__sessions[username]
-        self.tr.info(f"[{self}]: {username} has been logged out.")
+        self.tr.info("[%s]: %s has been logged out.", self, username)
         return True
 
     def update_keys(self, username:str, token: str, new_keys: dict[str, bytes]) -> bool :
         # Check user session
         if not self.__check_session(username, token):
-            self.tr.warn(f"[{self}]: {username} must be logged in to update his keys")
+            self.tr.warn("[%s]: %s must be logged in to update his keys", self, username)
             return False
-        user = self.__get_user(username)
 
         # Check if all expected public keys are provided 
         if not {"salt", "password_tag", "public_key", "verify_key"} <= new_keys.keys():
-            self.tr.error(f"[{self}]: User {username} needs to provide every key to update his keys!")
+            self.tr.error("[%s]: User %s needs to provide every key to update his keys!", self, username)
             return False
         
-        # Delete all messages as client won't have the key to read them anymore
-        user.received_messages.clear() 
+        # Update keys, all messages are deleted as client won't have the key to read them anymore
+        self.__cancel_unlocks(self.__get_user(username))
+        self.__storage.update_keys(username, new_keys)
+        self.tr.info("[%s]: Keys updated for %s.", self, username)
+        return True
+
+    def rotate_keys(self, username: str, token: str, new_keys: dict[str, bytes], rewrapped_keys: dict[int, bytes],
+                    escrowed_keys: list[bytes]) -> bool:
+        '''
+        Replace the keys of `username` like `update_keys`, but keep its mailbox (see `Client.change_password`).
+        Only key slots are replaced, in one storage operation: ciphertexts are untouched.
+
+        Args:
+            `username` (str): Name of the user.
+            `token` (str): Token of the active session of `username`.
+            `new_keys` (dict[str, bytes]): New public keys, as for `update_keys`.
+            `rewrapped_keys` (dict[int, bytes]): Symmetric key of unlocked messages sealed to the new public key
+                (message_id: rewrapped_key). The `enc_sym_key` covered by the sender's signature is kept.
+            `escrowed_keys` (list[bytes]): Former private keys sealed to the new public key, to open the messages
+                that could not be rewrapped (still locked). They replace the previous ones.
+
+        Returns:
+            bool: False if a message would be left unreadable: not rewrapped and no escrowed key.
+        '''
+        if not self.__check_session(username, token):
+            self.tr.warn("[%s]: %s must be logged in to rotate his keys", self, username)
+            return False
+
+        if not {"salt", "password_tag", "public_key", "verify_key"} <= new_keys.keys():
+            self.tr.error("[%s]: User %s needs to provide every key to rotate his keys!", self, username)
+            return False
+
+        user = self.__get_user(username)
+        # Messages deleted meanwhile are skipped, those received meanwhile need the escrowed keys
+        rewrapped_keys = {message_id: key for message_id, key in rewrapped_keys.items() if message_id in user.received_messages}
+        if len(rewrapped_keys) < len(user.received_messages) and not escrowed_keys:
+            self.tr.error("[%s]: %s messages of %s are not rewrapped and no key is escrowed", self,
+                          len(user.received_messages) - len(rewrapped_keys), username)
+            return False
 
-        # Update keys
-        user.keys = new_keys
-        self.tr.info(f"[{self}]: Keys updated for {username}.")
+        self.__storage.rotate_keys(username, new_keys, rewrapped_keys, escrowed_keys)
+        self.tr.info("[%s]: Keys rotated for %s, %s messages rewrapped.", self, username, len(rewrapped_keys))
         return True
+
+    def get_escrowed_keys(self, username: str, token: str) -> list[bytes] | None:
+        '''
+        Returns:
+            list[bytes]: Former private keys of `username` sealed to its current public key (see `rotate_keys`).
+        '''
+        if not self.__check_session(username, token):
+            return None
+        return self.__get_user(username).escrowed_keys
         
     def show_registered_users(self):
-        for user in self.__users:
+        for user in self.__storage.users:
             self.tr.info(user.name)
+
+    def list_users(self) -> list[str]:
+        return [user.name for user in self.__storage.users]
+
+    def count_messages(self, sender: str | None = None, receiver: str | None = None,
+                       since: date | None = None, until: date | None = None) -> int:
+        '''
+        Admin query on the stored messages, not exposed to clients (see `MetadataIndex.mask`).
+
+        Returns:
+            int: Number of messages from `sender`, to `receiver`, unlocking between `since` and `until`.
+        '''
+        return self.__storage.metadata.count(sender=sender, receiver=receiver, since=since, until=until)
+
+    def find_messages(self, sender: str | None = None, receiver: str | None = None,
+                      since: date | None = None, until: date | None = None, limit: int | None = None) -> list[tuple[str, int]]:
+        '''
+        Admin query on the stored messages, not exposed to clients (see `MetadataIndex.mask`).
+
+        Returns:
+            list[tuple[str, int]]: (receiver, message_id) of at most `limit` matching messages.
+        '''
+        return self.__storage.metadata.find(limit, sender=sender, receiver=receiver, since=since, until=until)
+
+    def count_unlocks_by_day(self, since: date, until: date) -> dict[date, int]:
+        '''
+        Returns:
+            dict[date, int]: Number of stored messages unlocking on each day from `since` to `until`.
+        '''
+        return self.__storage.metadata.count_by_day(since, until)
+
+    def export_user(self, username: str) -> tuple[UserInfos, dict[int, bytes]] | None:
+        '''
+        Read `username` and its mailbox, to move it to another shard with `import_user`.
+
+        Returns:
+            tuple[UserInfos, dict[int, bytes]]: The user and the verify keys its messages refer to (key_id: verify_key).
+        '''
+        if not self.__get_user(username):
+            return None
+        user = self.__storage.export_user(username)
+        verify_keys = {m.key_id: self.__storage.keys.get(m.key_id) for m in user.received_messages.values()}
+        return user, verify_keys
+
+    def import_user(self, user: UserInfos, verify_keys: dict[int, bytes]) -> bool:
+        '''
+        Add a user exported by another shard (`export_user`), keeping its message ids.
+        Its sessions are not moved, the user has to log in again.
+        '''
+        if user.name in self.__storage.users:
+            self.tr.error("[%s]: User %s already exists!", self, user.name)
+            return False
+        key_ids = {key_id: self.__storage.add_key(verify_key) for key_id, verify_key in verify_keys.items()}
+        for message in user.received_messages.values():
+            message.key_id = key_ids[message.key_id]
+        self.__storage.import_user(user)
+        for message in user.received_messages.values():
+            self.__scheduler.schedule(message)
+        self.tr.info("[%s]: User %s was imported with %s messages.", self, user.name, len(user.received_messages))
+        return True
+
+    def drop_user(self, username: str) -> bool:
+        '''
+        Remove `username` without a session, once it was imported on another shard.
+        '''
+        if not self.__get_user(username):
+            return False
+        self.__drop_user(username)
+        return True
+
+    def check_receivers(self, receivers: list[str]) -> bool:
+        '''
+        Prepare step of a broadcast spread over several shards, before any `deliver_message`:
+        every receiver living on this shard exists and has room in its mailbox.
+        '''
+        users = [self.__get_user(name) for name in receivers]
+        return all(users) and self.__check_quotas(users)
     
     def get_public_key(self, receiver: str) -> bytes | None:
         user = self.__get_user(receiver)
@@ -132,94 +351,440 @@ class Server:
             return None
         return user.keys["public_key"]
     
-    def send_message(self, sender: str, token: str, message: dict[str, bytes])-> bool:
+    def get_versioned_public_key(self, receiver: str) -> tuple[bytes, int] | None:
+        '''
+        `get_public_key` with the version of the key, for clients caching it (see `send_message`).
+
+        Returns:
+            tuple[bytes, int]: Public key of `receiver` and its version, bumped at each `update_keys`.
+        '''
+        user = self.__get_user(receiver)
+        if not user :
+            return None
+        return user.keys["public_key"], user.key_version
+
+    def get_public_keys(self, receivers: list[str]) -> dict[str, bytes] | None:
+        '''
+        Batched `get_public_key`: one request for all the receivers of a broadcast.
+
+        Returns:
+            dict[str, bytes]: Public key of each receiver, None if one of them is unknown.
+        '''
+        keys = {}
+        for receiver in receivers:
+            user = self.__get_user(receiver)
+            if not user:
+                return None
+            keys[receiver] = user.keys["public_key"]
+        return keys
+
+    def send_message(self, sender: str, token: str, message: dict[str, bytes], receiver_key_version: int | None = None)-> bool:
+        '''
+        Store a `message` for the receiver of its AAD.
+
+        Args:
+            `sender` (str): Name of the sender.
+            `token` (str): Token of the active session of `sender`.
+            `message` (dict[str, bytes]): Payload with enc_sym_key, ciphertext, aad and signature.
+            `receiver_key_version` (int): Version of the public key `message` was sealed with
+                (see `get_versioned_public_key`), the message is refused if the key changed since.
+
+        Returns:
+            bool: True if the message was stored, else False.
+
+        Raises:
+            RetryLater: `sender` is over its rate (see `Admission`).
+        '''
         # Check sender existancy and session
         sender_infos = self.__get_user(sender)
         if not sender_infos :
             return False
         if not self.__check_session(sender, token):
             return False
+
+        # Admission control: the size before any decoding, the rate once the message is valid
+        if not self.__check_size(message):
+            return False
         
         # Get Authenticated data
         aad = AAD.decode(message["aad"])
 
         # check sender from authenticated data
         if sender_infos.name != aad.sender :
-            self.tr.error(f"[{self}]: The session holder must be the sender of the message")
+            self.tr.error("[%s]: The session holder must be the sender of the message", self)
+            return False
+        if aad.broadcast:
+            self.tr.error("[%s]: Broadcast messages must be sent with send_broadcast", self)
             return False
         
         # get and check receiver from authenticated data
         receiver = self.__get_user(aad.receiver)
         if not receiver:
             return False
+        if not self.__check_key_version(receiver, receiver_key_version):
+            return False
+        if not self.__check_quotas([receiver]):
+            return False
+        self.__take_token(sender)
         
-        # Add sender's verify_key so receiver can check the signature
-        message["verify_key"] = sender_infos.keys["verify_key"] 
-        receiver.received_messages.append(message)
+        # Reference sender's verify_key so receiver can check the signature
+        record = MessageRecord(AAD(sender_infos.name, receiver.name, aad.unlock_day), message, sender_infos.verify_key_id)
+        self.__storage.add_message(receiver.name, record)
+        self.__scheduler.schedule(record)
         
-        self.tr.info(f"[{self}]: Message sent to {receiver.name}.")         
+        self.tr.info("[%s]: Message sent to %s.", self, receiver.name)         
         return True
     
-    def get_messages_aad(self, username: str, token: str) -> list[AAD] | None:
+    def send_broadcast(self, sender: str, token: str, message: dict) -> bool:
+        '''
+        Store a message encrypted once for several receivers.
+        The ciphertext is stored once, each receiver only gets its own key slot.
+
+        Args:
+            `sender` (str): Name of the sender.
+            `token` (str): Token of the active session of `sender`.
+            `message` (dict): Payload with ciphertext, aad, signature and enc_sym_keys (receiver: enc_sym_key).
+
+        Returns:
+            bool: True if the message was stored for every receiver, else False (and stored for none).
+
+        Raises:
+            RetryLater: `sender` is over its rate (see `Admission`).
+        '''
+        # Check sender existancy and session
+        sender_infos = self.__get_user(sender)
+        if not sender_infos :
+            return False
+        if not self.__check_session(sender, token):
+            return False
+
+        # Admission control: each receiver needs room in its mailbox, then a broadcast takes one token
+        if not self.__check_size(message):
+            return False
+
+        # Get Authenticated data
+        aad = AAD.decode(message["aad"])
+
+        # check sender from authenticated data
+        if sender_infos.name != aad.sender :
+            self.tr.error("[%s]: The session holder must be the sender of the message", self)
+            return False
+
+        # Key slots must match the authenticated receivers list
+        slots: dict[str, bytes] | None = message.get("enc_sym_keys")
+        if not aad.broadcast or slots is None or sorted(slots) != sorted(aad.receivers()):
+            self.tr.error("[%s]: Key slots don't match the receivers of the message", self)
+            return False
+        receivers = [self.__get_user(name) for name in slots]
+        if not all(receivers) or not self.__check_quotas(receivers):
+            return False
+        self.__take_token(sender)
+
+        self.__store_broadcast(aad, receivers, message, sender_infos.verify_key_id)
+        self.tr.info("[%s]: Broadcast message sent to %s receivers.", self, len(receivers))
+        return True
+
+    def authenticate_sender(self, sender: str, token: str, message: dict) -> bytes | None:
+        '''
+        First half of `send_message` / `send_broadcast` when the receivers live on another shard:
+        check the session of `sender` and that it is the authenticated sender of `message`.
+
+        The size and the rate of the sender are checked here, the quotas of the receivers by `deliver_message`.
+
+        Returns:
+            bytes: Current verify key of `sender`, to pass to `deliver_message`, else None.
+
+        Raises:
+            RetryLater: `sender` is over its rate.
+        '''
+        sender_infos = self.__get_user(sender)
+        if not sender_infos :
+            return None
+        if not self.__check_session(sender, token):
+            return None
+        if not self.__check_size(message):
+            return None
+        if sender_infos.name != AAD.decode(message["aad"]).sender :
+            self.tr.error("[%s]: The session holder must be the sender of the message", self)
+            return None
+        self.__take_token(sender)
+        return sender_infos.keys["verify_key"]
+
+    def deliver_message(self, message: dict, verify_key: bytes, receiver_key_version: int | None = None) -> bool:
+        '''
+        Second half of `send_message` / `send_broadcast`: store a message whose sender was
+        checked by the shard holding its session (see `authenticate_sender`).
+
+        Args:
+            `message` (dict): Payload of a message, or of a broadcast with the `enc_sym_keys`
+                of the receivers living on this shard only.
+            `verify_key` (bytes): Verify key of the sender.
+            `receiver_key_version` (int): See `send_message`, single receiver messages only.
+
+        Returns:
+            bool: True if the message was stored for every receiver, else False (and stored for none).
+        '''
+        if not self.__check_size(message):
+            return False
+        aad = AAD.decode(message["aad"])
+        slots: dict[str, bytes] | None = message.get("enc_sym_keys")
+        if (slots is None) == aad.broadcast:
+            self.tr.error("[%s]: Key slots don't match the kind of the message", self)
+            return False
+        if slots is None:
+            receiver = self.__get_user(aad.receiver)
+            if not receiver or not self.__check_key_version(receiver, receiver_key_version):
+                return False
+            if not self.__check_quotas([receiver]):
+                return False
+            record = MessageRecord(AAD(aad.sender, receiver.name, aad.unlock_day), message, self.__storage.add_key(verify_key))
+            self.__storage.add_message(receiver.name, record)
+            self.__scheduler.schedule(record)
+            return True
+
+        if not slots or not set(slots) <= set(aad.receivers()):
+            self.tr.error("[%s]: Key slots don't match the receivers of the message", self)
+            return False
+        receivers = [self.__get_user(name) for name in slots]
+        if not all(receivers) or not self.__check_quotas(receivers):
+            return False
+        self.__store_broadcast(aad, receivers, message, self.__storage.add_key(verify_key))
+        return True
+
+    def sync(self, username: str, token: str, cursor: str | None = None, limit: int = 256) -> dict | None:
+        '''
+        Incremental `get_messages_aad`: the changes to the mailbox of `username` since `cursor`.
+        Costs O(changes) instead of O(mailbox), a full sync is sent by pages when `cursor` is
+        None or too old.
+
+        Args:
+            `username` (str): Name of the receiver.
+            `token` (str): Token of the active session of `username`.
+            `cursor` (str): Cursor returned by the previous call, None for a full sync.
+            `limit` (int): Maximum number of added or deleted messages returned, at least 1.
+
+        Returns:
+            dict: `cursor` (str) for the next call, `reset` (bool) True if the client must drop
+                its copy of the mailbox first, `added` (dict[int, AAD]), `deleted` (list[int]),
+                `unlocked` (list[int]) messages whose unlock day came since the last sync,
+                `today` (date) day of the server and `more` (bool) True while changes remain.
+        '''
+        if not self.__check_session(username, token):
+            return None
+        if not isinstance(limit, int) or limit < 1:
+            self.tr.error("[%s]: Invalid sync limit %r, at least 1 message per page", self, limit)
+            return None
+        user: UserInfos = self.__get_user(username)
+        changes, messages = user.changes, user.received_messages
+        self.__scheduler.tick()
+        today = self.__scheduler.today
+
+        # cursor: "seq.day" when in sync, "seq.day.position" during a full sync
+        try:
+            seq, day, *position = (int(part) for part in cursor.split("."))
+        except (AttributeError, ValueError):
+            seq = None
+        reset = (seq is None or len(position) > 1 or not 1 <= day <= today.toordinal()
+                 or changes.since(seq, 0) is None)
+        if reset:
+            seq, day, position = changes.head, today.toordinal(), [-1]
+
+        if position:
+            # Full sync: page through the mailbox, changes made meanwhile are logged after `seq`
+            message_ids, last = changes.page(position[0], limit)
+            done = len(message_ids) < limit
+            return {
+                "cursor"    : f"{seq}.{day}" if done else f"{seq}.{day}.{last}",
+                "reset"     : reset,
+                "added"     : {message_id: messages[message_id].get_aad() for message_id in message_ids},
+                "deleted"   : [],
+                "unlocked"  : [],
+                "today"     : today,
+                "more"      : not done or changes.head > seq,
+            }
+
+        entries = changes.since(seq, limit)
+        added = {message_id: messages[message_id].get_aad() for op, message_id in entries
+                 if op == ADDED and message_id in messages}
+        deleted = [message_id for op, message_id in entries if op == DELETED]
+        unlocked = changes.unlocked(date.fromordinal(day), today) if day < today.toordinal() else []
+        seq += len(entries)
+        self.tr.debug("[%s]: Returning %s added, %s deleted and %s unlocked messages of %s", self, len(added), len(deleted), len(unlocked), username)
+        return {
+            "cursor"    : f"{seq}.{today.toordinal()}",
+            "reset"     : False,
+            "added"     : added,
+            "deleted"   : deleted,
+            "unlocked"  : unlocked,
+            "today"     : today,
+            "more"      : changes.head > seq,
+        }
+
+    def get_messages_aad(self, username: str, token: str) -> dict[int, AAD] | None:
         if not self.__check_session(username, token):
             return None        
         user = self.__get_user(username)
-        self.tr.debug(f"[{self}]: Returning {username}'s messages")
-        return [AAD.decode(msg["aad"]) for msg in user.received_messages]
+        self.tr.debug("[%s]: Returning %s's messages", self, username)
+        return {message_id: msg.get_aad() for message_id, msg in user.received_messages.items()}
     
     def get_message_payload(self, username: str, token: str, message_id: int, no_key: bool = False) -> dict[str, bytes] | None:
         if not self.__check_session(username, token):
             return None        
         user: UserInfos = self.__get_user(username)
         
-        if not (0 <= message_id < len(user.received_messages)):
-            self.tr.error(f"[{self}]: Message (id:{message_id}) does not exist for user {username}")
+        message = user.received_messages.get(message_id)
+        if not message:
+            self.tr.error("[%s]: Message (id:%s) does not exist for user %s", self, message_id, username)
             return None
 
-        message = user.received_messages[message_id].copy()
-        unlock_day = AAD.decode(message["aad"]).unlock_day
+        self.__scheduler.tick()
 
-        if date.today() < unlock_day:
+        if message.locked:
             if no_key:
-                self.tr.debug(f"[{self}]: Returning future message (id:{message_id}) without key")
-                del message["enc_sym_key"]
-                return message
+                self.tr.debug("[%s]: Returning future message (id:%s) without key", self, message_id)
+                return self.__storage.payload(message, with_key=False)
             else:
-                self.tr.warn(f"[{self}]: Access to message (id:{message_id}) is restricted until {unlock_day}")
+                self.tr.warn("[%s]: Access to message (id:%s) is restricted until %s", self, message_id, message.unlock_day)
                 return None
             
-        self.tr.debug(f"[{self}]: Returning message (id:{message_id}) with key")
-        return message
+        self.tr.debug("[%s]: Returning message (id:%s) with key", self, message_id)
+        return self.__storage.payload(message)
     
+    def get_message_payloads(self, username: str, token: str, message_ids: list[int]) -> dict[int, dict[str, bytes]] | None:
+        '''
+        Batched `get_message_payload` for unlocked messages.
+
+        Args:
+            `username` (str): Name of the receiver.
+            `token` (str): Token of the active session of `username`.
+            `message_ids` (list[int]): Desired message IDs.
+
+        Returns:
+            dict[int, dict[str, bytes]]: Full payload of each requested message that exists and is unlocked.
+        '''
+        if not self.__check_session(username, token):
+            return None
+        user: UserInfos = self.__get_user(username)
+
+        self.__scheduler.tick()
+        payloads = {}
+        for message_id in message_ids:
+            message = user.received_messages.get(message_id)
+            if message and not message.locked:
+                payloads[message_id] = self.__storage.payload(message)
+        self.tr.debug("[%s]: Returning %s/%s requested messages", self, len(payloads), len(message_ids))
+        return payloads
+
     def get_message_key(self, username: str, token: str, message_id:int) -> bytes | None:
         if not self.__check_session(username, token):
             return None        
         user: UserInfos = self.__get_user(username)
         
-        if not (0 <= message_id < len(user.received_messages)):
-            self.tr.error(f"[{self}]: Message (id:{message_id}) does not exist for user {username}")
+        message = user.received_messages.get(message_id)
+        if not message:
+            self.tr.error("[%s]: Message (id:%s) does not exist for user %s", self, message_id, username)
             return None
         
-        message = user.received_messages[message_id].copy()
-        unlock_day = AAD.decode(message["aad"]).unlock_day
-
-        if date.today() < unlock_day:
-            self.tr.warn(f"[{self}]: Key for message (id:{message_id}) not available until {unlock_day}")
+        self.__scheduler.tick()
+        if message.locked:
+            self.tr.warn("[%s]: Key for message (id:%s) not available until %s", self, message_id, message.unlock_day)
             return None
         
-        return message["enc_sym_key"]
+        # Sealed to the current public key once rewrapped (see `rotate_keys`)
+        return message.rewrapped_key or message.enc_sym_key
     
+    def get_message_keys(self, username: str, token: str, message_ids: list[int]) -> dict[int, dict[str, bytes]] | None:
+        '''
+        Batched `get_message_key`, e.g. for the messages of a client vault as they unlock.
+
+        Args:
+            `username` (str): Name of the receiver.
+            `token` (str): Token of the active session of `username`.
+            `message_ids` (list[int]): Desired message IDs.
+
+        Returns:
+            dict[int, dict[str, bytes]]: Key slot (`MessageRecord.key_slot`) of each requested message that exists and is unlocked.
+        '''
+        if not self.__check_session(username, token):
+            return None
+        user: UserInfos = self.__get_user(username)
+
+        self.__scheduler.tick()
+        keys = {}
+        for message_id in message_ids:
+            message = user.received_messages.get(message_id)
+            if message and not message.locked:
+                keys[message_id] = message.key_slot()
+        self.tr.debug("[%s]: Returning %s/%s requested keys", self, len(keys), len(message_ids))
+        return keys
+
     def delete_message(self, username: str, token: str, message_id:int) -> bool:
         if not self.__check_session(username, token):
             return False        
         user: UserInfos = self.__get_user(username)
         
-        if not (0 <= message_id < len(user.received_messages)):
-            self.tr.error(f"[{self}]: Message (id:{message_id}) does not exist for user {username}")
+        message = user.received_messages.get(message_id)
+        if not message:
+            self.tr.error("[%s]: Message (id:%s) does not exist for user %s", self, message_id, username)
             return False
         
-        user.received_messages.pop(message_id)
+        self.__scheduler.cancel(message)
+        self.__storage.delete_message(username, message_id)
+        return True
+
+    def subscribe_unlocks(self, username: str, token: str, callback) -> bool:
+        '''
+        Register a `callback(message_id, aad)` called as soon as a message of `username` gets unlocked,
+        so clients don't need to poll `get_messages_aad`. The subscription ends with the session
+        (logout, expiry or removal of the user).
+
+        Args:
+            `username` (str): Name of the receiver.
+            `token` (str): Token of the active session of `username`.
+            `callback` (Callable[[int, AAD], None]): Function notified with the id and AAD of each unlocked message.
+
+        Returns:
+            bool: True if the subscription succeeded else false.
+        '''
+        if not self.__check_session(username, token):
+            return False
+        self.__scheduler.subscribe(username, callback, session=token)
         return True
+
+    def unsubscribe_unlocks(self, username: str, token: str, callback = None) -> bool:
+        '''
+        Remove `callback`, or every callback subscribed with the session `token` if None.
+        '''
+        if not self.__check_session(username, token):
+            return False
+        self.__scheduler.unsubscribe(username, callback, session=token)
+        return True
+
+    def tick(self, today: date | None = None) -> int:
+        '''
+        Unlock the messages whose unlock day has come and notify subscribers.
+        Also done at each message access and by `start_scheduler`.
+
+        Returns:
+            int: Number of newly unlocked messages.
+        '''
+        return self.__scheduler.tick(today)
+
+    def start_scheduler(self, interval: float = 60.0) -> None:
+        '''
+        Check unlock days and sweep expired sessions every `interval` seconds in background threads.
+        '''
+        self.__scheduler.start(interval)
+        self.__sessions.start(interval)
         
+    def close(self) -> None:
+        '''
+        Stop the background threads and release the storage backend
+        (e.g. close the write-ahead log of a `DiskStorage`).
+        '''
+        self.__scheduler.stop()
+        self.__sessions.stop()
+        self.__storage.close()
+
     def __str__(self):
         return f"{self.name}"
\ No newline at end of file
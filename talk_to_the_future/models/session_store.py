@@ -0,0 +1,173 @@
+import heapq
+import hmac
+import threading
+import time
+from typing import Callable
+import crypto.parameters as params
+from crypto import generate_token
+
+SELECTOR_LENGTH = 16 # leading token characters used as lookup key, the full token is compared in constant time
+
+class Session:
+    __slots__ = ("token", "username", "expires", "alive")
+
+    def __init__(self, token: str, username: str, expires: float):
+        self.token: str = token
+        self.username: str = username
+        self.expires: float = expires
+        self.alive: bool = True
+
+class SessionStore:
+    '''
+    Active sessions of a `Server`, several per user, each expiring after `ttl` seconds without use.
+
+    Sessions are looked up by the first characters of their token (the selector) and the
+    full token is checked with `hmac.compare_digest`, so checks leak nothing through timing.
+    Expiry is driven by a heap ordered by deadline: using a session only moves its deadline
+    and the heap entry is pushed back when it surfaces, so `sweep` never scans the table.
+    `on_close(session)` is called for each session closed, whether revoked or expired.
+    '''
+    def __init__(self, ttl: float = params.SESSION_TTL, clock: Callable[[], float] = time.monotonic,
+                 on_close: Callable[[Session], None] | None = None):
+        self.ttl: float = ttl
+        self.clock = clock
+        self.on_close = on_close
+        self.__sessions: dict[str, Session] = {}        # (selector: session)
+        self.__by_user: dict[str, set[str]] = {}        # (username: selectors)
+        self.__expiry: list[tuple[float, int, Session]] = [] # heap of (deadline, seq, session)
+        self.__seq: int = 0
+        self.__lock = threading.RLock()
+        self.__timer: threading.Timer | None = None
+
+    # Private Methods ---------------------------------------------------------------------
+    def __push(self, session: Session) -> None:
+        heapq.heappush(self.__expiry, (session.expires, self.__seq, session))
+        self.__seq += 1
+
+    def __drop(self, session: Session) -> None:
+        session.alive = False
+        selector = session.token[:SELECTOR_LENGTH]
+        del self.__sessions[selector]
+        selectors = self.__by_user[session.username]
+        selectors.discard(selector)
+        if not selectors:
+            del self.__by_user[session.username]
+        if self.on_close is not None:
+            self.on_close(session)
+
+    def __compact(self) -> None:
+        '''Drop the heap entries of revoked sessions once they make up half of the heap.'''
+        if len(self.__expiry) > 2 * len(self.__sessions) + 64:
+            self.__expiry = [entry for entry in self.__expiry if entry[2].alive]
+            heapq.heapify(self.__expiry)
+
+    def __run(self, interval: float) -> None:
+        self.sweep()
+        self.__timer = threading.Timer(interval, self.__run, args=(interval,))
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    # Public methods -----------------------------------------------------------------------
+    def create(self, username: str) -> str:
+        '''
+        Open a new session for `username`, alongside the ones it may already have.
+
+        Returns:
+            str: Token of the session.
+        '''
+        with self.__lock:
+            self.sweep()
+            token = generate_token()
+            while token[:SELECTOR_LENGTH] in self.__sessions:
+                token = generate_token()
+            session = Session(token, username, self.clock() + self.ttl)
+            self.__sessions[token[:SELECTOR_LENGTH]] = session
+            self.__by_user.setdefault(username, set()).add(token[:SELECTOR_LENGTH])
+            self.__push(session)
+            return token
+
+    def check(self, username: str, token: str) -> bool:
+        '''
+        Check that `token` is a live session of `username` and extend its expiry.
+
+        Returns:
+            bool: True if the session is valid, else False.
+        '''
+        if not isinstance(token, str) or not token.isascii():
+            return False
+        with self.__lock:
+            session = self.__sessions.get(token[:SELECTOR_LENGTH])
+            if session is None or not hmac.compare_digest(session.token, token) or session.username != username:
+                return False
+            now = self.clock()
+            if session.expires <= now:
+                self.__drop(session)
+                return False
+            session.expires = now + self.ttl
+            return True
+
+    def revoke(self, username: str, token: str) -> bool:
+        '''
+        Close the session `token` of `username`.
+
+        Returns:
+            bool: True if the session existed, else False.
+        '''
+        with self.__lock:
+            if not self.check(username, token):
+                return False
+            self.__drop(self.__sessions[token[:SELECTOR_LENGTH]])
+            self.__compact()
+            return True
+
+    def revoke_user(self, username: str) -> int:
+        '''
+        Close every session of `username`.
+
+        Returns:
+            int: Number of closed sessions.
+        '''
+        with self.__lock:
+            selectors = list(self.__by_user.get(username, ()))
+            for selector in selectors:
+                self.__drop(self.__sessions[selector])
+            self.__compact()
+            return len(selectors)
+
+    def sweep(self, now: float | None = None) -> int:
+        '''
+        Remove the sessions that expired before `now` (defaults to `self.clock()`).
+        Costs O(log n) per expired or extended session.
+
+        Returns:
+            int: Number of removed sessions.
+        '''
+        with self.__lock:
+            now = self.clock() if now is None else now
+            expired = 0
+            while self.__expiry and self.__expiry[0][0] <= now:
+                session = heapq.heappop(self.__expiry)[2]
+                if not session.alive:
+                    continue
+                if session.expires > now:
+                    self.__push(session) # was used since it was pushed
+                    continue
+                self.__drop(session)
+                expired += 1
+            return expired
+
+    def start(self, interval: float = 60.0) -> None:
+        '''Sweep every `interval` seconds in a background thread.'''
+        if self.__timer is None:
+            self.__run(interval)
+
+    def stop(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def sessions_of(self, username: str) -> int:
+        return len(self.__by_user.get(username, ()))
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
@@ -0,0 +1,2 @@
+from .memory import MemoryStorage
+from .disk import DiskStorage
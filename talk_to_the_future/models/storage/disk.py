@@ -0,0 +1,215 @@
+import os
+import pickle
+import struct
+import zlib
+from models.storage.memory import MemoryStorage
+from models.user_infos import UserInfos
+from models.message import MessageRecord
+from models.metadata_index import MetadataIndex
+from models.blob_store import BlobStore, BlobRef, CACHE_SIZE
+
+RECORD_HEADER = struct.Struct(">II") # (length, crc32) of each WAL record
+
+class DiskStorage(MemoryStorage):
+    '''
+    Durable storage backend: an append-only write-ahead log (WAL) plus compacted snapshots.
+
+    Every mutation is appended to the WAL before being applied in memory. Once the WAL
+    holds at least `snapshot_every` records and is larger than the last snapshot, the
+    whole state is written to a new snapshot and a fresh WAL is started. Recovery thus
+    replays at most a snapshot worth of records, whatever the length of the history,
+    and the snapshot cost stays amortized over as many writes as it stores.
+
+    Files of generation `g` in `path`:
+        `snapshot-g`: state of the server when generation `g` started (absent for g = 0).
+        `wal-g`: mutations applied since then.
+        `blobs/`: ciphertexts of the messages (`BlobStore`), with `blob_cache` or once created.
+    WAL records keep the ciphertexts: blobs only need to be durable when a snapshot is written.
+    '''
+    def __init__(self, path: str, snapshot_every: int = 100_000, fsync: bool = False, blob_cache: int | None = None):
+        blobs_path = os.path.join(path, 'blobs')
+        if blob_cache is not None or os.path.isdir(blobs_path):
+            super().__init__(BlobStore(blobs_path, CACHE_SIZE if blob_cache is None else blob_cache))
+        else:
+            super().__init__()
+        self.path: str = path
+        self.snapshot_every: int = snapshot_every
+        self.fsync: bool = fsync    # fsync every record (slow), else only flush it to the OS
+
+        self.__generation: int = 0
+        self.__wal_records: int = 0 # number of records in the current WAL
+        self.__snapshot_size: int = 0 # size in bytes of the last snapshot
+        os.makedirs(path, exist_ok=True)
+        self.__recover()
+        self.__wal = open(self.__file('wal', self.__generation), 'ab')
+
+    # Private Methods ---------------------------------------------------------------------
+    def __file(self, kind: str, generation: int) -> str:
+        return os.path.join(self.path, f"{kind}-{generation}")
+
+    def __generations(self, kind: str) -> list[int]:
+        prefix = f"{kind}-"
+        return sorted(int(f[len(prefix):]) for f in os.listdir(self.path)
+                      if f.startswith(prefix) and f[len(prefix):].isdigit())
+
+    def __recover(self) -> None:
+        '''
+        Load the latest complete snapshot then replay its WAL.
+        A truncated or corrupted last record (crash during a write) is dropped.
+        '''
+        snapshots = self.__generations('snapshot')
+        if snapshots:
+            self.__generation = snapshots[-1]
+            snapshot_path = self.__file('snapshot', self.__generation)
+            self.__snapshot_size = os.path.getsize(snapshot_path)
+            with open(snapshot_path, 'rb') as f:
+                self.users, self.keys = pickle.load(f)
+            self.metadata = MetadataIndex.build(self.users)
+            if self.blobs is not None:
+                self.__retain_blobs()
+
+        wal_path = self.__file('wal', self.__generation)
+        if os.path.exists(wal_path):
+            with open(wal_path, 'r+b') as f:
+                valid_end = self.__replay(f)
+                f.truncate(valid_end)
+        if self.blobs is not None:
+            self.blobs.drop_unreferenced()
+        self.__remove_older_than(self.__generation)
+
+    def __retain_blobs(self) -> None:
+        '''
+        Count the references of the snapshot records to their blobs.
+        Ciphertexts of a snapshot written without blobs are moved to them.
+        '''
+        for user in self.users:
+            for message in user.received_messages.values():
+                if not isinstance(message.ciphertext, BlobRef):
+                    message.ciphertext = self.blobs.put(message.ciphertext)
+                elif not self.blobs.retain(message.ciphertext):
+                    raise ValueError(f"Missing blob of message (id:{message.message_id}) of {user.name} in {self.blobs.path}")
+
+    def __replay(self, f) -> int:
+        '''
+        Apply every valid record of the WAL `f`.
+
+        Returns:
+            int: Offset of the end of the last valid record.
+        '''
+        offset = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return offset
+            length, crc = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                return offset
+            op, *args = pickle.loads(data)
+            getattr(super(), op)(*args)
+            self.__wal_records += 1
+            offset += RECORD_HEADER.size + length
+
+    def __append(self, *record) -> None:
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__wal.write(RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data)
+        self.__wal.flush()
+        if self.fsync:
+            os.fsync(self.__wal.fileno())
+        self.__wal_records += 1
+
+    def __maybe_snapshot(self) -> None:
+        if self.__wal_records >= self.snapshot_every and self.__wal.tell() >= self.__snapshot_size:
+            self.snapshot()
+
+    def __remove_older_than(self, generation: int) -> None:
+        for kind in ('snapshot', 'wal'):
+            for g in self.__generations(kind):
+                if g < generation:
+                    os.remove(self.__file(kind, g))
+
+    # Public methods -----------------------------------------------------------------------
+    def snapshot(self) -> None:
+        '''
+        Write the current state to a new snapshot and start a new, empty WAL.
+        The snapshot only becomes visible once fully written (atomic rename).
+        '''
+        generation = self.__generation + 1
+        tmp_path = self.__file('snapshot', generation) + '.tmp'
+        if self.blobs is not None:
+            self.blobs.sync()
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((self.users, self.keys), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self.__snapshot_size = f.tell()
+        os.replace(tmp_path, self.__file('snapshot', generation))
+
+        self.__wal.close()
+        self.__generation = generation
+        self.__wal = open(self.__file('wal', generation), 'ab')
+        self.__wal_records = 0
+        self.__remove_older_than(generation)
+
+    def add_user(self, username: str, keys: dict[str, bytes]) -> UserInfos | None:
+        if username in self.users:
+            return None
+        self.__append('add_user', username, keys)
+        user = super().add_user(username, keys)
+        self.__maybe_snapshot()
+        return user
+
+    def remove_user(self, username: str) -> UserInfos | None:
+        self.__append('remove_user', username)
+        user = super().remove_user(username)
+        self.__maybe_snapshot()
+        return user
+
+    def import_user(self, user: UserInfos) -> UserInfos | None:
+        if user.name in self.users:
+            return None
+        self.__append('import_user', user)
+        imported = super().import_user(user)
+        self.__maybe_snapshot()
+        return imported
+
+    def add_key(self, verify_key: bytes) -> int:
+        if verify_key not in self.keys:
+            self.__append('add_key', verify_key)
+        key_id = super().add_key(verify_key)
+        self.__maybe_snapshot()
+        return key_id
+
+    def update_keys(self, username: str, keys: dict[str, bytes]) -> None:
+        self.__append('update_keys', username, keys)
+        super().update_keys(username, keys)
+        self.__maybe_snapshot()
+
+    def rotate_keys(self, username: str, keys: dict[str, bytes], rewrapped_keys: dict[int, bytes],
+                    escrowed_keys: list[bytes]) -> None:
+        # One record for the whole rotation: replayed entirely or not at all
+        self.__append('rotate_keys', username, keys, rewrapped_keys, escrowed_keys)
+        super().rotate_keys(username, keys, rewrapped_keys, escrowed_keys)
+        self.__maybe_snapshot()
+
+    def add_message(self, receiver: str, message: MessageRecord) -> int:
+        self.__append('add_message', receiver, message)
+        message_id = super().add_message(receiver, message)
+        self.__maybe_snapshot()
+        return message_id
+
+    def add_messages(self, messages: list[MessageRecord]) -> list[int]:
+        # One record for the whole broadcast: pickle writes the shared ciphertext once
+        self.__append('add_messages', messages)
+        message_ids = super().add_messages(messages)
+        self.__maybe_snapshot()
+        return message_ids
+
+    def delete_message(self, username: str, message_id: int) -> None:
+        self.__append('delete_message', username, message_id)
+        super().delete_message(username, message_id)
+        self.__maybe_snapshot()
+
+    def close(self) -> None:
+        self.__wal.close()
+        super().close()
@@ -0,0 +1,169 @@
+import copy
+from models.user_directory import UserDirectory
+from models.user_infos import UserInfos
+from models.key_table import KeyTable
+from models.message import MessageRecord
+from models.metadata_index import MetadataIndex
+from models.blob_store import BlobStore, BlobRef
+
+class MemoryStorage:
+    '''
+    Volatile storage backend of a `Server`: everything lives in process memory and is
+    lost on restart. Every other backend extends it and keeps the same state in memory.
+
+    With a `BlobStore`, the ciphertexts are moved to it when messages are stored: records
+    only keep a `BlobRef` and payloads are built with `payload`.
+    '''
+    def __init__(self, blobs: BlobStore | None = None):
+        self.users: UserDirectory = UserDirectory()
+        self.keys: KeyTable = KeyTable() # verify keys referenced by the stored messages
+        self.metadata: MetadataIndex = MetadataIndex() # columnar index of the stored messages
+        self.blobs: BlobStore | None = blobs # ciphertexts of the stored messages, else kept in the records
+
+    # Private Methods ---------------------------------------------------------------------
+    def __release_blobs(self, messages) -> None:
+        if self.blobs is not None:
+            for message in messages:
+                self.blobs.release(message.ciphertext)
+
+    # Public methods -----------------------------------------------------------------------
+
+    def get_user(self, username: str) -> UserInfos | None:
+        return self.users.get(username)
+
+    def add_user(self, username: str, keys: dict[str, bytes]) -> UserInfos | None:
+        user = self.users.add(username, keys)
+        if user:
+            user.verify_key_id = self.keys.add(keys["verify_key"])
+        return user
+
+    def remove_user(self, username: str) -> UserInfos | None:
+        user = self.users.remove(username)
+        if user:
+            self.metadata.delete_mailbox(username, user.received_messages)
+            self.__release_blobs(user.received_messages.values())
+        return user
+
+    def import_user(self, user: UserInfos) -> UserInfos | None:
+        '''
+        Add `user` exported by another storage with its mailbox, keeping its message ids.
+        The `key_id` of its messages must already point to this storage's `keys` (see `add_key`).
+        '''
+        imported = MemoryStorage.add_user(self, user.name, user.keys)
+        if imported:
+            imported.received_messages = user.received_messages
+            imported.next_message_id = user.next_message_id
+            imported.changes = user.changes
+            imported.key_version = user.key_version
+            imported.escrowed_keys = user.escrowed_keys
+            for message in user.received_messages.values():
+                if self.blobs is not None:
+                    message.ciphertext = self.blobs.put(message.ciphertext)
+                self.metadata.add(message)
+        return imported
+
+    def export_user(self, username: str) -> UserInfos | None:
+        '''
+        Returns:
+            UserInfos: `username` with its mailbox, to be imported by another storage (see `import_user`).
+                Ciphertexts held in `blobs` are read into copies of the records.
+        '''
+        user = self.users.get(username)
+        if user is None or self.blobs is None:
+            return user
+        exported = copy.copy(user)
+        exported.received_messages = {}
+        for message_id, message in user.received_messages.items():
+            record = exported.received_messages[message_id] = copy.copy(message)
+            record.ciphertext = self.blobs.get(message.ciphertext, cache=False)
+        return exported
+
+    def add_key(self, verify_key: bytes) -> int:
+        '''
+        Returns:
+            int: The `key_id` of a verify key that doesn't belong to a local user.
+        '''
+        return self.keys.add(verify_key)
+
+    def update_keys(self, username: str, keys: dict[str, bytes]) -> None:
+        user = self.users.get(username)
+        # Delete all messages as client won't have the key to read them anymore
+        self.__release_blobs(user.received_messages.values())
+        self.metadata.delete_mailbox(username, user.received_messages)
+        user.received_messages.clear()
+        user.changes.reset()
+        user.keys = keys
+        user.key_version += 1
+        user.verify_key_id = self.keys.add(keys["verify_key"])
+
+    def rotate_keys(self, username: str, keys: dict[str, bytes], rewrapped_keys: dict[int, bytes],
+                    escrowed_keys: list[bytes]) -> None:
+        '''
+        Replace the keys of `username` keeping its mailbox: the `rewrapped_key` of each message
+        of `rewrapped_keys` (message_id: rewrapped_key) and the `escrowed_keys` are replaced.
+        '''
+        user = self.users.get(username)
+        for message_id, rewrapped_key in rewrapped_keys.items():
+            user.received_messages[message_id].rewrapped_key = rewrapped_key
+        user.escrowed_keys = escrowed_keys
+        user.keys = keys
+        user.key_version += 1
+        user.verify_key_id = self.keys.add(keys["verify_key"])
+
+    def add_message(self, receiver: str, message: MessageRecord) -> int:
+        '''
+        Store `message` in the mailbox of `receiver` under a new `message_id`.
+
+        Returns:
+            int: The `message_id` given to `message`.
+        '''
+        user = self.users.get(receiver)
+        if self.blobs is not None and not isinstance(message.ciphertext, BlobRef):
+            message.ciphertext = self.blobs.put(message.ciphertext)
+        message.message_id = user.next_message_id
+        user.next_message_id += 1
+        user.received_messages[message.message_id] = message
+        user.changes.add(message.message_id, message.unlock_day)
+        self.metadata.add(message)
+        return message.message_id
+
+    def add_messages(self, messages: list[MessageRecord]) -> list[int]:
+        '''
+        Store each message of a broadcast in the mailbox of its `receiver`.
+        The records share the same ciphertext object, which is thus held (or put in `blobs`) once.
+
+        Returns:
+            list[int]: The `message_id` given to each message.
+        '''
+        if self.blobs is not None:
+            refs: dict[bytes, BlobRef] = {}
+            for message in messages:
+                ref = refs.get(message.ciphertext)
+                if ref is None:
+                    ref = refs[message.ciphertext] = self.blobs.put(message.ciphertext)
+                else:
+                    self.blobs.retain(ref)
+                message.ciphertext = ref
+        return [MemoryStorage.add_message(self, message.receiver, message) for message in messages]
+
+    def delete_message(self, username: str, message_id: int) -> None:
+        user = self.users.get(username)
+        message = user.received_messages.pop(message_id)
+        user.changes.delete(message_id, message.unlock_day)
+        self.metadata.delete(username, message_id)
+        self.__release_blobs((message,))
+
+    def payload(self, message: MessageRecord, with_key: bool = True) -> dict[str, bytes]:
+        '''
+        Returns:
+            dict[str, bytes]: Payload of a stored `message` for its receiver (see `MessageRecord.to_payload`),
+                with its ciphertext read from `blobs`.
+        '''
+        payload = message.to_payload(self.keys.get(message.key_id), with_key)
+        if self.blobs is not None:
+            payload["ciphertext"] = self.blobs.get(message.ciphertext)
+        return payload
+
+    def close(self) -> None:
+        if self.blobs is not None:
+            self.blobs.close()
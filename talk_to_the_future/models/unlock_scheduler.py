@@ -0,0 +1,131 @@
+import heapq
+import threading
+from datetime import date
+from typing import Callable
+from models.aad import AAD
+from models.message import MessageRecord
+from utils.logger import Tracer
+
+class UnlockScheduler:
+    '''
+    Time-ordered index of the messages that are still locked.
+
+    Pending messages sit in a heap ordered by unlock day. `tick` pops every message whose
+    day has come, flips it to unlocked and notifies the subscribers of its receiver, so
+    checking a message costs an attribute lookup and nothing is ever re-scanned.
+    '''
+    def __init__(self, clock: Callable[[], date] = date.today, tr: Tracer = Tracer(trace_level='DEBUG')):
+        self.clock = clock
+        self.tr: Tracer = tr     # reports the subscribers that fail
+        self.today: date = clock()
+        self.__pending: list[tuple[int, int, MessageRecord]] = [] # heap of (unlock ordinal, seq, message)
+        self.__locked: int = 0                                    # number of locked messages
+        self.__subscribers: dict[str, list[tuple[str | None, Callable[[int, AAD], None]]]] = {} # (receiver: [(session, callback)])
+        self.__seq: int = 0
+        self.__lock = threading.RLock()
+        self.__timer: threading.Timer | None = None
+
+    # Private Methods ---------------------------------------------------------------------
+    def __compact(self) -> None:
+        '''Drop the heap entries of cancelled messages once they make up half of the heap.'''
+        if len(self.__pending) > 2 * self.__locked + 64:
+            self.__pending = [entry for entry in self.__pending if entry[2].locked]
+            heapq.heapify(self.__pending)
+
+    def __run(self, interval: float) -> None:
+        self.tick()
+        self.__timer = threading.Timer(interval, self.__run, args=(interval,))
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    # Public methods -----------------------------------------------------------------------
+    def schedule(self, message: MessageRecord) -> bool:
+        '''
+        Index a newly stored `message` until its unlock day.
+
+        Returns:
+            bool: True if the message is already unlocked, else False.
+        '''
+        with self.__lock:
+            message.locked = message.unlock_day > self.today
+            if not message.locked:
+                return True
+            heapq.heappush(self.__pending, (message.unlock_day.toordinal(), self.__seq, message))
+            self.__seq += 1
+            self.__locked += 1
+            return False
+
+    def cancel(self, message: MessageRecord) -> None:
+        '''Forget a deleted `message`, its heap entry is dropped lazily.'''
+        with self.__lock:
+            if message.locked:
+                message.locked = False
+                self.__locked -= 1
+                self.__compact()
+
+    def tick(self, today: date | None = None) -> int:
+        '''
+        Unlock every message whose unlock day is before or equal to `today`
+        and notify their receivers' subscribers. A subscriber that raises is logged and
+        skipped, it doesn't fail the request that ticked nor the other notifications.
+
+        Args:
+            `today` (date): Current day, defaults to `self.clock()`.
+
+        Returns:
+            int: Number of messages that were unlocked.
+        '''
+        with self.__lock:
+            self.today = today if today else self.clock()
+            now = self.today.toordinal()
+            released = []
+            while self.__pending and self.__pending[0][0] <= now:
+                message = heapq.heappop(self.__pending)[2]
+                if message.locked:
+                    message.locked = False
+                    self.__locked -= 1
+                    released.append(message)
+            notifications = [(self.__subscribers.get(m.receiver, ()), m) for m in released]
+        for subscribers, message in notifications:
+            for _, callback in list(subscribers):
+                try:
+                    callback(message.message_id, message.get_aad())
+                except Exception as e:
+                    self.tr.error("[UnlockScheduler]: A subscriber of %s failed on message %s: %r",
+                                  message.receiver, message.message_id, e)
+        return len(released)
+
+    def subscribe(self, receiver: str, callback: Callable[[int, AAD], None], session: str | None = None) -> None:
+        '''
+        Call `callback(message_id, aad)` each time a message of `receiver` gets unlocked,
+        until `unsubscribe` (e.g. when `session`, the token it was made with, is closed).
+        '''
+        with self.__lock:
+            self.__subscribers.setdefault(receiver, []).append((session, callback))
+
+    def unsubscribe(self, receiver: str, callback: Callable[[int, AAD], None] | None = None,
+                    session: str | None = None) -> None:
+        '''
+        Remove the callbacks of `receiver` made with `session` and equal to `callback`,
+        any session or callback matching if None: every callback of `receiver` by default.
+        '''
+        with self.__lock:
+            subscribers = [(token, fn) for token, fn in self.__subscribers.get(receiver, ())
+                           if not ((session is None or token == session) and (callback is None or fn == callback))]
+            if subscribers:
+                self.__subscribers[receiver] = subscribers
+            else:
+                self.__subscribers.pop(receiver, None)
+
+    def start(self, interval: float = 60.0) -> None:
+        '''Tick every `interval` seconds in a background thread, so unlocks fire without requests.'''
+        if self.__timer is None:
+            self.__run(interval)
+
+    def stop(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def __len__(self) -> int:
+        return self.__locked
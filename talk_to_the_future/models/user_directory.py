@@ -0,0 +1,63 @@
+from models.user_infos import UserInfos
+
+class UserDirectory:
+    '''
+    Hash-indexed registry of the users known by a server.
+
+    Every user gets an internal integer `user_id` at registration. Users are indexed
+    by name and by id, so lookups, insertions and removals are O(1) whatever the
+    number of registered users.
+    '''
+    def __init__(self):
+        self.__ids: dict[str, int] = {}             # (username: user_id)
+        self.__users: dict[int, UserInfos] = {}     # (user_id: UserInfos)
+        self.__next_id: int = 0
+
+    def add(self, username: str, keys: dict[str, bytes]) -> UserInfos | None:
+        '''
+        Register a new user under a fresh `user_id`.
+
+        Args:
+            `username` (str): Name of the new user.
+            `keys` (dict[str, bytes]): Public keys of the new user.
+
+        Returns:
+            UserInfos: The created user, or None if `username` is already taken.
+        '''
+        if username in self.__ids:
+            return None
+        user = UserInfos(username, keys, self.__next_id)
+        self.__ids[username] = user.user_id
+        self.__users[user.user_id] = user
+        self.__next_id += 1
+        return user
+
+    def get(self, username: str) -> UserInfos | None:
+        user_id = self.__ids.get(username)
+        if user_id is None:
+            return None
+        return self.__users[user_id]
+
+    def get_by_id(self, user_id: int) -> UserInfos | None:
+        return self.__users.get(user_id)
+
+    def remove(self, username: str) -> UserInfos | None:
+        '''
+        Remove `username` from the directory. Ids of the other users are left untouched.
+
+        Returns:
+            UserInfos: The removed user, or None if `username` is not registered.
+        '''
+        user_id = self.__ids.pop(username, None)
+        if user_id is None:
+            return None
+        return self.__users.pop(user_id)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.__ids
+
+    def __len__(self) -> int:
+        return len(self.__users)
+
+    def __iter__(self):
+        return iter(self.__users.values())
@@ -1,8 +1,17 @@
+from models.message import MessageRecord
+from models.change_log import ChangeLog
+
 class UserInfos :
-    def __init__(self, name:str, keys:dict[str, bytes]):
+    def __init__(self, name:str, keys:dict[str, bytes], user_id:int = -1):
+        self.user_id: int = user_id # internal id given by the server directory
         self.name = name
         self.keys: dict[str, bytes] = keys
-        self.received_messages: list[dict[str, bytes]] = []
+        self.verify_key_id: int = -1 # id of the current verify key in the server KeyTable
+        self.key_version: int = 0    # bumped at each keys update, lets clients detect a cached stale public key
+        self.escrowed_keys: list[bytes] = [] # former private keys sealed to the current public key, see `Server.rotate_keys`
+        self.received_messages: dict[int, MessageRecord] = {} # (message_id: message), in reception order
+        self.next_message_id: int = 0
+        self.changes: ChangeLog = ChangeLog() # mailbox history for incremental sync
 
     def __str__(self):
         return f"{self.name}"
\ No newline at end of file
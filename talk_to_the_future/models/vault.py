@@ -0,0 +1,211 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import date
+from typing import Callable
+from models.aad import AAD
+from models.envelope import encode_payload, decode_payload
+
+RECORD_HEADER = struct.Struct(">IIqiB") # (length, crc32, message_id, unlock day ordinal, kind) of each record
+STORED = 0
+REMOVED = 1
+
+class Vault:
+    '''
+    Client-side store of future messages downloaded without their key
+    (see `Client.download_future_message`), so only the 48-byte sealed key has to be
+    fetched once they unlock.
+
+    Messages are appended to one file as envelopes (`models.envelope`), removals as
+    empty records. The file is read through a memory map, so only the messages read are
+    paged in. The index, kept in memory and rebuilt from the record headers when the
+    vault is opened, maps each message ID to its record and sorts them by unlock day.
+    The file is rewritten without the removed messages once they make up half of it.
+    '''
+    def __init__(self, path: str):
+        self.path: str = path
+        self.__records: dict[int, tuple[int, int, int]] = {} # message_id: (offset, length, unlock ordinal)
+        self.__by_day: list[tuple[int, int]] = []             # sorted (unlock ordinal, message_id)
+        self.__dead: int = 0                                  # bytes of removed records
+        self.__map: mmap.mmap | None = None
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'a+b')
+        self.__scan()
+
+    # Private Methods ---------------------------------------------------------------------
+    def __scan(self) -> None:
+        '''
+        Index the records of the file, a truncated last record (crash during a write) is dropped.
+        '''
+        f = self.__file
+        f.seek(0)
+        offset = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            length, crc, message_id, ordinal, kind = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length or zlib.crc32(data, zlib.crc32(header[8:])) != crc:
+                break
+            if kind == STORED:
+                self.__index(message_id, offset + RECORD_HEADER.size, length, ordinal)
+            else:
+                self.__unindex(message_id)
+                self.__dead += RECORD_HEADER.size
+            offset += RECORD_HEADER.size + length
+        f.truncate(offset)
+
+    def __index(self, message_id: int, offset: int, length: int, ordinal: int) -> None:
+        self.__unindex(message_id)
+        self.__records[message_id] = (offset, length, ordinal)
+        bisect.insort(self.__by_day, (ordinal, message_id))
+
+    def __unindex(self, message_id: int) -> None:
+        record = self.__records.pop(message_id, None)
+        if record:
+            offset, length, ordinal = record
+            del self.__by_day[bisect.bisect_left(self.__by_day, (ordinal, message_id))]
+            self.__dead += RECORD_HEADER.size + length
+
+    def __append(self, message_id: int, ordinal: int, kind: int, data: bytes = b"") -> int:
+        '''
+        Returns:
+            int: Offset of `data` in the file.
+        '''
+        meta = RECORD_HEADER.pack(len(data), 0, message_id, ordinal, kind)[8:]
+        header = RECORD_HEADER.pack(len(data), zlib.crc32(data, zlib.crc32(meta)), message_id, ordinal, kind)
+        self.__file.seek(0, os.SEEK_END)
+        offset = self.__file.tell() + RECORD_HEADER.size
+        self.__file.write(header + data)
+        self.__file.flush()
+        return offset
+
+    def __view(self, offset: int, length: int) -> memoryview:
+        if self.__map is None or len(self.__map) < offset + length:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.__map)[offset:offset + length]
+
+    def __compact(self) -> None:
+        tmp_path = self.path + '.tmp'
+        records = {}
+        with open(tmp_path, 'wb') as tmp:
+            for ordinal, message_id in self.__by_day:
+                offset, length, _ = self.__records[message_id]
+                data = self.__view(offset, length).tobytes()
+                meta = RECORD_HEADER.pack(length, 0, message_id, ordinal, STORED)[8:]
+                tmp.write(RECORD_HEADER.pack(length, zlib.crc32(data, zlib.crc32(meta)), message_id, ordinal, STORED))
+                records[message_id] = (tmp.tell(), length, ordinal)
+                tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self.__file.close()
+        self.__map = None
+        os.replace(tmp_path, self.path)
+        self.__file = open(self.path, 'a+b')
+        self.__records, self.__dead = records, 0
+
+    # Public methods -----------------------------------------------------------------------
+    def add(self, message_id: int, payload: dict[str, bytes]) -> bool:
+        '''
+        Store the keyless `payload` of message `message_id`.
+
+        Returns:
+            bool: False if the vault already holds the message.
+        '''
+        ordinal = AAD.decode(payload["aad"]).unlock_day.toordinal()
+        data = encode_payload(payload)
+        with self.__lock:
+            if message_id in self.__records:
+                return False
+            offset = self.__append(message_id, ordinal, STORED, data)
+            self.__index(message_id, offset, len(data), ordinal)
+        return True
+
+    def get(self, message_id: int) -> dict[str, bytes] | None:
+        '''
+        Returns:
+            dict[str, bytes]: Stored payload of message `message_id`, None if not in the vault.
+        '''
+        with self.__lock:
+            record = self.__records.get(message_id)
+            if record is None:
+                return None
+            return decode_payload(self.__view(record[0], record[1]), copy=True)
+
+    def unlock_day(self, message_id: int) -> date | None:
+        record = self.__records.get(message_id)
+        return date.fromordinal(record[2]) if record else None
+
+    def due(self, today: date | None = None) -> list[int]:
+        '''
+        Returns:
+            list[int]: IDs of the stored messages whose unlock day has come, oldest first.
+        '''
+        today = today or date.today()
+        with self.__lock:
+            end = bisect.bisect_right(self.__by_day, (today.toordinal(), float("inf")))
+            return [message_id for _, message_id in self.__by_day[:end]]
+
+    def remove(self, message_id: int) -> bool:
+        with self.__lock:
+            record = self.__records.get(message_id)
+            if record is None:
+                return False
+            self.__append(message_id, record[2], REMOVED)
+            self.__unindex(message_id)
+            self.__dead += RECORD_HEADER.size
+            if self.__dead > 4096 and self.__dead * 2 > self.__file.tell():
+                self.__compact()
+        return True
+
+    def close(self) -> None:
+        self.__map = None
+        self.__file.close()
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self.__records
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+class VaultUnlocker:
+    '''
+    Reads the vault of a `client` every `interval` seconds in a background thread
+    (see `Client.read_vault`): as each unlock day arrives, only the keys of the due
+    messages are fetched and the messages are decrypted locally.
+    Each one is handed to `callback(message_id, plaintext)`.
+    '''
+    def __init__(self, client, callback: Callable[[int, str | None], None], interval: float = 60.0):
+        self.client = client
+        self.callback = callback
+        self.interval: float = interval
+        self.__timer: threading.Timer | None = None
+
+    def __run(self) -> None:
+        self.run_once()
+        self.__timer = threading.Timer(self.interval, self.__run)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def run_once(self, today: date | None = None) -> int:
+        '''
+        Returns:
+            int: Number of messages read from the vault.
+        '''
+        messages = self.client.read_vault(today)
+        for message_id, plaintext in messages.items():
+            self.callback(message_id, plaintext)
+        return len(messages)
+
+    def start(self) -> None:
+        if self.__timer is None:
+            self.__run()
+
+    def stop(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
@@ -0,0 +1 @@
+from .client import RemoteServer, AsyncRemoteServer, RemoteError
@@ -0,0 +1,172 @@
+import asyncio
+import itertools
+import threading
+from models.admission import RetryLater
+from network import codec
+from utils.logger import Tracer
+
+class RemoteError(Exception):
+    '''Raised when a request could not be served by the remote `Server`.'''
+
+class Connection:
+    '''
+    One TCP connection to a `network.server`, requests are pipelined: they are written
+    without waiting for previous responses, which are matched back by request id.
+    '''
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: dict[int, asyncio.Future] = {}
+        self.ids = itertools.count()
+        self.task = asyncio.get_running_loop().create_task(self.__read_responses())
+
+    async def __read_responses(self) -> None:
+        error = ConnectionError("Connection closed by server")
+        try:
+            while True:
+                header = await self.reader.readexactly(codec.FRAME.size)
+                (length,) = codec.FRAME.unpack(header)
+                request_id, ok, result = codec.decode(await self.reader.readexactly(length))
+                future = self.pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                elif isinstance(result, dict) and "retry_after_ms" in result:
+                    future.set_exception(RetryLater(result["error"], result["retry_after_ms"] / 1000))
+                else:
+                    future.set_exception(RemoteError(result))
+        except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+            if not isinstance(e, asyncio.IncompleteReadError):
+                error = ConnectionError(f"Connection lost: {e!r}")
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            self.writer.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.task.done()
+
+    async def request(self, method: str, args: tuple, kwargs: dict):
+        if self.closed:
+            raise ConnectionError("Connection closed")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        data = codec.encode([request_id, method, args, kwargs])
+        self.writer.write(codec.FRAME.pack(len(data)) + data)
+        return await future
+
+    def close(self) -> None:
+        self.task.cancel()
+
+class AsyncRemoteServer:
+    '''
+    Asyncio client of a `network.server`, spreading requests over a pool of pipelined connections.
+    Must be used from a single event loop.
+    '''
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, pool_size: int = 4):
+        self.host = host
+        self.port = port
+        self.pool: list[Connection | None] = [None] * pool_size
+        self.locks: list[asyncio.Lock] | None = None
+        self.next_connection = itertools.cycle(range(pool_size))
+
+    # Private Methods --------------------------------------------------------
+
+    async def __get_connection(self) -> Connection:
+        if self.locks is None:
+            self.locks = [asyncio.Lock() for _ in self.pool]
+        i = next(self.next_connection)
+        connection = self.pool[i]
+        if connection is None or connection.closed:
+            # (Re)connect lazily, concurrent callers share the same attempt
+            async with self.locks[i]:
+                connection = self.pool[i]
+                if connection is None or connection.closed:
+                    connection = Connection(*await asyncio.open_connection(self.host, self.port))
+                    self.pool[i] = connection
+        return connection
+
+    # Public methods ---------------------------------------------------------
+
+    async def call(self, method: str, *args, **kwargs):
+        '''
+        Call `method` of the remote `Server`.
+
+        Raises:
+            RemoteError: The server rejected the request or raised while serving it.
+            RetryLater: The server can't admit the message yet (see `models.admission`).
+            ConnectionError: The connection was lost before the response.
+        '''
+        connection = await self.__get_connection()
+        return await connection.request(method, args, kwargs)
+
+    async def close(self) -> None:
+        for i, connection in enumerate(self.pool):
+            if connection is not None:
+                connection.close()
+                self.pool[i] = None
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+class RemoteServer:
+    '''
+    Drop-in replacement of `Server` for `Client` (`client.register_on(RemoteServer(...))`),
+    forwarding every call to a `network.server` listener.
+
+    Calls are synchronous for the caller and run on an event loop in a background thread,
+    so several threads can share the same pool of connections. Failed calls return None,
+    except `RetryLater` which is raised as by a local `Server`. `remote` replaces the
+    connection pool by another asyncio transport, such as a `network.shard.ShardRouter`.
+    '''
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, pool_size: int = 4,
+                 tr: Tracer = Tracer(trace_level='DEBUG'), timeout: float | None = 30, remote=None):
+        self.tr: Tracer = tr
+        self.timeout = timeout
+        self.remote = remote if remote is not None else AsyncRemoteServer(host, port, pool_size)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.lock = threading.Lock()
+
+    # Private Methods --------------------------------------------------------
+
+    def __get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name=f"RemoteServer-{self}", daemon=True).start()
+        return self.loop
+
+    def __call(self, method: str, *args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(self.remote.call(method, *args, **kwargs), self.__get_loop())
+        try:
+            return future.result(self.timeout)
+        except (RemoteError, OSError, TimeoutError) as e:
+            future.cancel()
+            self.tr.error("[%s]: %s failed: %r", self, method, e)
+            return None
+
+    # Public methods ---------------------------------------------------------
+
+    def __getattr__(self, method: str):
+        if method not in codec.RPC_METHODS:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.__call(method, *args, **kwargs)
+
+    def subscribe_unlocks(self, username: str, token: str, callback) -> bool:
+        self.tr.error("[%s]: Unlock notifications are not available on a remote server", self)
+        return False
+
+    def close(self) -> None:
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.remote.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop = None
+
+    def __str__(self):
+        return str(self.remote)
@@ -0,0 +1,143 @@
+import struct
+from datetime import date
+from models.aad import AAD
+from models.envelope import Payload, encode_payload, decode_payload
+from models.admission import RetryLater
+
+# Tagged binary encoding of the requests to the Server methods and of their results.
+# Message payloads (`Payload` dicts, built by their producers) are written as binary envelopes.
+
+U32 = struct.Struct(">I")
+I64 = struct.Struct(">q")
+FRAME = U32 # every request/response is prefixed by its length
+FRAME_OVERHEAD = 64 * 1024 # bytes of a request besides its message payload, see `max_frame_size`
+
+# Server methods callable remotely (callbacks such as subscribe_unlocks can't be)
+RPC_METHODS = frozenset({
+    "register", "remove", "get_user_salt", "get_user_kdf_params", "login", "logout", "update_keys",
+    "rotate_keys", "get_escrowed_keys", "get_public_key", "get_versioned_public_key", "get_public_keys",
+    "send_message", "send_broadcast", "get_messages_aad", "get_message_payload", "get_message_payloads",
+    "get_message_key", "get_message_keys", "delete_message", "sync",
+})
+
+def _encode(value, out: list) -> None:
+    if value is None:
+        out.append(b"N")
+    elif value is True:
+        out.append(b"T")
+    elif value is False:
+        out.append(b"F")
+    elif isinstance(value, int):
+        out.append(b"I" + I64.pack(value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(b"S" + U32.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(b"B" + U32.pack(len(value)))
+        out.append(bytes(value))
+    elif isinstance(value, AAD):
+        data = value.encode()
+        out.append(b"R" + U32.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, date):
+        out.append(b"Y" + U32.pack(value.toordinal()))
+    elif isinstance(value, Payload):
+        data = encode_payload(value)
+        out.append(b"P" + U32.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, dict):
+        out.append(b"D" + U32.pack(len(value)))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(b"L" + U32.pack(len(value)))
+        for item in value:
+            _encode(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def encode(value) -> bytes:
+    out = []
+    _encode(value, out)
+    return b"".join(out)
+
+def _decode(view: memoryview, offset: int):
+    tag = view[offset:offset + 1].tobytes()
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"I":
+        return I64.unpack_from(view, offset)[0], offset + I64.size
+    if tag == b"Y":
+        return date.fromordinal(U32.unpack_from(view, offset)[0]), offset + U32.size
+    if tag in (b"S", b"B", b"R", b"P"):
+        (length,) = U32.unpack_from(view, offset)
+        offset += U32.size
+        data = view[offset:offset + length]
+        if len(data) != length:
+            raise ValueError("Truncated value!")
+        offset += length
+        if tag == b"S":
+            return data.tobytes().decode(), offset
+        if tag == b"B":
+            return data.tobytes(), offset
+        if tag == b"R":
+            return AAD.decode(data), offset
+        return Payload(decode_payload(data, copy=True)), offset
+    if tag in (b"L", b"D"):
+        (count,) = U32.unpack_from(view, offset)
+        offset += U32.size
+        if tag == b"L":
+            items = []
+            for _ in range(count):
+                item, offset = _decode(view, offset)
+                items.append(item)
+            return items, offset
+        items = {}
+        for _ in range(count):
+            key, offset = _decode(view, offset)
+            items[key], offset = _decode(view, offset)
+        return items, offset
+    raise ValueError(f"Unknown tag {tag!r}")
+
+REQUEST_HEAD = 1 + U32.size + 1 + I64.size # "L" | count | "I" | request_id, first bytes of a request
+
+def peek_request_id(head: bytes | memoryview) -> int | None:
+    '''
+    Returns:
+        int: The request_id of a request from its first `REQUEST_HEAD` bytes, None if they don't start with one.
+    '''
+    if len(head) < REQUEST_HEAD or head[0:1] != b"L" or head[5:6] != b"I":
+        return None
+    return I64.unpack_from(head, 6)[0]
+
+def max_frame_size(max_payload: int | None) -> int | None:
+    '''
+    Returns:
+        int: Largest request accepted by a server admitting messages of `max_payload` bytes, None if unlimited.
+    '''
+    return None if max_payload is None else max_payload + FRAME_OVERHEAD
+
+def error_result(error: Exception):
+    '''
+    Result of a failed request: the `repr` of `error`, or the reason and the delay (in ms) of
+    a `RetryLater`, raised again by `network.client` for the caller to retry.
+    '''
+    if isinstance(error, RetryLater):
+        return {"error": str(error), "retry_after_ms": max(1, round(error.retry_after * 1000))}
+    return repr(error)
+
+def decode(data: bytes | memoryview):
+    try:
+        value, offset = _decode(memoryview(data), 0)
+    except struct.error:
+        raise ValueError("Truncated value!")
+    if offset != len(data):
+        raise ValueError("Trailing bytes after value!")
+    return value
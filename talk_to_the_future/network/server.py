@@ -0,0 +1,237 @@
+'''
+Asyncio TCP front end exposing a `Server` to remote clients.
+
+Every request is a frame (u32 length + codec value) holding [request_id, method, args, kwargs]
+and gets a response frame [request_id, ok, result]. A connection can pipeline any
+number of requests, responses come back in the same order.
+
+Usage (from talk_to_the_future/):
+    python -m network.server [--host 127.0.0.1] [--port 8765] [--data-dir DIR [--blob-cache MB]] [--shard]
+                             [--trace-level WARNING] [--log-format console|json]
+                             [--send-rate 20] [--send-burst 200] [--mailbox-quota 100000]
+                             [--max-payload MB] [--max-inflight MB] [--no-admission]
+
+Messages are admitted under the limits of `models.admission.Admission` (0 disables a limit):
+over the rate of its sender or the in-flight budget, a request gets a "retry later" response.
+The in-flight budget counts the bytes of every request from the moment its length is read
+until its response is written, so a refused request is never buffered.
+'''
+import argparse
+import asyncio
+import os
+from typing import Callable
+import crypto.parameters as params
+from models import Server
+from models.admission import Admission, RetryLater
+from network import codec
+from utils.logger import Tracer, ConsoleSink, background_json_sink
+
+def public_methods(server: Server) -> dict[str, Callable]:
+    return {method: getattr(server, method) for method in codec.RPC_METHODS}
+
+class FrameProtocol(asyncio.Protocol):
+    '''
+    Reads the request frames of a connection under the limits of `admission`: a frame longer
+    than `codec.max_frame_size(admission.max_payload)` is refused and closes the connection,
+    one over the in-flight budget is answered "retry later" and discarded unread.
+    Subclasses serve the complete frames in `serve`.
+    '''
+    def __init__(self, admission: Admission, tr: Tracer, owner):
+        self.admission: Admission = admission
+        self.tr: Tracer = tr
+        self.owner = owner               # server or router named in the logs
+        self.transport: asyncio.Transport | None = None
+        self.buffer = bytearray()
+        self.max_frame: int | None = codec.max_frame_size(admission.max_payload)
+        self.reserved: int | None = None # bytes of the request being received, counted in the in-flight budget
+        self.skip: int = 0               # bytes of a refused request still to be discarded
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.transport = transport
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self.reserved is not None:
+            self.admission.release(self.reserved)
+            self.reserved = None
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        responses = []
+        served = 0 # bytes in flight released once the responses are written
+        while True:
+            if self.skip:
+                dropped = min(self.skip, len(self.buffer))
+                del self.buffer[:dropped]
+                self.skip -= dropped
+                if self.skip:
+                    break
+            if len(self.buffer) < codec.FRAME.size:
+                break
+            (length,) = codec.FRAME.unpack_from(self.buffer)
+            if self.max_frame is not None and length > self.max_frame:
+                # Refused before being buffered: the connection can't be resynchronized
+                self.tr.error("[%s]: Request of %s bytes refused, at most %s", self.owner, length, self.max_frame)
+                response = codec.encode([None, False, f"Request too large ({length} bytes, at most {self.max_frame})"])
+                self.transport.write(b"".join(responses) + codec.FRAME.pack(len(response)) + response)
+                self.transport.close()
+                self.buffer.clear()
+                self.admission.release(served)
+                return
+            end = codec.FRAME.size + length
+            if self.reserved is None:
+                try:
+                    self.admission.acquire(length)
+                    self.reserved = length
+                except RetryLater as error:
+                    # Answered as soon as its request_id is known, the rest is discarded unread
+                    head = codec.FRAME.size + min(length, codec.REQUEST_HEAD)
+                    if len(self.buffer) < head:
+                        break
+                    request_id = codec.peek_request_id(self.buffer[codec.FRAME.size:head])
+                    response = codec.encode([request_id, False, codec.error_result(error)])
+                    responses += (codec.FRAME.pack(len(response)), response)
+                    self.skip = end
+                    continue
+            if len(self.buffer) < end:
+                break
+            request = bytes(self.buffer[codec.FRAME.size:end])
+            del self.buffer[:end]
+            response = self.serve(request, self.reserved)
+            if response is not None:
+                responses.append(codec.FRAME.pack(len(response)))
+                responses.append(response)
+                served += self.reserved
+            self.reserved = None
+        # All responses of the received batch are written at once
+        if responses:
+            self.transport.write(b"".join(responses))
+        if served:
+            self.admission.release(served)
+
+    def serve(self, request: bytes, size: int) -> bytes | None:
+        '''
+        Serve a complete `request` frame, counted as `size` bytes in flight.
+
+        Returns:
+            bytes: Its encoded response, written with the others of the batch, then `size` is
+                released. None if the subclass writes the response and releases `size` itself.
+        '''
+        raise NotImplementedError
+
+class ServerProtocol(FrameProtocol):
+    def __init__(self, server: Server, methods: dict[str, Callable] | None = None):
+        super().__init__(server.admission, server.tr, server)
+        self.server: Server = server
+        self.methods: dict[str, Callable] = methods if methods is not None else public_methods(server)
+
+    def serve(self, request: bytes, size: int) -> bytes:
+        return codec.encode(self.handle(request))
+
+    def handle(self, request: bytes) -> list:
+        request_id = None
+        try:
+            request_id, method, args, kwargs = codec.decode(request)
+            handler = self.methods.get(method)
+            if handler is None:
+                return [request_id, False, f"Unknown method {method}"]
+            return [request_id, True, handler(*args, **kwargs)]
+        except RetryLater as error:
+            return [request_id, False, codec.error_result(error)]
+        except Exception as error:
+            self.server.tr.error("[%s]: Request failed: %r", self.server, error)
+            return [request_id, False, codec.error_result(error)]
+
+async def serve(server: Server, host: str = "127.0.0.1", port: int = 8765,
+                methods: dict[str, Callable] | None = None) -> asyncio.AbstractServer:
+    '''
+    Start listening for remote clients of `server`.
+    `methods` (name: callable) defaults to the public methods of `server`.
+
+    Returns:
+        asyncio.AbstractServer: The listener, `port=0` picks a free port (see `sockets[0].getsockname()`).
+    '''
+    loop = asyncio.get_running_loop()
+    methods = methods if methods is not None else public_methods(server)
+    return await loop.create_server(lambda: ServerProtocol(server, methods), host, port)
+
+ADMISSION_ARGUMENTS = ("send_rate", "send_burst", "mailbox_quota", "max_payload", "max_inflight", "no_admission")
+
+def add_admission_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--send-rate", type=float, default=params.SEND_RATE, help="messages per second and per sender")
+    parser.add_argument("--send-burst", type=int, default=params.SEND_BURST, help="messages a sender can send at once")
+    parser.add_argument("--mailbox-quota", type=int, default=params.MAILBOX_QUOTA, help="messages stored per receiver")
+    parser.add_argument("--max-payload", type=int, default=params.MAX_PAYLOAD_SIZE // 2**20, metavar="MB", help="size of a message")
+    parser.add_argument("--max-inflight", type=int, default=params.MAX_INFLIGHT_BYTES // 2**20, metavar="MB",
+                        help="requests being received or served at the same time, all connections together")
+    parser.add_argument("--no-admission", action="store_true", help="no limit at all")
+
+def admission_argv(args: argparse.Namespace) -> list[str]:
+    '''
+    Returns:
+        list[str]: The admission arguments of `args`, to start another server with the same limits.
+    '''
+    argv = ["--no-admission"] if args.no_admission else []
+    for name in ADMISSION_ARGUMENTS[:-1]:
+        argv += ["--" + name.replace("_", "-"), str(getattr(args, name))]
+    return argv
+
+def add_log_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--trace-level", default="WARNING")
+    parser.add_argument("--log-format", choices=("console", "json"), default="console",
+                        help="colored lines on stdout, or JSON lines on stderr written by a background thread")
+
+def tracer_from(args: argparse.Namespace) -> Tracer:
+    sink = background_json_sink() if args.log_format == "json" else ConsoleSink()
+    return Tracer(trace_level=args.trace_level, sink=sink)
+
+def admission_from(args: argparse.Namespace) -> Admission:
+    if args.no_admission:
+        return Admission.unlimited()
+    return Admission(rate=args.send_rate or None, burst=args.send_burst or None, mailbox_quota=args.mailbox_quota or None,
+                     max_payload=args.max_payload * 2**20 or None, max_inflight=args.max_inflight * 2**20 or None)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default=None, help="directory of a DiskStorage, in-memory if omitted")
+    parser.add_argument("--blob-cache", type=int, default=None, metavar="MB",
+                        help="keep ciphertexts in DIR/blobs with a cache of MB megabytes, instead of in memory")
+    add_log_arguments(parser)
+    parser.add_argument("--shard", action="store_true",
+                        help="also serve the internal methods used by a network.shard router, with the secret in TTF_SHARD_SECRET")
+    add_admission_arguments(parser)
+    args = parser.parse_args()
+    if args.blob_cache is not None and not args.data_dir:
+        parser.error("--blob-cache requires --data-dir")
+    if args.shard:
+        from network.shard import SECRET_ENV
+        if not os.environ.get(SECRET_ENV):
+            parser.error(f"--shard requires the secret of the router in {SECRET_ENV}")
+
+    storage = None
+    if args.data_dir:
+        from models.storage import DiskStorage
+        storage = DiskStorage(args.data_dir, blob_cache=None if args.blob_cache is None else args.blob_cache * 1024 * 1024)
+    server = Server(name='Server', tr=tracer_from(args), storage=storage, admission=admission_from(args))
+    server.start_scheduler()
+
+    methods = None
+    if args.shard:
+        from network.shard import shard_methods, shard_secret
+        methods = shard_methods(server, shard_secret())
+
+    async def run():
+        listener = await serve(server, args.host, args.port, methods)
+        server.tr.colorprint(f"[{server}]: Listening on {args.host}:{args.port}")
+        async with listener:
+            await listener.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
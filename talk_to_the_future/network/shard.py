@@ -0,0 +1,433 @@
+'''
+Sharded deployment: users are partitioned over several `network.server --shard` worker
+processes, each owning the accounts, sessions and mailboxes of its users.
+
+A `ShardRouter` sends each request to the shard of its user on a consistent hash ring.
+Messages whose receivers live on another shard are checked on the sender's shard
+(`authenticate_sender`) then stored on the receivers' shards (`deliver_message`).
+Adding a shard only moves the users it takes over, mailboxes included.
+
+The methods a router calls besides the public ones (`INTERNAL_METHODS`) take as first
+argument a secret shared with its workers: `TTF_SHARD_SECRET` if set (workers started apart
+from the router), else one drawn by the router and given to the workers it spawns.
+
+Usage (from talk_to_the_future/), spawns the workers and listens for clients:
+    python -m network.shard [--shards 4] [--host 127.0.0.1] [--port 8765] [--data-dir DIR [--blob-cache MB]]
+                            [--trace-level WARNING] [--log-format console|json]
+                            [admission limits of each worker, see network.server]
+
+The router reads the requests of its clients under the same frame size and in-flight budget.
+'''
+import argparse
+import asyncio
+import bisect
+import functools
+import hmac
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from hashlib import blake2b
+from typing import Callable
+from array import array
+from models import Server
+from models.aad import AAD
+from models.admission import Admission, RetryLater
+from models.change_log import ChangeLog
+from models.message import MessageRecord
+from models.user_infos import UserInfos
+from network import codec
+from network.client import AsyncRemoteServer, RemoteError
+from network.server import (FrameProtocol, public_methods, add_admission_arguments, admission_argv, admission_from,
+                            add_log_arguments, tracer_from)
+from utils.logger import Tracer
+
+VNODES = 64 # points of each shard on the ring, evens out the share of users per shard
+
+# Methods routed to the shard of their first argument (a username)
+USER_METHODS = frozenset({
+    "register", "remove", "get_user_salt", "get_user_kdf_params", "login", "logout", "update_keys",
+    "rotate_keys", "get_escrowed_keys", "get_public_key", "get_versioned_public_key", "get_messages_aad",
+    "get_message_payload", "get_message_payloads", "get_message_key", "get_message_keys", "delete_message", "sync",
+})
+
+# Methods of a shard only a `ShardRouter` may call, with the shard secret as first argument
+INTERNAL_METHODS = ("authenticate_sender", "deliver_message", "check_receivers", "list_users",
+                    "export_user", "import_user", "drop_user")
+SECRET_ENV = "TTF_SHARD_SECRET"
+
+@functools.cache
+def shard_secret() -> str:
+    '''
+    Returns:
+        str: Secret of the internal methods, `TTF_SHARD_SECRET` or else one drawn for this process.
+    '''
+    return os.environ.get(SECRET_ENV) or secrets.token_hex(32)
+
+def encode_user(user: UserInfos, verify_keys: dict[int, bytes]) -> dict:
+    '''
+    Codec value of a user exported by `Server.export_user`, to move it to another shard.
+    Each message is sent as its envelope with the verify key it refers to.
+    '''
+    return {
+        "name"              : user.name,
+        "keys"              : user.keys,
+        "key_version"       : user.key_version,
+        "escrowed_keys"     : user.escrowed_keys,
+        "next_message_id"   : user.next_message_id,
+        "changes"           : [user.changes.base, user.changes.entries.tolist(), user.changes.unlocks.tolist()],
+        "messages"          : [[message.message_id, message.key_id, message.to_payload(verify_keys[message.key_id])]
+                               for message in user.received_messages.values()],
+    }
+
+def decode_user(data: dict) -> tuple[UserInfos, dict[int, bytes]]:
+    '''
+    Returns:
+        tuple[UserInfos, dict[int, bytes]]: The arguments of `Server.import_user` for a user encoded by `encode_user`.
+    '''
+    user = UserInfos(data["name"], data["keys"])
+    user.key_version = data["key_version"]
+    user.escrowed_keys = data["escrowed_keys"]
+    user.next_message_id = data["next_message_id"]
+    user.changes = ChangeLog()
+    user.changes.base, entries, unlocks = data["changes"]
+    user.changes.entries, user.changes.unlocks = array('q', entries), array('q', unlocks)
+    verify_keys = {}
+    for message_id, key_id, payload in data["messages"]:
+        aad = AAD.decode(payload["aad"])
+        message = MessageRecord(AAD(aad.sender, user.name, aad.unlock_day), payload, key_id)
+        message.message_id = message_id
+        message.rewrapped_key = payload.get("rewrapped_key")
+        user.received_messages[message_id] = message
+        verify_keys[key_id] = payload["verify_key"]
+    return user, verify_keys
+
+def _internal(server: Server, name: str, method: Callable, secret: str) -> Callable:
+    def call(given, *args, **kwargs):
+        if not isinstance(given, str) or not hmac.compare_digest(given.encode(), secret.encode()):
+            server.tr.error("[%s]: Internal method %s called without the shard secret", server, name)
+            raise PermissionError("Invalid shard secret")
+        return method(*args, **kwargs)
+    return call
+
+def shard_methods(server: Server, secret: str) -> dict[str, Callable]:
+    '''
+    Public methods of `server` plus the internal ones used by a `ShardRouter`, which
+    are refused to callers without `secret`.
+    '''
+    def export_user(username: str) -> dict | None:
+        exported = server.export_user(username)
+        return encode_user(*exported) if exported else None
+
+    methods = public_methods(server)
+    internal = {method: getattr(server, method) for method in INTERNAL_METHODS}
+    internal["export_user"] = export_user
+    internal["import_user"] = lambda data: server.import_user(*decode_user(data))
+    for name, method in internal.items():
+        methods[name] = _internal(server, name, method, secret)
+    return methods
+
+class ShardRing:
+    '''
+    Consistent hash ring of shard names.
+    '''
+    def __init__(self, shards: list[str], vnodes: int = VNODES):
+        self.shards: list[str] = list(shards)
+        self.vnodes: int = vnodes
+        points = sorted((self.__hash(f"{shard}#{i}"), shard) for shard in self.shards for i in range(vnodes))
+        self.__hashes: list[int] = [h for h, _ in points]
+        self.__owners: list[str] = [shard for _, shard in points]
+
+    @staticmethod
+    def __hash(key: str) -> int:
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def shard_of(self, username: str) -> str:
+        i = bisect.bisect(self.__hashes, self.__hash(username))
+        return self.__owners[i % len(self.__owners)]
+
+    def with_shard(self, shard: str) -> 'ShardRing':
+        return ShardRing(self.shards + [shard], self.vnodes)
+
+class ShardRouter:
+    '''
+    Asyncio router over shard workers, with the `call` interface of `AsyncRemoteServer`,
+    so it can be wrapped by a `RemoteServer` (`RemoteServer(remote=ShardRouter(...))`) or
+    served to clients by `serve_router`. Must be used from a single event loop.
+    '''
+    def __init__(self, shards: dict[str, str] | list[str], pool_size: int = 2, tr: Tracer = Tracer(trace_level='WARNING'),
+                 secret: str | None = None, admission: Admission = None):
+        '''
+        Args:
+            `shards` (dict[str, str]): Address ("host:port") of each shard by name. Names place the
+                shards on the ring, so they must stay the same across restarts. A list of addresses
+                uses them as names.
+            `secret` (str): Secret of the internal methods of the shards, defaults to `shard_secret()`.
+            `admission` (Admission): Frame size and in-flight budget of the requests `serve_router`
+                receives, unlimited by default. The other limits are enforced by the shards.
+        '''
+        shards = shards if isinstance(shards, dict) else {address: address for address in shards}
+        self.tr: Tracer = tr
+        self.admission: Admission = admission if admission is not None else Admission.unlimited()
+        self.__secret: str = secret or shard_secret()
+        self.pool_size: int = pool_size
+        self.ring: ShardRing = ShardRing(list(shards))
+        self.remotes: dict[str, AsyncRemoteServer] = {name: self.__connect(address) for name, address in shards.items()}
+        self.__active: int = 0           # requests being served
+        self.__open = asyncio.Event()    # cleared while resharding
+        self.__idle = asyncio.Event()    # set when no request is being served
+        self.__open.set()
+        self.__idle.set()
+
+    # Private Methods ---------------------------------------------------------------------
+    def __connect(self, address: str) -> AsyncRemoteServer:
+        host, port = address.rsplit(":", 1)
+        return AsyncRemoteServer(host, int(port), self.pool_size)
+
+    def __remote(self, username: str) -> AsyncRemoteServer:
+        return self.remotes[self.ring.shard_of(username)]
+
+    async def __internal(self, shard: str, method: str, *args):
+        return await self.remotes[shard].call(method, self.__secret, *args)
+
+    async def __get_public_keys(self, receivers: list[str]) -> dict[str, bytes] | None:
+        groups = defaultdict(list)
+        for receiver in receivers:
+            groups[self.ring.shard_of(receiver)].append(receiver)
+        results = await asyncio.gather(*(self.remotes[shard].call("get_public_keys", names) for shard, names in groups.items()))
+        if not all(result is not None for result in results):
+            return None
+        keys = {name: key for result in results for name, key in result.items()}
+        return {receiver: keys[receiver] for receiver in receivers}
+
+    async def __send_message(self, sender: str, token: str, message: dict, receiver_key_version: int | None = None) -> bool:
+        home = self.ring.shard_of(sender)
+        target = self.ring.shard_of(AAD.decode(message["aad"]).receiver)
+        if home == target:
+            return await self.remotes[home].call("send_message", sender, token, message, receiver_key_version)
+        verify_key = await self.__internal(home, "authenticate_sender", sender, token, message)
+        if verify_key is None:
+            return False
+        return await self.__internal(target, "deliver_message", message, verify_key, receiver_key_version)
+
+    async def __send_broadcast(self, sender: str, token: str, message: dict) -> bool:
+        '''
+        A broadcast over several shards is prepared on every shard (`check_receivers`: the
+        receivers exist and have room) before any stores it, so it is refused for all its
+        receivers at once. Only a shard failing between the two steps (stopped, or a mailbox
+        filled meanwhile) leaves it stored for the receivers of the other shards: False is
+        then returned and the receivers which got it are logged.
+        '''
+        aad = AAD.decode(message["aad"])
+        slots: dict[str, bytes] | None = message.get("enc_sym_keys")
+        if not aad.broadcast or slots is None or sorted(slots) != sorted(aad.receivers()):
+            self.tr.error("[%s]: Key slots don't match the receivers of the message", self)
+            return False
+        groups = defaultdict(dict)
+        for receiver, slot in slots.items():
+            groups[self.ring.shard_of(receiver)][receiver] = slot
+        home = self.ring.shard_of(sender)
+        if list(groups) == [home]:
+            return await self.remotes[home].call("send_broadcast", sender, token, message)
+
+        verify_key = await self.__internal(home, "authenticate_sender", sender, token, message)
+        if verify_key is None:
+            return False
+        prepared = await asyncio.gather(*(self.__internal(shard, "check_receivers", list(group)) for shard, group in groups.items()))
+        if not all(prepared):
+            return False
+        results = await asyncio.gather(*(self.__internal(shard, "deliver_message", {**message, "enc_sym_keys": group}, verify_key)
+                                         for shard, group in groups.items()), return_exceptions=True)
+        if all(result is True for result in results):
+            return True
+        delivered = [name for result, group in zip(results, groups.values()) if result is True for name in group]
+        self.tr.error("[%s]: Broadcast of %s only stored for %s", self, sender, ", ".join(delivered) or "no receiver")
+        return False
+
+    # Public methods -----------------------------------------------------------------------
+    async def call(self, method: str, *args, **kwargs):
+        '''
+        Serve `method` of the `Server` API on the shard(s) owning its users.
+        '''
+        await self.__open.wait()
+        self.__active += 1
+        self.__idle.clear()
+        try:
+            if method in USER_METHODS:
+                return await self.__remote(args[0]).call(method, *args, **kwargs)
+            if method == "get_public_keys":
+                return await self.__get_public_keys(*args, **kwargs)
+            if method == "send_message":
+                return await self.__send_message(*args, **kwargs)
+            if method == "send_broadcast":
+                return await self.__send_broadcast(*args, **kwargs)
+            raise RemoteError(f"Unknown method {method}")
+        finally:
+            self.__active -= 1
+            if not self.__active:
+                self.__idle.set()
+
+    async def add_shard(self, shard: str, address: str | None = None) -> int:
+        '''
+        Add the worker `shard` listening on `address` ("host:port", defaults to `shard`)
+        and move to it the users it now owns.
+        Requests wait until the move is over. A user is imported on its new shard before
+        being dropped from the old one, so an interrupted move loses no message.
+
+        The ring is not saved: whoever starts the router keeps the list of shards and must
+        pass it again, `shard` included, when the router restarts. A move interrupted by a
+        crash is finished by restarting the router with that list and calling `add_shard`
+        again for `shard`; until then the users not yet moved can't be reached. A user whose
+        drop fails stays on its old shard, unreachable, and is logged.
+
+        Returns:
+            int: Number of users moved.
+        '''
+        self.__open.clear()
+        try:
+            await self.__idle.wait()
+            ring = self.ring if shard in self.ring.shards else self.ring.with_shard(shard)
+            if shard not in self.remotes:
+                self.remotes[shard] = self.__connect(address or shard)
+            moved = 0
+            for old in self.ring.shards:
+                if old == shard:
+                    continue
+                for username in await self.__internal(old, "list_users"):
+                    if ring.shard_of(username) != shard:
+                        continue
+                    if not await self.__internal(shard, "import_user", await self.__internal(old, "export_user", username)):
+                        self.tr.error("[%s]: Could not move %s to %s, kept on %s", self, username, shard, old)
+                        continue
+                    if not await self.__internal(old, "drop_user", username):
+                        self.tr.error("[%s]: %s was moved to %s but could not be dropped from %s", self, username, shard, old)
+                    moved += 1
+            self.ring = ring
+            self.tr.info("[%s]: Added shard %s, %s users moved", self, shard, moved)
+            return moved
+        finally:
+            self.__open.set()
+
+    async def close(self) -> None:
+        for remote in self.remotes.values():
+            await remote.close()
+
+    def __str__(self):
+        return f"Router({len(self.ring.shards)} shards)"
+
+class RouterProtocol(FrameProtocol):
+    '''
+    Serves the `network.server` protocol through a `ShardRouter`, under the frame size and
+    in-flight budget of `router.admission`.
+    Requests are served concurrently, responses may come back out of order.
+    '''
+    def __init__(self, router: ShardRouter):
+        super().__init__(router.admission, router.tr, router)
+        self.router: ShardRouter = router
+        self.tasks: set[asyncio.Task] = set() # requests being served, referenced until done
+
+    def serve(self, request: bytes, size: int) -> None:
+        # `size` stays in flight until the response is written, even if the task fails
+        task = asyncio.get_running_loop().create_task(self.handle(request))
+        self.tasks.add(task)
+        task.add_done_callback(lambda task: (self.tasks.discard(task), self.admission.release(size)))
+
+    async def handle(self, request: bytes) -> None:
+        request_id = None
+        try:
+            request_id, method, args, kwargs = codec.decode(request)
+            if method not in codec.RPC_METHODS:
+                response = [request_id, False, f"Unknown method {method}"]
+            else:
+                response = [request_id, True, await self.router.call(method, *args, **kwargs)]
+        except RetryLater as error:
+            response = [request_id, False, codec.error_result(error)]
+        except Exception as error:
+            self.router.tr.error("[%s]: Request failed: %r", self.router, error)
+            response = [request_id, False, codec.error_result(error)]
+        data = codec.encode(response)
+        if not self.transport.is_closing():
+            self.transport.write(codec.FRAME.pack(len(data)) + data)
+
+async def serve_router(router: ShardRouter, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: RouterProtocol(router), host, port)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_shard(host: str = "127.0.0.1", data_dir: str | None = None, trace_level: str = "ERROR",
+                blob_cache: int | None = None, argv: list[str] | None = None, secret: str | None = None) -> tuple[str, subprocess.Popen]:
+    '''
+    Start a `network.server --shard` worker process and wait until it listens.
+    `argv` are more arguments of `network.server`, e.g. its admission limits, and `secret`
+    the one of its internal methods (defaults to `shard_secret()`).
+
+    Returns:
+        tuple[str, subprocess.Popen]: Address ("host:port") and process of the worker.
+    '''
+    port = free_port()
+    command = [sys.executable, "-m", "network.server", "--shard", "--host", host, "--port", str(port), "--trace-level", trace_level]
+    if data_dir:
+        command += ["--data-dir", data_dir]
+    if blob_cache is not None:
+        command += ["--blob-cache", str(blob_cache)]
+    command += argv or []
+    # The secret goes through the environment, the command line can be read by any local user
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               env={**os.environ, SECRET_ENV: secret or shard_secret()})
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.1).close()
+            return f"{host}:{port}", process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"Shard worker on port {port} did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default=None, help="each worker keeps a DiskStorage in DIR/shard-i, in-memory if omitted")
+    parser.add_argument("--blob-cache", type=int, default=None, metavar="MB", help="blob cache of each worker (see network.server)")
+    add_log_arguments(parser)
+    add_admission_arguments(parser)
+    args = parser.parse_args()
+    if args.blob_cache is not None and not args.data_dir:
+        parser.error("--blob-cache requires --data-dir")
+
+    workers = [spawn_shard(data_dir=args.data_dir and os.path.join(args.data_dir, f"shard-{i}"), trace_level=args.trace_level,
+                           blob_cache=args.blob_cache, argv=["--log-format", args.log_format] + admission_argv(args))
+               for i in range(args.shards)]
+
+    async def run():
+        shards = {f"shard-{i}": address for i, (address, _) in enumerate(workers)}
+        router = ShardRouter(shards, tr=tracer_from(args), admission=admission_from(args))
+        listener = await serve_router(router, args.host, args.port)
+        router.tr.colorprint(f"[{router}]: Listening on {args.host}:{args.port}")
+        async with listener:
+            await listener.serve_forever()
+    def interrupt(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, interrupt) # stop the workers on SIGTERM too
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, process in workers:
+            process.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import numpy as np
 from datetime import date
 
 DATE_CODED_SIZE = 3
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal() # day 0 of numpy datetime64
 
 def encode_date(d: date) -> bytes:
     value = (d.year << 9) | (d.month << 5) | d.day
@@ -13,4 +15,51 @@ def decode_date(b: bytes) -> date:
     day = value & 0x1f
     month = (value >> 5) & 0xf
     year = (value >> 9) & 0x7fff
-    return date(year, month, day)
\ No newline at end of file
+    return date(year, month, day)
+
+def encode_dates(ordinals) -> bytes:
+    '''
+    `encode_date` of many days at once.
+
+    Args:
+        `ordinals` (array-like of int): Days as `date.toordinal()`.
+
+    Returns:
+        bytes: The `DATE_CODED_SIZE` bytes of each day, concatenated.
+    '''
+    days = (np.asarray(ordinals, np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]')
+    year = years.astype(np.int64) + 1970
+    month = (months - years.astype('datetime64[M]')).astype(np.int64) + 1
+    day = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    value = (year << 9) | (month << 5) | day
+    encoded = np.empty((len(value), DATE_CODED_SIZE), np.uint8)
+    for i in range(DATE_CODED_SIZE):
+        encoded[:, i] = value >> (8 * (DATE_CODED_SIZE - 1 - i))
+    return encoded.tobytes()
+
+def decode_dates(b: bytes) -> np.ndarray:
+    '''
+    `decode_date` of many days at once.
+
+    Args:
+        `b` (bytes): Days encoded by `encode_date`, concatenated.
+
+    Returns:
+        np.ndarray: The day ordinals (`date.toordinal()`), as int64.
+    '''
+    if len(b) % DATE_CODED_SIZE:
+        raise ValueError(f"Expected a multiple of {DATE_CODED_SIZE} bytes for dates encoding.")
+    encoded = np.frombuffer(b, np.uint8).reshape(-1, DATE_CODED_SIZE).astype(np.int64)
+    value = np.zeros(len(encoded), np.int64)
+    for i in range(DATE_CODED_SIZE):
+        value = (value << 8) | encoded[:, i]
+    day = value & 0x1f
+    month = (value >> 5) & 0xf
+    year = (value >> 9) & 0x7fff
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    if ((month < 1) | (month > 12) | (day < 1) | (days.astype('datetime64[M]') != months)).any():
+        raise ValueError("Invalid date encoding.")
+    return days.astype(np.int64) + EPOCH_ORDINAL
@@ -1,68 +1,195 @@
-from colorama import Fore
+import atexit
+import functools
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+LEVELS = {'ERROR': 1, 'WARNING': 2, 'INFO': 3, 'DEBUG': 4}
+LEVEL_NAMES = {level: name for name, level in LEVELS.items()}
+LEVEL_COLORS = {1: 'RED', 2: 'YELLOW', 3: 'WHITE', 4: 'BLUE'}
+COLOR_NAMES = ('BLACK', 'RED', 'GREEN', 'YELLOW', 'BLUE', 'MAGENTA', 'CYAN', 'WHITE', 'RESET',
+               'LIGHTBLACK_EX', 'LIGHTRED_EX', 'LIGHTGREEN_EX', 'LIGHTYELLOW_EX', 'LIGHTBLUE_EX',
+               'LIGHTMAGENTA_EX', 'LIGHTCYAN_EX', 'LIGHTWHITE_EX')
+
+@functools.cache
+def colors() -> dict[str, str]:
+    '''Escape codes of `COLOR_NAMES`: colorama is only imported once something is colored.'''
+    from colorama import Fore
+    return {name: getattr(Fore, name) for name in COLOR_NAMES}
+
+# A log record is a tuple (time, level, msg, args, fields): the message is only
+# formatted (`msg % args`) by the sink that writes it, off the hot path.
+
+def format_message(msg: str, args: tuple) -> str:
+    if not args:
+        return str(msg)
+    try:
+        return msg % args
+    except (TypeError, ValueError):
+        return f"{msg} {args!r}"
+
+class ConsoleSink:
+    '''
+    Colored text lines written synchronously, for the CLI where logs are interleaved
+    with prompts and must show up in order.
+    '''
+    def __init__(self, stream=None, color: bool = True):
+        self.stream = stream
+        self.color: bool = color
+
+    def emit(self, record: tuple) -> None:
+        _, level, msg, args, fields = record
+        line = f"[{LEVEL_NAMES[level]}]: {format_message(msg, args)}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if self.color:
+            line = colorstring(line, LEVEL_COLORS[level])
+        print(line, file=self.stream or sys.stdout)
+
+    def flush(self) -> None:
+        (self.stream or sys.stdout).flush()
+
+class JsonSink:
+    '''
+    One JSON object per record and per line: time, level, message and the extra fields.
+    '''
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, record: tuple) -> None:
+        created, level, msg, args, fields = record
+        entry = {"time": round(created, 6), "level": LEVEL_NAMES[level], "message": format_message(msg, args)}
+        if fields:
+            entry.update(fields)
+        (self.stream or sys.stderr).write(json.dumps(entry, default=str) + "\n")
+
+    def flush(self) -> None:
+        (self.stream or sys.stderr).flush()
+
+class BackgroundSink:
+    '''
+    Buffers records in memory and hands them to `sink` from a background thread every
+    `interval` seconds, so logging never waits on formatting or I/O. Past `max_buffer`
+    pending records the oldest are dropped. Pending records are written at exit.
+    '''
+    def __init__(self, sink, interval: float = 0.1, max_buffer: int = 100_000):
+        self.sink = sink
+        self.interval: float = interval
+        self.__buffer: deque = deque(maxlen=max_buffer)
+        self.__lock = threading.Lock() # serializes the writes to `sink`
+        self.__thread: threading.Thread | None = None
+        self.__stopped = threading.Event()
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            self.flush()
+
+    def __start(self) -> None:
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="log-sink", daemon=True)
+                self.__thread.start()
+                atexit.register(self.close)
+
+    def emit(self, record: tuple) -> None:
+        self.__buffer.append(record)
+        if self.__thread is None:
+            self.__start()
+
+    def flush(self) -> None:
+        with self.__lock:
+            while self.__buffer:
+                try:
+                    self.sink.emit(self.__buffer.popleft())
+                except IndexError:
+                    break
+            self.sink.flush()
+
+    def close(self) -> None:
+        self.__stopped.set()
+        self.flush()
+
+_default_sink = ConsoleSink()
+
+def default_sink() -> ConsoleSink:
+    '''Colored lines on stdout, written synchronously. Shared by every `Tracer` without sink.'''
+    return _default_sink
+
+def background_json_sink() -> BackgroundSink:
+    '''JSON lines on stderr written by a background thread, for the servers (see `network.server --log-format`).'''
+    return BackgroundSink(JsonSink())
+
+def _ignore(*args, **fields) -> None:
+    pass
 
 class Tracer:
-    def __init__(self, trace_level: str = 'DEBUG', default_color: str = 'WHITE'):
-        self.levels = {'ERROR': 1, 'WARNING': 2, 'INFO': 3, 'DEBUG': 4}
+    '''
+    Leveled logger of the clients and servers.
+
+    Messages take printf-style arguments formatted only once written, e.g.
+    `tr.debug('[%s]: Returning message (id:%s)', self, message_id)`, and keyword arguments
+    become fields of the structured record. The methods of disabled levels are bound to
+    a no-op, so a filtered call does no work at all.
+
+    Records go to `sink` (see `ConsoleSink`, `JsonSink`, `BackgroundSink`), by default
+    colored lines written to stdout as they are logged.
+    '''
+    def __init__(self, trace_level: str = 'DEBUG', default_color: str = 'WHITE', sink=None):
+        self.levels = LEVELS
+        self.default_color = default_color
+        self.sink = sink if sink is not None else default_sink()
+        self.set_level(trace_level)
+
+    def set_level(self, trace_level: str) -> None:
         if trace_level not in self.levels:
             raise ValueError(f"Invalid trace level: {trace_level}")
         self.level = self.levels[trace_level]
-        self.default_color = default_color
+        for name, level in (('error', 1), ('warn', 2), ('info', 3), ('debug', 4)):
+            setattr(self, name, self.__logger(level) if self.level >= level else _ignore)
+
+    def __logger(self, level: int):
+        emit = self.sink.emit
+        def log(msg, *args, **fields) -> None:
+            emit((time.time(), level, msg, args, fields))
+        return log
+
+    def enabled(self, trace_level: str) -> bool:
+        '''Check a level before computing expensive log arguments.'''
+        return self.level >= self.levels[trace_level]
+
+    @staticmethod
+    def colorstring(s: str, color: str = 'WHITE') -> str:
+        return colorstring(s, color)
 
-    @staticmethod     
-    def colorstring(s: str, color: str = 'WHITE') -> str: 
-        colors = {
-            'BLACK': Fore.BLACK,
-            'RED': Fore.RED,
-            'GREEN': Fore.GREEN,
-            'YELLOW': Fore.YELLOW,
-            'BLUE': Fore.BLUE,
-            'MAGENTA': Fore.MAGENTA,
-            'CYAN': Fore.CYAN,
-            'WHITE': Fore.WHITE,
-            'RESET': Fore.RESET,
-            'LIGHTBLACK_EX': Fore.LIGHTBLACK_EX,
-            'LIGHTRED_EX': Fore.LIGHTRED_EX,
-            'LIGHTGREEN_EX': Fore.LIGHTGREEN_EX,
-            'LIGHTYELLOW_EX': Fore.LIGHTYELLOW_EX,
-            'LIGHTBLUE_EX': Fore.LIGHTBLUE_EX,
-            'LIGHTMAGENTA_EX': Fore.LIGHTMAGENTA_EX,
-            'LIGHTCYAN_EX': Fore.LIGHTCYAN_EX,
-            'LIGHTWHITE_EX': Fore.LIGHTWHITE_EX
-        }
-        return colors.get(color.upper(), Fore.WHITE) + s + Fore.RESET
-    
     def colorprint(self, s: str, color: str = 'DEFAULT') -> None:
         color = self.default_color if color == 'DEFAULT' else color
-        print(self.colorstring(s, color))
-
-    def error(self, s) -> None:
-        if self.level >= self.levels['ERROR'] : self.colorprint('[ERROR]: ' + s, color='RED')
-    def warn(self, s) -> None:
-        if self.level >= self.levels['WARNING'] : self.colorprint('[WARNING]: ' + s, color='YELLOW')
-    def info(self, s) -> None:
-        if self.level >= self.levels['INFO'] : self.colorprint('[INFO]: ' + s, color='WHITE')
-    def debug(self, s) -> None:
-        if self.level >= self.levels['DEBUG'] : self.colorprint('[DEBUG]: ' + s, color='BLUE')
+        print(colorstring(s, color))
 
     def sepline(self, size:int, text:str = None, char:str='_', color:str='DEFAULT'):
-        if text:
-            side = max(size - len(text) - 2, 0)
-            left = char * (side // 2)
-            right = char * (side - len(left))
-            self.colorprint(f'{left} {text} {right}', color)
-        else:
-            self.colorprint(char * size, color)
-     
+        color = self.default_color if color == 'DEFAULT' else color
+        sepline(size, text, char, color)
+
 # -- Global helper functions for logging --
+def colorstring(s: str, color: str = 'WHITE') -> str:
+    codes = colors()
+    return codes.get(color.upper(), codes['WHITE']) + s + codes['RESET']
+
 def print_header(text: str, color: str = 'WHITE', size: int = 60) -> None:
-    tr = Tracer(default_color=color)
     print()
-    tr.sepline(size=size, char='-')
-    tr.sepline(size=size, text=text, char=' ')
-    tr.sepline(size=size, char='-')
+    sepline(size=size, char='-', color=color)
+    sepline(size=size, text=text, char=' ', color=color)
+    sepline(size=size, char='-', color=color)
 
 def colorprint(s: str, color: str = 'DEFAULT') -> None:
-    Tracer().colorprint(s, color)
+    print(colorstring(s, 'WHITE' if color == 'DEFAULT' else color))
 
 def sepline(size: int, text: str | None = None, char:str='_', color:str='DEFAULT') -> None:
-    Tracer().sepline(size, text, char, color)
\ No newline at end of file
+    if text:
+        side = max(size - len(text) - 2, 0)
+        left = char * (side // 2)
+        right = char * (side - len(left))
+        colorprint(f'{left} {text} {right}', color)
+    else:
+        colorprint(char * size, color)
@@ -0,0 +1,199 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(25)) # upper bounds in seconds, 1 µs to ~17 s
+
+class Histogram:
+    '''
+    Calls, errors and latency distribution of one operation, in the fixed `BUCKETS`.
+    '''
+    __slots__ = ("counts", "count", "errors", "total")
+
+    def __init__(self):
+        self.counts: list[int] = [0] * (len(BUCKETS) + 1) # last bucket is +Inf
+        self.count: int = 0
+        self.errors: int = 0
+        self.total: float = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        '''
+        Returns:
+            float: Upper bound of the bucket holding the `q` quantile, inf past the last bound.
+        '''
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    '''
+    Registry of the operations instrumented with `timed` or `instrument`.
+
+    Disabled by default: an instrumented call then only checks `enabled` before calling
+    the original function. Once enabled, each call is timed and recorded in the
+    `Histogram` of its operation.
+
+    Events that are not calls (e.g. refused messages) are counted with `count`, and
+    current levels (e.g. bytes in flight) are set with `gauge`.
+    '''
+    def __init__(self):
+        self.enabled: bool = False
+        self.__histograms: dict[str, Histogram] = {}
+        self.__counters: dict[str, int | float] = {}
+        self.__gauges: dict[str, int | float] = {}
+        self.__lock = threading.Lock()
+
+    def __wrap(self, name: str, fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_coroutine(*args, **kwargs):
+                if not self.enabled:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = await fn(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    self.record(name, time.perf_counter() - start, error)
+            return timed_coroutine
+
+        @functools.wraps(fn)
+        def timed_call(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.record(name, time.perf_counter() - start, error)
+        return timed_call
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+            self.__gauges.clear()
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        with self.__lock:
+            histogram = self.__histograms.get(name)
+            if histogram is None:
+                histogram = self.__histograms[name] = Histogram()
+            histogram.observe(seconds, error)
+
+    def count(self, name: str, value: int | float = 1) -> None:
+        '''Add `value` to the counter `name`, if enabled.'''
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: int | float) -> None:
+        '''Set the gauge `name` to `value`, if enabled.'''
+        if self.enabled:
+            self.__gauges[name] = value
+
+    def counters(self) -> dict[str, int | float]:
+        '''
+        Returns:
+            dict[str, int | float]: The counters (see `count`) and gauges (see `gauge`) by name.
+        '''
+        with self.__lock:
+            return dict(sorted({**self.__counters, **self.__gauges}.items()))
+
+    def timed(self, name: str):
+        '''Decorator recording the calls of a function as the operation `name`.'''
+        return lambda fn: self.__wrap(name, fn)
+
+    def instrument(self, prefix: str):
+        '''
+        Class decorator recording every public method as the operation `prefix.method`.
+        '''
+        def decorator(cls):
+            for name, attribute in list(vars(cls).items()):
+                if not name.startswith("_") and inspect.isfunction(attribute):
+                    setattr(cls, name, self.__wrap(f"{prefix}.{name}", attribute))
+            return cls
+        return decorator
+
+    def snapshot(self) -> dict[str, dict]:
+        '''
+        Returns:
+            dict[str, dict]: For each operation, its calls, errors, total and mean seconds,
+                estimated p50/p99 seconds and bucket counts.
+        '''
+        with self.__lock:
+            histograms = {name: (h.count, h.errors, h.total, list(h.counts), h.quantile(0.5), h.quantile(0.99))
+                          for name, h in self.__histograms.items()}
+        return {name: {"calls": count, "errors": errors, "seconds": total, "mean": total / count if count else 0.0,
+                       "p50": p50, "p99": p99, "buckets": counts}
+                for name, (count, errors, total, counts, p50, p99) in sorted(histograms.items())}
+
+    def prometheus(self, namespace: str = "ttf") -> str:
+        '''
+        Returns:
+            str: Every operation in the Prometheus text exposition format.
+        '''
+        snapshot = self.snapshot()
+        metric = f"{namespace}_operation_duration_seconds"
+        lines = [f"# HELP {metric} Latency of the instrumented operations.", f"# TYPE {metric} histogram"]
+        for name, stats in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), stats["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:.6g}"
+                lines.append(f'{metric}_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{operation="{name}"}} {stats["seconds"]:.9g}')
+            lines.append(f'{metric}_count{{operation="{name}"}} {stats["calls"]}')
+        errors = f"{namespace}_operation_errors_total"
+        lines += [f"# HELP {errors} Instrumented operations that raised an exception.", f"# TYPE {errors} counter"]
+        lines += [f'{errors}{{operation="{name}"}} {stats["errors"]}' for name, stats in snapshot.items()]
+        with self.__lock:
+            counters, gauges = sorted(self.__counters.items()), sorted(self.__gauges.items())
+        events = f"{namespace}_events_total"
+        lines += [f"# HELP {events} Events counted by the instrumented code.", f"# TYPE {events} counter"]
+        lines += [f'{events}{{event="{name}"}} {value}' for name, value in counters]
+        levels = f"{namespace}_level"
+        lines += [f"# HELP {levels} Current levels set by the instrumented code.", f"# TYPE {levels} gauge"]
+        lines += [f'{levels}{{name="{name}"}} {value}' for name, value in gauges]
+        return "\n".join(lines) + "\n"
+
+# -- Process-wide registry used by the crypto functions and the Server --
+registry = Metrics()
+
+timed = registry.timed
+instrument = registry.instrument
+enable = registry.enable
+disable = registry.disable
+reset = registry.reset
+snapshot = registry.snapshot
+prometheus = registry.prometheus
+count = registry.count
+gauge = registry.gauge
+counters = registry.counters
+
+def enabled() -> bool:
+    return registry.enabled
@@ -0,0 +1,80 @@
+import cProfile
+import io
+import pstats
+import tracemalloc
+
+# On-demand capture hooks: started and stopped at runtime (see the CLI diagnostics menu),
+# they cost nothing until started.
+
+_profiler: cProfile.Profile | None = None
+
+def profiling() -> bool:
+    return _profiler is not None
+
+def start_profiling() -> bool:
+    '''
+    Start recording the calls of the current thread with cProfile.
+
+    Returns:
+        bool: False if a profile is already being recorded.
+    '''
+    global _profiler
+    if _profiler is not None:
+        return False
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+    return True
+
+def stop_profiling(limit: int = 20, path: str | None = None) -> str | None:
+    '''
+    Stop the profile started by `start_profiling`.
+
+    Args:
+        `limit` (int): Number of functions in the report.
+        `path` (str): File to dump the raw stats to, readable with `pstats` or snakeviz.
+
+    Returns:
+        str: Report of the `limit` functions with the highest cumulative time, None if no profile was started.
+    '''
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler, _profiler = _profiler, None
+    profiler.disable()
+    if path:
+        profiler.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+    return report.getvalue()
+
+def tracing_memory() -> bool:
+    return tracemalloc.is_tracing()
+
+def start_memory_tracing(frames: int = 1) -> bool:
+    '''
+    Start tracing the memory allocations with tracemalloc, keeping `frames` frames per allocation.
+
+    Returns:
+        bool: False if allocations are already traced.
+    '''
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+def stop_memory_tracing(limit: int = 10) -> str | None:
+    '''
+    Stop tracing the memory allocations.
+
+    Returns:
+        str: Current and peak traced memory and the `limit` lines holding the most memory,
+            None if allocations were not traced.
+    '''
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    lines = [f"traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB"]
+    lines += [str(stat) for stat in snapshot.statistics("lineno")[:limit]]
+    return "\n".join(lines)